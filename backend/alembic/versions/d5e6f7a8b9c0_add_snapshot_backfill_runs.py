@@ -0,0 +1,71 @@
+"""add snapshot backfill run tables
+
+Revision ID: d5e6f7a8b9c0
+Revises: c4d5e6f7a8b9
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d5e6f7a8b9c0"
+down_revision: Union[str, None] = "c4d5e6f7a8b9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "snapshot_backfill_runs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("start_date", sa.Date(), nullable=False),
+        sa.Column("end_date", sa.Date(), nullable=False),
+        sa.Column("shard_index", sa.Integer(), nullable=False),
+        sa.Column("shard_count", sa.Integer(), nullable=False),
+        sa.Column("workers", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_snapshot_backfill_runs_id"), "snapshot_backfill_runs", ["id"], unique=False)
+
+    op.create_table(
+        "snapshot_backfill_checkpoints",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("run_id", sa.Integer(), nullable=False),
+        sa.Column("shard_index", sa.Integer(), nullable=False),
+        sa.Column("shard_count", sa.Integer(), nullable=False),
+        sa.Column("snapshot_date", sa.Date(), nullable=False),
+        sa.Column("snapshots_created", sa.Integer(), nullable=False),
+        sa.Column("failures", sa.Integer(), nullable=False),
+        sa.Column("completed_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(["run_id"], ["snapshot_backfill_runs.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_snapshot_backfill_checkpoints_id"),
+        "snapshot_backfill_checkpoints",
+        ["id"],
+        unique=False,
+    )
+    op.create_index(
+        "idx_backfill_checkpoint_run_shard_date",
+        "snapshot_backfill_checkpoints",
+        ["run_id", "shard_index", "shard_count", "snapshot_date"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_backfill_checkpoint_run_shard_date", table_name="snapshot_backfill_checkpoints")
+    op.drop_index(op.f("ix_snapshot_backfill_checkpoints_id"), table_name="snapshot_backfill_checkpoints")
+    op.drop_table("snapshot_backfill_checkpoints")
+
+    op.drop_index(op.f("ix_snapshot_backfill_runs_id"), table_name="snapshot_backfill_runs")
+    op.drop_table("snapshot_backfill_runs")
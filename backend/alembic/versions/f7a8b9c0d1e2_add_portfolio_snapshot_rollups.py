@@ -0,0 +1,52 @@
+"""add portfolio snapshot rollup table
+
+Revision ID: f7a8b9c0d1e2
+Revises: e6f7a8b9c0d1
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f7a8b9c0d1e2"
+down_revision: Union[str, None] = "e6f7a8b9c0d1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "portfolio_snapshot_rollups",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("portfolio_id", sa.Integer(), nullable=False),
+        sa.Column("resolution", sa.String(length=10), nullable=False),
+        sa.Column("period_start", sa.Date(), nullable=False),
+        sa.Column("period_end", sa.Date(), nullable=False),
+        sa.Column("open_value", sa.Float(), nullable=False),
+        sa.Column("high_value", sa.Float(), nullable=False),
+        sa.Column("low_value", sa.Float(), nullable=False),
+        sa.Column("close_value", sa.Float(), nullable=False),
+        sa.Column("close_cost", sa.Float(), nullable=False),
+        sa.Column("close_profit_loss", sa.Float(), nullable=False),
+        sa.Column("close_profit_loss_percent", sa.Float(), nullable=False),
+        sa.Column("snapshot_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["portfolio_id"], ["portfolios.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_portfolio_snapshot_rollups_id"), "portfolio_snapshot_rollups", ["id"], unique=False)
+    op.create_index(
+        "idx_snapshot_rollup_portfolio_resolution_start",
+        "portfolio_snapshot_rollups",
+        ["portfolio_id", "resolution", "period_start"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_snapshot_rollup_portfolio_resolution_start", table_name="portfolio_snapshot_rollups")
+    op.drop_index(op.f("ix_portfolio_snapshot_rollups_id"), table_name="portfolio_snapshot_rollups")
+    op.drop_table("portfolio_snapshot_rollups")
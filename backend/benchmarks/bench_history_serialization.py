@@ -0,0 +1,93 @@
+# bench_history_serialization.py
+"""
+Benchmark the stock-history response builder.
+
+Compares the previous ``DataFrame.iterrows`` + ``jsonable_encoder`` + stdlib
+JSON path with the column-wise builder and the response class used by
+``GET /stocks/{symbol}/history``.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_history_serialization --rows 20000
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+from backend.price_store import bars_to_records, frame_to_bars
+from backend.responses import FastJSONResponse, orjson
+
+
+def make_history(rows: int) -> pd.DataFrame:
+    """Build a synthetic daily OHLCV frame with ``rows`` bars."""
+
+    rng = np.random.default_rng(42)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    return pd.DataFrame(
+        {
+            "Open": close * (1 + rng.normal(0, 0.002, rows)),
+            "High": close * 1.01,
+            "Low": close * 0.99,
+            "Close": close,
+            "Volume": rng.integers(1_000_000, 5_000_000, rows).astype(float),
+        },
+        index=pd.date_range("1950-01-01", periods=rows, freq="D", tz="America/New_York"),
+    )
+
+
+def legacy_payload(history: pd.DataFrame) -> bytes:
+    history_data: List[Dict[str, Any]] = []
+    for date, row in history.iterrows():
+        history_data.append({
+            "date": str(date) if date is not None else None,
+            "open": row["Open"],
+            "high": row["High"],
+            "low": row["Low"],
+            "close": row["Close"],
+            "volume": row["Volume"],
+        })
+    content = jsonable_encoder({"symbol": "BENCH", "period": "max", "history": history_data})
+    return json.dumps(content).encode("utf-8")
+
+
+def columnar_payload(bars: np.ndarray) -> bytes:
+    return FastJSONResponse(
+        {"symbol": "BENCH", "period": "max", "history": bars_to_records(bars)}
+    ).body
+
+
+def best_of(func: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    history = make_history(args.rows)
+    bars = frame_to_bars(history)
+
+    legacy = best_of(lambda: legacy_payload(history), args.repeat)
+    columnar = best_of(lambda: columnar_payload(bars), args.repeat)
+
+    print(f"rows:             {args.rows}")
+    print(f"orjson:           {'yes' if orjson is not None else 'no'}")
+    print(f"iterrows:         {legacy * 1000:9.1f} ms")
+    print(f"column-wise:      {columnar * 1000:9.1f} ms")
+    print(f"speedup:          {legacy / columnar:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench_valuation_kernel.py
+"""
+Benchmark the NumPy portfolio valuation kernel.
+
+Compares ``valuation.value_holdings`` with the per-holding scalar loop it
+replaced (including its ``float(str(...))`` conversions) for portfolios of
+10, 1k and 100k holdings.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.bench_valuation_kernel
+"""
+import argparse
+import time
+from typing import Any, Callable, List, Sequence
+
+import numpy as np
+
+from backend.valuation import value_holdings
+
+
+def scalar_valuation(quantities: Sequence[float], purchase_prices: Sequence[float], prices: Sequence[float]) -> List[dict]:
+    rows = []
+    total_cost = 0.0
+    total_value = 0.0
+    for quantity, purchase_price, price in zip(quantities, purchase_prices, prices):
+        asset_quantity = float(str(quantity))
+        asset_purchase_price = float(str(purchase_price))
+        asset_cost = asset_quantity * asset_purchase_price
+        asset_value = asset_quantity * float(price)
+        profit_loss = asset_value - asset_cost
+        profit_loss_percent = (profit_loss / asset_cost) * 100 if asset_cost > 0 else 0
+        total_cost += asset_cost
+        total_value += asset_value
+        rows.append({
+            "current_value": asset_value,
+            "total_cost": asset_cost,
+            "profit_loss": profit_loss,
+            "profit_loss_percent": profit_loss_percent,
+        })
+    for row in rows:
+        row["allocation_percent"] = row["current_value"] / total_value * 100 if total_value > 0 else 0.0
+    return rows
+
+
+def best_of(func: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    print(f"{'holdings':>10} {'scalar/s':>14} {'kernel/s':>14} {'speedup':>9}")
+    for size in args.sizes:
+        # Plain Python lists, as loaded from ORM rows.
+        quantities = rng.uniform(1, 500, size).tolist()
+        purchase_prices = rng.uniform(5, 900, size).tolist()
+        prices = rng.uniform(5, 900, size).tolist()
+
+        scalar = best_of(lambda: scalar_valuation(quantities, purchase_prices, prices), args.repeat)
+        kernel = best_of(lambda: value_holdings(quantities, purchase_prices, prices), args.repeat)
+        print(f"{size:>10} {size / scalar:>14,.0f} {size / kernel:>14,.0f} {scalar / kernel:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
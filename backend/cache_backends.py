@@ -0,0 +1,327 @@
+# cache_backends.py
+"""
+Pluggable storage for caches shared across worker processes.
+
+gunicorn runs several uvicorn workers, so an in-process cache is duplicated
+and cold in each of them. The backends here give quotes, FX rates and
+sentiment results one shared home:
+
+- ``InMemoryCacheBackend``: per-process dict (single worker, tests)
+- ``RedisCacheBackend``: any Redis-protocol server via ``redis.asyncio``
+- ``SQLiteCacheBackend``: local file, shared by workers on one host and
+  kept across restarts, with no extra service required
+
+Values must be JSON-serialisable.
+"""
+import asyncio
+import fnmatch
+import json
+import logging
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    """Async key/value store with per-key expiry."""
+
+    @abstractmethod
+    async def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        """Return the stored value for each key that exists and has not expired."""
+
+    @abstractmethod
+    async def set_many(self, items: Dict[str, Any], ttl_seconds: Optional[float] = None) -> None:
+        """Store values, expiring after ``ttl_seconds`` (never when ``None``)."""
+
+    @abstractmethod
+    async def delete(self, keys: Iterable[str]) -> None:
+        """Remove keys if present."""
+
+    @abstractmethod
+    async def clear(self, prefix: str = "") -> None:
+        """Remove every key starting with ``prefix``."""
+
+    async def get(self, key: str) -> Optional[Any]:
+        return (await self.get_many([key])).get(key)
+
+    async def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        await self.set_many({key: value}, ttl_seconds)
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Process-local backend; values are JSON round-tripped like the others."""
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, tuple[Optional[float], str]] = {}
+
+    async def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        now = time.time()
+        values: Dict[str, Any] = {}
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            expires_at, payload = entry
+            if expires_at is not None and expires_at <= now:
+                del self._entries[key]
+                continue
+            values[key] = json.loads(payload)
+        return values
+
+    async def set_many(self, items: Dict[str, Any], ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl_seconds if ttl_seconds is not None else None
+        for key, value in items.items():
+            self._entries[key] = (expires_at, json.dumps(value, default=str))
+
+    async def delete(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def clear(self, prefix: str = "") -> None:
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+
+class RedisCacheBackend(CacheBackend):
+    """Backend for any client speaking the ``redis.asyncio`` API."""
+
+    def __init__(self, client: Any, *, namespace: str = "wm:") -> None:
+        self.client = client
+        self.namespace = namespace
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}{key}"
+
+    async def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        payloads = await self.client.mget([self._key(key) for key in keys])
+        return {
+            key: json.loads(payload)
+            for key, payload in zip(keys, payloads)
+            if payload is not None
+        }
+
+    async def set_many(self, items: Dict[str, Any], ttl_seconds: Optional[float] = None) -> None:
+        if not items:
+            return
+        expire_ms = max(int(ttl_seconds * 1000), 1) if ttl_seconds is not None else None
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.set(self._key(key), json.dumps(value, default=str), px=expire_ms)
+            await pipe.execute()
+
+    async def delete(self, keys: Iterable[str]) -> None:
+        namespaced = [self._key(key) for key in keys]
+        if namespaced:
+            await self.client.delete(*namespaced)
+
+    async def clear(self, prefix: str = "") -> None:
+        matched = [key async for key in self.client.scan_iter(match=f"{self._key(prefix)}*")]
+        if matched:
+            await self.client.delete(*matched)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCacheBackend":
+        import redis.asyncio as redis_asyncio
+
+        return cls(redis_asyncio.from_url(url, decode_responses=True))
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """File-backed backend shared by every worker on the same host.
+
+    Each call opens a short-lived connection on a worker thread; WAL mode
+    lets concurrent readers proceed while one worker writes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5.0)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            connection.commit()
+            self._initialized = True
+        return connection
+
+    def _get_many_sync(self, keys: Sequence[str]) -> Dict[str, Any]:
+        now = time.time()
+        connection = self._connect()
+        try:
+            placeholders = ",".join("?" for _ in keys)
+            rows = connection.execute(
+                f"SELECT key, value FROM cache_entries WHERE key IN ({placeholders}) "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                [*keys, now],
+            ).fetchall()
+        finally:
+            connection.close()
+        return {key: json.loads(value) for key, value in rows}
+
+    def _set_many_sync(self, items: Dict[str, Any], ttl_seconds: Optional[float]) -> None:
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds is not None else None
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                    [
+                        (key, json.dumps(value, default=str), expires_at)
+                        for key, value in items.items()
+                    ],
+                )
+                connection.execute(
+                    "DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                    (now,),
+                )
+        finally:
+            connection.close()
+
+    def _execute_sync(self, statement: str, parameters: Sequence[Any]) -> None:
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(statement, parameters)
+        finally:
+            connection.close()
+
+    async def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        return await asyncio.to_thread(self._get_many_sync, list(keys))
+
+    async def set_many(self, items: Dict[str, Any], ttl_seconds: Optional[float] = None) -> None:
+        if items:
+            await asyncio.to_thread(self._set_many_sync, dict(items), ttl_seconds)
+
+    async def delete(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if keys:
+            placeholders = ",".join("?" for _ in keys)
+            await asyncio.to_thread(
+                self._execute_sync,
+                f"DELETE FROM cache_entries WHERE key IN ({placeholders})",
+                keys,
+            )
+
+    async def clear(self, prefix: str = "") -> None:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        await asyncio.to_thread(
+            self._execute_sync,
+            "DELETE FROM cache_entries WHERE key LIKE ? ESCAPE '\\'",
+            [f"{escaped}%"],
+        )
+
+
+class FakeRedis:
+    """In-process stand-in for ``redis.asyncio.Redis`` covering the calls
+    ``RedisCacheBackend`` makes. Lets tests exercise the Redis code path
+    without a server."""
+
+    def __init__(self) -> None:
+        self._data: Dict[str, tuple[Optional[float], str]] = {}
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    async def mget(self, keys: Sequence[str]) -> list:
+        return [self._live(key) for key in keys]
+
+    async def set(self, key: str, value: str, px: Optional[int] = None) -> bool:
+        expires_at = time.time() + px / 1000 if px is not None else None
+        self._data[key] = (expires_at, value)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    async def scan_iter(self, match: str = "*"):
+        for key in list(self._data):
+            if fnmatch.fnmatchcase(key, match) and self._live(key) is not None:
+                yield key
+
+    def pipeline(self, transaction: bool = True) -> "_FakeRedisPipeline":
+        return _FakeRedisPipeline(self)
+
+
+class _FakeRedisPipeline:
+    def __init__(self, client: FakeRedis) -> None:
+        self._client = client
+        self._commands: list = []
+
+    async def __aenter__(self) -> "_FakeRedisPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self._commands.clear()
+
+    def set(self, key: str, value: str, px: Optional[int] = None) -> "_FakeRedisPipeline":
+        self._commands.append((key, value, px))
+        return self
+
+    async def execute(self) -> list:
+        results = [await self._client.set(key, value, px=px) for key, value, px in self._commands]
+        self._commands.clear()
+        return results
+
+
+def create_cache_backend(backend_name: str) -> CacheBackend:
+    """Build the backend named by the ``CACHE_BACKEND`` setting.
+
+    ``auto`` picks Redis when ``REDIS_URL`` is configured and the local
+    SQLite file otherwise.
+    """
+
+    backend_name = backend_name.lower()
+    if backend_name == "auto":
+        backend_name = "redis" if settings.redis_url else "sqlite"
+
+    if backend_name == "memory":
+        return InMemoryCacheBackend()
+    if backend_name == "redis":
+        if not settings.redis_url:
+            raise ValueError("CACHE_BACKEND=redis requires REDIS_URL to be set")
+        return RedisCacheBackend.from_url(settings.redis_url)
+    if backend_name == "sqlite":
+        return SQLiteCacheBackend(settings.cache_sqlite_path)
+    raise ValueError(f"Unknown cache backend: {backend_name}")
+
+
+_cache_backend: Optional[CacheBackend] = None
+
+
+def get_cache_backend() -> CacheBackend:
+    """Return the process-wide shared cache backend, creating it on first use."""
+
+    global _cache_backend
+    if _cache_backend is None:
+        _cache_backend = create_cache_backend(settings.cache_backend)
+        logger.info("Using %s for shared caches", type(_cache_backend).__name__)
+    return _cache_backend
+
+
+def set_cache_backend(backend: Optional[CacheBackend]) -> None:
+    """Replace the shared cache backend (``None`` rebuilds it from settings)."""
+
+    global _cache_backend
+    _cache_backend = backend
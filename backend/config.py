@@ -2,6 +2,7 @@
 # config.py
 import os
 import secrets
+import tempfile
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
@@ -34,7 +35,58 @@ class Settings(BaseSettings):
     snapshot_capture_hour_utc: int = int(os.getenv("SNAPSHOT_CAPTURE_HOUR_UTC", "22"))
     snapshot_capture_minute_utc: int = int(os.getenv("SNAPSHOT_CAPTURE_MINUTE_UTC", "0"))
     snapshot_scheduler_poll_seconds: int = int(os.getenv("SNAPSHOT_SCHEDULER_POLL_SECONDS", "300"))
-    
+    snapshot_scheduler_lease_seconds: float = float(os.getenv("SNAPSHOT_SCHEDULER_LEASE_SECONDS", "120"))
+    snapshot_job_workers: int = int(os.getenv("SNAPSHOT_JOB_WORKERS", "4"))
+    snapshot_job_price_deadline_seconds: float = float(os.getenv("SNAPSHOT_JOB_PRICE_DEADLINE_SECONDS", "120"))
+    snapshot_refresh_debounce_seconds: float = float(os.getenv("SNAPSHOT_REFRESH_DEBOUNCE_SECONDS", "2"))
+
+    # Market data (yfinance) settings
+    market_data_max_workers: int = int(os.getenv("MARKET_DATA_MAX_WORKERS", "8"))
+    market_data_timeout_seconds: float = float(os.getenv("MARKET_DATA_TIMEOUT_SECONDS", "10"))
+    quote_cache_ttl_seconds: float = float(os.getenv("QUOTE_CACHE_TTL_SECONDS", "60"))
+    quote_cache_max_entries: int = int(os.getenv("QUOTE_CACHE_MAX_ENTRIES", "5000"))
+    history_cache_ttl_seconds: float = float(os.getenv("HISTORY_CACHE_TTL_SECONDS", "300"))
+    history_cache_max_entries: int = int(os.getenv("HISTORY_CACHE_MAX_ENTRIES", "256"))
+
+    # Portfolio valuation: quote chunks fetched concurrently under a per-portfolio deadline
+    valuation_chunk_size: int = int(os.getenv("VALUATION_CHUNK_SIZE", "50"))
+    valuation_max_concurrency: int = int(os.getenv("VALUATION_MAX_CONCURRENCY", "4"))
+    valuation_deadline_seconds: float = float(os.getenv("VALUATION_DEADLINE_SECONDS", "5"))
+
+    # Local OHLCV bar store used to answer stock history requests
+    price_store_dir: str = os.getenv(
+        "PRICE_STORE_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "price_store"),
+    )
+    price_store_refresh_seconds: float = float(os.getenv("PRICE_STORE_REFRESH_SECONDS", "900"))
+    price_store_fetch_timeout_seconds: float = float(os.getenv("PRICE_STORE_FETCH_TIMEOUT_SECONDS", "60"))
+
+    # Snapshot holdings older than the retention window move to month/portfolio-bucket archive files
+    snapshot_holdings_retention_days: int = int(os.getenv("SNAPSHOT_HOLDINGS_RETENTION_DAYS", "365"))
+    snapshot_archive_dir: str = os.getenv(
+        "SNAPSHOT_ARCHIVE_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "snapshot_archive"),
+    )
+    snapshot_archive_buckets: int = int(os.getenv("SNAPSHOT_ARCHIVE_BUCKETS", "64"))
+
+    # Snapshot history/comparison responses; entries that reach today expire after the shorter live TTL
+    snapshot_cache_max_entries: int = int(os.getenv("SNAPSHOT_CACHE_MAX_ENTRIES", "1024"))
+    snapshot_cache_ttl_seconds: float = float(os.getenv("SNAPSHOT_CACHE_TTL_SECONDS", "900"))
+    snapshot_cache_live_ttl_seconds: float = float(os.getenv("SNAPSHOT_CACHE_LIVE_TTL_SECONDS", "300"))
+
+    indicator_cache_ttl_seconds: float = float(os.getenv("INDICATOR_CACHE_TTL_SECONDS", "900"))
+    indicator_cache_max_entries: int = int(os.getenv("INDICATOR_CACHE_MAX_ENTRIES", "256"))
+
+    # Shared cache backend: "auto" (Redis when REDIS_URL is set, else SQLite), "memory", "redis" or "sqlite"
+    cache_backend: str = os.getenv("CACHE_BACKEND", "auto")
+    redis_url: str = os.getenv("REDIS_URL", "")
+    cache_sqlite_path: str = os.getenv(
+        "CACHE_SQLITE_PATH",
+        os.path.join(tempfile.gettempdir(), "wealth_management_cache.sqlite3"),
+    )
+    fx_rates_cache_ttl_seconds: float = float(os.getenv("FX_RATES_CACHE_TTL_SECONDS", "3600"))
+    sentiment_cache_ttl_seconds: float = float(os.getenv("SENTIMENT_CACHE_TTL_SECONDS", "86400"))
+
     # Database URLs as computed fields
     database_url: str = ""
     database_url_async: str = ""
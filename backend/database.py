@@ -1,4 +1,8 @@
 # database.py
+from datetime import timedelta
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from contextlib import asynccontextmanager
@@ -55,6 +59,31 @@ async def get_db():
             await session.rollback()
             raise
 
+def dialect_insert(db: AsyncSession):
+    """Return the ``insert`` construct that supports ON CONFLICT for the session's database."""
+
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert
+    if dialect_name == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"Upserts are not supported on {dialect_name}")
+
+def db_now(db: AsyncSession, offset_seconds: float = 0.0):
+    """SQL expression for the database's current UTC time plus ``offset_seconds``.
+
+    Used where several processes compare timestamps, so their local clocks
+    do not have to agree.
+    """
+
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        return func.now() + timedelta(seconds=offset_seconds)
+    if dialect_name == "sqlite":
+        # Same text layout SQLAlchemy stores DateTime columns in on SQLite.
+        return func.strftime("%Y-%m-%d %H:%M:%f", "now", f"{offset_seconds:+f} seconds")
+    raise NotImplementedError(f"Database time is not supported on {dialect_name}")
+
 # For FastAPI dependency injection
 async def get_db_dependency():
     """
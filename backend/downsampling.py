@@ -0,0 +1,57 @@
+# downsampling.py
+"""
+Shape-preserving downsampling for chart series.
+
+Charts are a few hundred pixels wide, so long histories are reduced with
+Largest-Triangle-Three-Buckets (LTTB) before they are serialized. LTTB keeps
+the first and last points and, for each bucket in between, the point that
+forms the largest triangle with the previously kept point and the average of
+the next bucket. Peaks and troughs survive, unlike with plain striding.
+"""
+from typing import Sequence, Union
+
+import numpy as np
+
+ArrayLike = Union[np.ndarray, Sequence[float]]
+
+
+def lttb_indices(x: ArrayLike, y: ArrayLike, max_points: int) -> np.ndarray:
+    """Return sorted indices of at most ``max_points`` points to keep.
+
+    ``x`` must be increasing. All indices are returned when the series
+    already fits.
+    """
+
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1][:max(max_points, 0)], dtype=np.int64)
+
+    x = np.asarray(x, dtype=np.float64)
+    buckets = max_points - 2
+    # Interior points 1..n-2 split into ``buckets`` non-empty ranges.
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(buckets):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 1 < buckets:
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+            next_x = x[next_start:next_end].mean()
+            next_y = y[next_start:next_end].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        prev_x, prev_y = x[previous], y[previous]
+        areas = np.abs(
+            (prev_x - next_x) * (y[start:end] - prev_y)
+            - (prev_x - x[start:end]) * (next_y - prev_y)
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
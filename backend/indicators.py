@@ -0,0 +1,191 @@
+# indicators.py
+"""
+Technical indicators computed server-side from the local price store.
+
+Indicators are requested as a comma-separated spec such as
+``sma:20,ema:50,rsi:14,bbands:20:2,macd:12:26:9``. Omitted parameters take
+their defaults. Each indicator is computed over the full stored history and
+then cut to the requested period, so EMA/RSI values at the start of the
+period are already warmed up. Results are cached per
+(symbol, period, indicator set) in the shared cache backend, except empty
+ones (no bars in the period, or too little history for any indicator
+value), which would otherwise stay empty for the whole TTL after the
+history fills in.
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .cache_backends import get_cache_backend
+from .config import settings
+from .market_cache import MarketDataCache
+from .price_store import column_to_list, format_dates, period_start_index, price_store
+
+MAX_INDICATORS = 10
+MAX_PARAMETER = 500
+
+_DEFAULT_PARAMETERS: Dict[str, Tuple[int, ...]] = {
+    "sma": (20,),
+    "ema": (20,),
+    "rsi": (14,),
+    "bbands": (20, 2),
+    "macd": (12, 26, 9),
+}
+
+
+class IndicatorSpec(NamedTuple):
+    """A single requested indicator and its integer parameters."""
+
+    name: str
+    params: Tuple[int, ...]
+
+    @property
+    def key(self) -> str:
+        return ":".join((self.name, *map(str, self.params)))
+
+    @property
+    def label(self) -> str:
+        return "_".join((self.name, *map(str, self.params)))
+
+
+def parse_indicator_specs(spec: str) -> List[IndicatorSpec]:
+    """Parse and normalise an indicator spec string.
+
+    Raises ``ValueError`` for unknown indicators or invalid parameters.
+    Duplicates are dropped and the result is sorted so equivalent requests
+    share a cache entry.
+    """
+
+    specs = set()
+    for part in filter(None, (item.strip().lower() for item in spec.split(","))):
+        name, *raw_params = part.split(":")
+        defaults = _DEFAULT_PARAMETERS.get(name)
+        if defaults is None:
+            raise ValueError(
+                f"Unknown indicator '{name}'. Supported: {', '.join(sorted(_DEFAULT_PARAMETERS))}"
+            )
+        if len(raw_params) > len(defaults):
+            raise ValueError(f"Indicator '{name}' takes at most {len(defaults)} parameters")
+        try:
+            params = tuple(int(value) for value in raw_params)
+        except ValueError:
+            raise ValueError(f"Indicator '{name}' parameters must be integers")
+        params += defaults[len(params):]
+        if any(value < 1 or value > MAX_PARAMETER for value in params):
+            raise ValueError(f"Indicator '{name}' parameters must be between 1 and {MAX_PARAMETER}")
+        if name == "macd" and params[0] >= params[1]:
+            raise ValueError("MACD fast period must be shorter than the slow period")
+        specs.add(IndicatorSpec(name, params))
+
+    if not specs:
+        raise ValueError("At least one indicator is required")
+    if len(specs) > MAX_INDICATORS:
+        raise ValueError(f"At most {MAX_INDICATORS} indicators can be requested at once")
+    return sorted(specs)
+
+
+def _sma(close: pd.Series, window: int) -> Dict[str, pd.Series]:
+    return {"": close.rolling(window).mean()}
+
+
+def _ema(close: pd.Series, span: int) -> Dict[str, pd.Series]:
+    return {"": close.ewm(span=span, adjust=False, min_periods=span).mean()}
+
+
+def _rsi(close: pd.Series, window: int) -> Dict[str, pd.Series]:
+    # Wilder's smoothing is an EMA with alpha = 1 / window.
+    delta = close.diff()
+    average_gain = delta.clip(lower=0).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+    average_loss = (-delta.clip(upper=0)).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+    rsi = 100 - 100 / (1 + average_gain / average_loss)
+    # No losses reads as 100; a flat window (no gains either) is neutral.
+    rsi = rsi.mask(average_loss == 0, 100.0).mask((average_gain == 0) & (average_loss == 0), 50.0)
+    return {"": rsi}
+
+
+def _bbands(close: pd.Series, window: int, num_std: int) -> Dict[str, pd.Series]:
+    rolling = close.rolling(window)
+    middle = rolling.mean()
+    width = rolling.std(ddof=0) * num_std
+    return {"_upper": middle + width, "_middle": middle, "_lower": middle - width}
+
+
+def _macd(close: pd.Series, fast: int, slow: int, signal: int) -> Dict[str, pd.Series]:
+    macd = (
+        close.ewm(span=fast, adjust=False, min_periods=fast).mean()
+        - close.ewm(span=slow, adjust=False, min_periods=slow).mean()
+    )
+    signal_line = macd.ewm(span=signal, adjust=False, min_periods=signal).mean()
+    return {"": macd, "_signal": signal_line, "_hist": macd - signal_line}
+
+
+_CALCULATORS: Dict[str, Callable[..., Dict[str, pd.Series]]] = {
+    "sma": _sma,
+    "ema": _ema,
+    "rsi": _rsi,
+    "bbands": _bbands,
+    "macd": _macd,
+}
+
+
+def compute_indicators(close: np.ndarray, specs: List[IndicatorSpec]) -> Dict[str, np.ndarray]:
+    """Return one float array per output line, aligned with ``close``."""
+
+    series = pd.Series(np.asarray(close, dtype=np.float64))
+    results: Dict[str, np.ndarray] = {}
+    for spec in specs:
+        for suffix, values in _CALCULATORS[spec.name](series, *spec.params).items():
+            results[f"{spec.label}{suffix}"] = values.to_numpy(dtype=np.float64)
+    return results
+
+
+indicator_cache: MarketDataCache[str, Dict[str, Any]] = MarketDataCache(
+    ttl_seconds=settings.indicator_cache_ttl_seconds,
+    max_entries=settings.indicator_cache_max_entries,
+    namespace="indicators:",
+    shared_backend=get_cache_backend,
+)
+
+
+def _is_empty_payload(payload: Dict[str, Any]) -> bool:
+    return not payload["dates"] or all(
+        value is None for values in payload["indicators"].values() for value in values
+    )
+
+
+async def get_indicator_payload(symbol: str, period: str, specs: List[IndicatorSpec]) -> Dict[str, Any]:
+    """Return dates, closes and indicator columns for ``symbol`` over ``period``."""
+
+    symbol = symbol.upper()
+    cache_key = f"{symbol}:{period}:{','.join(spec.key for spec in specs)}"
+
+    async def _compute() -> Dict[str, Any]:
+        bars = await price_store.get_bars(symbol, "max")
+        start = period_start_index(bars["timestamp"], period)
+        indicators = compute_indicators(bars["close"], specs)
+        return {
+            "symbol": symbol,
+            "period": period,
+            "dates": format_dates(bars["timestamp"][start:]),
+            "close": column_to_list(bars["close"][start:]),
+            "indicators": {
+                label: column_to_list(values[start:]) for label, values in indicators.items()
+            },
+        }
+
+    uncached: Dict[str, Dict[str, Any]] = {}
+
+    async def _fetch(keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        payload = await _compute()
+        if _is_empty_payload(payload):
+            # Keys left out of the result are returned to nobody and not cached.
+            uncached[cache_key] = payload
+            return {}
+        return {cache_key: payload}
+
+    results = await indicator_cache.get_many([cache_key], _fetch)
+    if cache_key in results:
+        return results[cache_key]
+    # Either this call built an empty payload, or it waited on another call's.
+    return uncached.get(cache_key) or await _compute()
@@ -11,8 +11,8 @@ from sqlalchemy import func
 from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError
 from datetime import date, datetime, timedelta, timezone
-import yfinance as yf
-from functools import lru_cache
+import hashlib
+import numpy as np
 from typing import List, Optional, Dict, Any, cast
 
 # Import local modules
@@ -29,11 +29,21 @@ from .models import (
 )
 from .portfolio_snapshots import (
     capture_portfolio_snapshot,
+    get_portfolio_snapshot_analytics,
     get_portfolio_snapshot_comparison,
     get_portfolio_snapshot_by_date,
     get_portfolio_snapshot_history,
 )
 from .snapshot_jobs import run_daily_snapshot_scheduler
+from .snapshot_cache import snapshot_response_cache
+from .snapshot_refresh import snapshot_refresh_queue
+from .market_data import market_data
+from .downsampling import lttb_indices
+from .valuation import value_holdings, valuation_engine
+from .indicators import get_indicator_payload, indicator_cache, parse_indicator_specs
+from .price_store import bars_to_records, column_to_list, format_dates, price_store
+from .responses import FastJSONResponse
+from .cache_backends import get_cache_backend
 from .schemas import (
     UserCreate, UserOut, Token, PortfolioCreate, PortfolioOut,
     PortfolioUpdate, PortfolioWithSummary, PortfolioSummary, AssetCreate, AssetOut,
@@ -44,6 +54,7 @@ from .schemas import (
     PensionPlanUpdate, PensionPlanOut, PensionCalculationRequest, PensionCalculationResponse,
     PensionProjection, WatchlistItemCreate, WatchlistItemOut, WatchlistItemSentiment,
     PortfolioSnapshotOut, PortfolioSnapshotHistoryResponse, PortfolioSnapshotComparisonOut,
+    PortfolioSnapshotAnalyticsOut, NetWorthSummaryOut, PortfolioTotalsOut,
 )
 from .auth import (
     authenticate_user, create_access_token, get_current_user,
@@ -65,29 +76,6 @@ snapshot_scheduler_task: Optional[asyncio.Task[None]] = None
 snapshot_scheduler_stop_event: Optional[asyncio.Event] = None
 
 
-async def refresh_today_snapshot_after_asset_write(
-    db: AsyncSession,
-    portfolio_id: int,
-    current_user: User,
-) -> None:
-    """Best-effort daily snapshot refresh after portfolio mutations."""
-
-    try:
-        snapshot = await capture_portfolio_snapshot(db, portfolio_id, current_user.id)
-        if snapshot is not None:
-            logger.info(
-                "Refreshed portfolio snapshot for portfolio %s as of %s",
-                portfolio_id,
-                snapshot.as_of,
-            )
-    except Exception as exc:
-        await db.rollback()
-        logger.warning(
-            "Portfolio snapshot refresh failed for portfolio %s after asset mutation: %s",
-            portfolio_id,
-            exc,
-        )
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup events
@@ -161,6 +149,8 @@ async def shutdown_event():
         snapshot_scheduler_task = None
         snapshot_scheduler_stop_event = None
 
+    await snapshot_refresh_queue.close()
+    market_data.shutdown()
     logger.info("Shutting down application")
 
 # Health check endpoint
@@ -169,6 +159,20 @@ def health_check():
     """Check if the API is running."""
     return {"status": "ok", "version": "1.0.0"}
 
+@app.get("/health/market-data", tags=["System"])
+def market_data_health():
+    """Report market-data cache hit/miss/coalesced counters for this worker."""
+    return {
+        "caches": {
+            **market_data.cache_stats(),
+            "indicators": {**indicator_cache.stats.as_dict(), "entries": len(indicator_cache)},
+            "snapshot_responses": {
+                **snapshot_response_cache.stats.as_dict(),
+                "entries": len(snapshot_response_cache),
+            },
+        }
+    }
+
 # Authentication endpoints
 @app.post("/auth/token", response_model=Token, tags=["Authentication"])
 async def login_for_access_token(
@@ -320,6 +324,83 @@ async def get_portfolios(
             detail="An error occurred while fetching portfolios"
         )
 
+# Declared before /portfolios/{portfolio_id} so "summary" is not parsed as an id
+@app.get("/portfolios/summary", response_model=NetWorthSummaryOut, tags=["Portfolios"])
+async def get_portfolios_summary(
+    db: AsyncSession = Depends(get_db_dependency),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get per-portfolio and overall totals for all of the user's portfolios.
+
+    All assets are loaded in one query and each distinct symbol is priced
+    once, however many portfolios hold it.
+    """
+    try:
+        result = await db.execute(
+            select(Portfolio.id, Portfolio.name)
+            .where(Portfolio.owner_id == current_user.id)
+            .order_by(Portfolio.id)
+        )
+        portfolios = result.all()
+        
+        result = await db.execute(
+            select(Asset)
+            .join(Portfolio, Asset.portfolio_id == Portfolio.id)
+            .where(Portfolio.owner_id == current_user.id)
+        )
+        assets = list(result.scalars().all())
+        
+        asset_prices = await valuation_engine.price_assets(db, assets)
+        prices = [asset_prices[int(asset.id)] for asset in assets]
+        valuation = value_holdings(
+            [asset.quantity for asset in assets],
+            [asset.purchase_price for asset in assets],
+            [price.price for price in prices],
+        )
+        
+        # Sum holdings into their portfolios in one pass per column
+        position = {portfolio_id: index for index, (portfolio_id, _) in enumerate(portfolios)}
+        groups = np.array([position[int(asset.portfolio_id)] for asset in assets], dtype=np.int64)
+        count = len(portfolios)
+        values = np.bincount(groups, weights=valuation.current_value, minlength=count)
+        costs = np.bincount(groups, weights=valuation.total_cost, minlength=count)
+        asset_counts = np.bincount(groups, minlength=count)
+        estimated = np.bincount(groups, weights=[not price.is_live for price in prices], minlength=count)
+        
+        net_worth = valuation.portfolio_value
+        portfolio_totals = []
+        for index, (portfolio_id, name) in enumerate(portfolios):
+            value, cost = float(values[index]), float(costs[index])
+            profit_loss = value - cost
+            portfolio_totals.append(PortfolioTotalsOut(
+                portfolio_id=portfolio_id,
+                name=name,
+                asset_count=int(asset_counts[index]),
+                total_value=value,
+                total_cost=cost,
+                total_profit_loss=profit_loss,
+                total_profit_loss_percent=(profit_loss / cost) * 100 if cost > 0 else 0,
+                allocation_percent=(value / net_worth) * 100 if net_worth > 0 else 0,
+                estimated_asset_count=int(estimated[index])
+            ))
+        
+        return NetWorthSummaryOut(
+            summary=PortfolioSummary(
+                total_value=net_worth,
+                total_cost=valuation.portfolio_cost,
+                total_profit_loss=valuation.portfolio_profit_loss,
+                total_profit_loss_percent=valuation.portfolio_profit_loss_percent,
+                last_updated=datetime.now(timezone.utc)
+            ),
+            portfolios=portfolio_totals
+        )
+    except Exception as e:
+        logger.error(f"Error building portfolio summary: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while building the portfolio summary"
+        )
+
 @app.get("/portfolios/{portfolio_id}", response_model=PortfolioWithSummary, tags=["Portfolios"])
 async def get_portfolio(
     portfolio_id: int = Path(..., ge=1),
@@ -343,82 +424,56 @@ async def get_portfolio(
                 detail="Portfolio not found"
             )
         
-        # Calculate portfolio summary
-        total_cost = 0.0
-        total_value = 0.0
-        assets_with_performance = []
-        
-        for asset in portfolio.assets:
-            # Get latest price
-            try:
-                stock = yf.Ticker(str(asset.symbol))
-                latest_price = stock.history(period="1d")["Close"].iloc[-1]
-                
-                # Calculate performance - convert to float to avoid type issues
-                asset_quantity = float(getattr(asset, "quantity"))
-                asset_purchase_price = float(getattr(asset, "purchase_price"))
-                asset_cost = asset_quantity * asset_purchase_price
-                asset_value = asset_quantity * float(latest_price)
-                profit_loss = asset_value - asset_cost
-                profit_loss_percent = (profit_loss / asset_cost) * 100 if asset_cost > 0 else 0
-                
-                # Add to totals
-                total_cost += asset_cost
-                total_value += asset_value
-                
-                # Add to assets list - use proper type conversions for all numeric values
-                asset_data = AssetWithPerformance(
-                    id=int(str(asset.id)),
-                    symbol=str(asset.symbol),
-                    quantity=asset_quantity,
-                    purchase_price=asset_purchase_price,
-                    purchase_date=cast(datetime, asset.purchase_date),
-                    notes=str(asset.notes) if asset.notes is not None else None,
-                    portfolio_id=int(str(asset.portfolio_id)),
-                    current_price=float(latest_price),
-                    current_value=float(asset_value),
-                    profit_loss=float(profit_loss),
-                    profit_loss_percent=float(profit_loss_percent),
-                    created_at=cast(datetime, asset.created_at),
-                    updated_at=cast(datetime, asset.updated_at),
-                    last_updated=datetime.now(timezone.utc)
-                )
-                assets_with_performance.append(asset_data)
-            except Exception as e:
-                logger.warning(f"Error fetching price for {asset.symbol}: {str(e)}")
-                # Include asset with default performance values
-                asset_quantity = float(asset.quantity)
-                asset_purchase_price = float(asset.purchase_price)
-                asset_value = asset_quantity * asset_purchase_price
-                
-                asset_data = AssetWithPerformance(
-                    id=int(str(asset.id)),
-                    symbol=str(asset.symbol),
-                    quantity=asset_quantity,
-                    purchase_price=asset_purchase_price,
-                    purchase_date=cast(datetime, asset.purchase_date),
-                    notes=str(asset.notes) if asset.notes is not None else None,
-                    portfolio_id=int(str(asset.portfolio_id)),
-                    current_price=asset_purchase_price,
-                    current_value=float(asset_value),
-                    profit_loss=0.0,
-                    profit_loss_percent=0.0,
-                    created_at=cast(datetime, asset.created_at),
-                    updated_at=cast(datetime, asset.updated_at),
-                    last_updated=datetime.now(timezone.utc)
-                )
-                assets_with_performance.append(asset_data)
+        # Price all holdings concurrently within the valuation deadline;
+        # holdings without a live quote use a stale or purchase price
+        assets = list(portfolio.assets)
+        asset_prices = await valuation_engine.price_assets(db, assets)
+        prices = [asset_prices[int(asset.id)] for asset in assets]
+        
+        # Value every holding at once
+        valuation = value_holdings(
+            [asset.quantity for asset in assets],
+            [asset.purchase_price for asset in assets],
+            [price.price for price in prices],
+        )
+        
+        last_updated = datetime.now(timezone.utc)
+        assets_with_performance = [
+            {
+                "id": asset.id,
+                "symbol": asset.symbol,
+                "quantity": quantity,
+                "purchase_price": asset.purchase_price,
+                "purchase_date": asset.purchase_date,
+                "notes": asset.notes,
+                "portfolio_id": asset.portfolio_id,
+                "current_price": current_price,
+                "current_value": current_value,
+                "profit_loss": profit_loss,
+                "profit_loss_percent": profit_loss_percent,
+                "price_source": price.source,
+                "created_at": asset.created_at,
+                "updated_at": asset.updated_at,
+                "last_updated": last_updated,
+            }
+            for asset, price, quantity, current_price, current_value, profit_loss, profit_loss_percent in zip(
+                assets,
+                prices,
+                valuation.quantity.tolist(),
+                valuation.price.tolist(),
+                valuation.current_value.tolist(),
+                valuation.profit_loss.tolist(),
+                valuation.profit_loss_percent.tolist(),
+            )
+        ]
         
         # Create summary
-        total_profit_loss = total_value - total_cost
-        total_profit_loss_percent = (total_profit_loss / total_cost) * 100 if total_cost > 0 else 0
-        
         summary = PortfolioSummary(
-            total_value=total_value,
-            total_cost=total_cost,
-            total_profit_loss=total_profit_loss,
-            total_profit_loss_percent=total_profit_loss_percent,
-            last_updated=datetime.now(timezone.utc)
+            total_value=valuation.portfolio_value,
+            total_cost=valuation.portfolio_cost,
+            total_profit_loss=valuation.portfolio_profit_loss,
+            total_profit_loss_percent=valuation.portfolio_profit_loss_percent,
+            last_updated=last_updated
         )
         
         # Create response - ensure all SQLAlchemy Column values are converted to Python primitives
@@ -580,11 +635,18 @@ async def capture_portfolio_snapshot_endpoint(
 )
 async def list_portfolio_snapshots(
     portfolio_id: int = Path(..., ge=1),
-    days: int = Query(30, ge=1, le=365),
+    days: int = Query(30, ge=1, le=3660),
+    max_points: Optional[int] = Query(None, ge=3, le=10000),
+    resolution: str = Query("auto", pattern="^(auto|day|week|month)$"),
     db: AsyncSession = Depends(get_db_dependency),
     current_user: User = Depends(get_current_active_user),
 ):
-    """Return persisted daily portfolio value history."""
+    """Return persisted portfolio value history.
+
+    ``resolution=auto`` reads daily snapshots for up to a year and weekly or
+    monthly rollups for longer ranges. ``max_points`` downsamples the series
+    for charting while keeping its shape.
+    """
 
     try:
         history = await get_portfolio_snapshot_history(
@@ -592,6 +654,8 @@ async def list_portfolio_snapshots(
             portfolio_id,
             current_user.id,
             days=days,
+            max_points=max_points,
+            resolution=resolution,
         )
         if history is None:
             raise HTTPException(
@@ -652,6 +716,56 @@ async def compare_portfolio_snapshots(
         )
 
 
+@app.get(
+    "/portfolios/{portfolio_id}/snapshots/analytics",
+    response_model=PortfolioSnapshotAnalyticsOut,
+    tags=["Portfolio Snapshots"],
+)
+async def portfolio_snapshot_analytics(
+    portfolio_id: int = Path(..., ge=1),
+    from_date: Optional[date] = Query(None),
+    to_date: Optional[date] = Query(None),
+    volatility_window: int = Query(21, ge=2, le=252),
+    db: AsyncSession = Depends(get_db_dependency),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Return time-weighted return, drawdown and volatility over a date range.
+
+    Quantity changes between snapshots count as deposits or withdrawals at
+    market value, not as gains or losses. ``to_date`` defaults to today and
+    ``from_date`` to a year before it.
+    """
+
+    try:
+        analytics = await get_portfolio_snapshot_analytics(
+            db,
+            portfolio_id,
+            current_user.id,
+            from_date=from_date,
+            to_date=to_date,
+            volatility_window=volatility_window,
+        )
+        if analytics is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Not enough portfolio snapshots for analytics",
+            )
+        return analytics
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing portfolio snapshot analytics: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while computing portfolio snapshot analytics",
+        )
+
+
 @app.get(
     "/portfolios/{portfolio_id}/snapshots/{snapshot_date}",
     response_model=PortfolioSnapshotOut,
@@ -729,8 +843,7 @@ async def create_asset(
         
         # Get current market price
         try:
-            stock = yf.Ticker(str(new_asset.symbol))
-            latest_price = stock.history(period="1d")["Close"].iloc[-1]
+            latest_price = await market_data.get_latest_price(str(new_asset.symbol))
             
             # Store price history - explicitly convert to primitives
             price_history = AssetPriceHistory(
@@ -743,7 +856,7 @@ async def create_asset(
         except Exception as e:
             logger.warning(f"Could not fetch current price for {new_asset.symbol}: {str(e)}")
 
-        await refresh_today_snapshot_after_asset_write(db, portfolio_id, current_user)
+        snapshot_refresh_queue.enqueue(portfolio_id, current_user.id, cast(int, new_asset.id))
         
         return new_asset
     except HTTPException:
@@ -838,71 +951,39 @@ async def get_asset(
                 detail="Asset not found"
             )
         
-        # Try to get current market price
-        try:
-            stock = yf.Ticker(str(asset.symbol))
-            latest_price = stock.history(period="1d")["Close"].iloc[-1]
-            
-            # Calculate performance
-            asset_quantity = cast(float, asset.quantity)
-            asset_purchase_price = cast(float, asset.purchase_price)
-            asset_cost = asset_quantity * asset_purchase_price
-            asset_value = asset_quantity * latest_price
-            profit_loss = asset_value - asset_cost
-            profit_loss_percent = (profit_loss / asset_cost) * 100 if asset_cost > 0 else 0
-            
-            # Create response with performance data
-            asset_with_performance = AssetWithPerformance(
-                id=int(str(asset.id)),
-                symbol=str(asset.symbol),
-                quantity=asset_quantity,
-                purchase_price=asset_purchase_price,
-                purchase_date=cast(datetime, asset.purchase_date),
-                notes=str(asset.notes) if asset.notes is not None else None,
-                portfolio_id=int(str(asset.portfolio_id)),
-                current_price=float(latest_price),
-                current_value=float(asset_value),
-                profit_loss=float(profit_loss),
-                profit_loss_percent=float(profit_loss_percent),
-                created_at=cast(datetime, asset.created_at),
-                updated_at=cast(datetime, asset.updated_at),
-                last_updated=datetime.now(timezone.utc)
-            )
-            
-            # Store price history
+        # Get current market price, falling back to a stale or purchase price
+        asset_price = (await valuation_engine.price_assets(db, [asset]))[int(asset.id)]
+        valuation = value_holdings([asset.quantity], [asset.purchase_price], [asset_price.price])
+        
+        asset_with_performance = AssetWithPerformance(
+            id=int(str(asset.id)),
+            symbol=str(asset.symbol),
+            quantity=float(valuation.quantity[0]),
+            purchase_price=float(asset.purchase_price),
+            purchase_date=cast(datetime, asset.purchase_date),
+            notes=str(asset.notes) if asset.notes is not None else None,
+            portfolio_id=int(str(asset.portfolio_id)),
+            current_price=asset_price.price,
+            current_value=float(valuation.current_value[0]),
+            profit_loss=float(valuation.profit_loss[0]),
+            profit_loss_percent=float(valuation.profit_loss_percent[0]),
+            price_source=asset_price.source,
+            created_at=cast(datetime, asset.created_at),
+            updated_at=cast(datetime, asset.updated_at),
+            last_updated=datetime.now(timezone.utc)
+        )
+        
+        # Store price history
+        if asset_price.is_live:
             price_history = AssetPriceHistory(
                 asset_id=asset.id,
-                price=float(latest_price),
+                price=asset_price.price,
                 timestamp=datetime.now(timezone.utc)
             )
             db.add(price_history)
             await db.commit()
-            
-            return asset_with_performance
-        except Exception as e:
-            logger.warning(f"Could not fetch current price for {asset.symbol}: {str(e)}")
-            
-            # Return asset without performance data
-            # Return asset with default values for performance metrics
-            asset_quantity = float(str(asset.quantity))
-            asset_purchase_price = float(str(asset.purchase_price))
-            
-            return AssetWithPerformance(
-                id=int(str(asset.id)),
-                symbol=str(asset.symbol),
-                quantity=asset_quantity,
-                purchase_price=asset_purchase_price,
-                purchase_date=cast(datetime, asset.purchase_date),
-                notes=str(asset.notes) if str(asset.notes) else None,
-                portfolio_id=int(str(asset.portfolio_id)),
-                current_price=asset_purchase_price,
-                current_value=asset_quantity * asset_purchase_price,
-                profit_loss=0.0,
-                profit_loss_percent=0.0,
-                created_at=cast(datetime, asset.created_at),
-                updated_at=cast(datetime, asset.updated_at),
-                last_updated=datetime.now(timezone.utc)
-            )
+        
+        return asset_with_performance
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
@@ -972,7 +1053,7 @@ async def update_asset(
         await db.refresh(asset)
         logger.info(f"Asset updated: {asset.symbol}")
 
-        await refresh_today_snapshot_after_asset_write(db, portfolio_id, current_user)
+        snapshot_refresh_queue.enqueue(portfolio_id, current_user.id, asset_id)
         
         return asset
     except HTTPException:
@@ -1028,7 +1109,7 @@ async def delete_asset(
         await db.commit()
         logger.info(f"Asset deleted: {asset.symbol}")
 
-        await refresh_today_snapshot_after_asset_write(db, portfolio_id, current_user)
+        snapshot_refresh_queue.enqueue(portfolio_id, current_user.id, asset_id)
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
@@ -1041,6 +1122,49 @@ async def delete_asset(
         )
 
 # Stock Data Endpoints
+MAX_HISTORY_SYMBOLS = 20
+
+# Declared before /stocks/{symbol} so "history" is not taken as a symbol
+@app.get("/stocks/history", tags=["Stocks"], response_class=FastJSONResponse)
+async def get_multi_stock_history(
+    symbols: str = Query(..., min_length=1, max_length=300, description="Comma-separated symbols, e.g. AAPL,MSFT"),
+    period: str = Query("1mo", pattern="^(1d|5d|1mo|3mo|6mo|1y|2y|5y|10y|ytd|max)$"),
+    field: str = Query("close", pattern="^(open|high|low|close|volume)$"),
+):
+    """Get historical data for several symbols aligned on one date index.
+
+    Returns a ``dates`` array plus one value array per symbol; ``null`` marks
+    dates on which a symbol did not trade.
+    """
+    try:
+        symbol_list = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+        if not symbol_list:
+            raise ValueError("At least one symbol is required")
+        if len(symbol_list) > MAX_HISTORY_SYMBOLS:
+            raise ValueError(f"At most {MAX_HISTORY_SYMBOLS} symbols can be requested at once")
+        
+        timestamps, aligned = await price_store.get_aligned(symbol_list, period, field)
+        
+        return FastJSONResponse({
+            "symbols": symbol_list,
+            "period": period,
+            "field": field,
+            "dates": format_dates(timestamps),
+            "values": {s: column_to_list(aligned[s]) for s in symbol_list if s in aligned},
+            "missing": [s for s in symbol_list if s not in aligned]
+        })
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error fetching history for {symbols}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred while fetching stock history: {str(e)}"
+        )
+
 @app.get("/stocks/{symbol}", tags=["Stocks"])
 async def get_stock_data(symbol: str):
     """Get current data for a stock symbol."""
@@ -1049,8 +1173,7 @@ async def get_stock_data(symbol: str):
         symbol = symbol.upper()
         
         # Fetch stock data
-        stock = yf.Ticker(symbol)
-        history = stock.history(period="1d")
+        history = await market_data.get_history(symbol, "1d")
         
         if history.empty:
             return {
@@ -1081,44 +1204,42 @@ async def get_stock_data(symbol: str):
             detail=f"An error occurred while fetching stock data: {str(e)}"
         )
 
-@app.get("/stocks/{symbol}/history", tags=["Stocks"])
+@app.get("/stocks/{symbol}/history", tags=["Stocks"], response_class=FastJSONResponse)
 async def get_stock_history(
     symbol: str,
-    period: str = Query("1mo", regex="^(1d|5d|1mo|3mo|6mo|1y|2y|5y|10y|ytd|max)$")
+    period: str = Query("1mo", pattern="^(1d|5d|1mo|3mo|6mo|1y|2y|5y|10y|ytd|max)$"),
+    max_points: Optional[int] = Query(None, ge=3, le=10000),
 ):
-    """Get historical data for a stock symbol."""
+    """Get historical data for a stock symbol.
+
+    ``max_points`` downsamples the bars (by close) for charting while keeping
+    the shape of the series.
+    """
     try:
         # Normalize symbol
         symbol = symbol.upper()
         
-        # Fetch stock data
-        stock = yf.Ticker(symbol)
-        history = stock.history(period=period)
+        # Serve from the local bar store, which only fetches the missing tail
+        bars = await price_store.get_bars(symbol, period)
         
-        if history.empty:
+        if len(bars) == 0:
             return {
                 "symbol": symbol,
                 "history": [],
                 "error": "No historical data available for this symbol"
             }
         
-        # Format response
-        history_data = []
-        for date, row in history.iterrows():
-            history_data.append({
-                "date": str(date) if date is not None else None,
-                "open": row["Open"],
-                "high": row["High"],
-                "low": row["Low"],
-                "close": row["Close"],
-                "volume": row["Volume"]
-            })
+        if max_points is not None:
+            bars = bars[lttb_indices(bars["timestamp"], bars["close"], max_points)]
         
-        return {
+        # Format response column-wise and encode it directly
+        history_data = bars_to_records(bars)
+        
+        return FastJSONResponse({
             "symbol": symbol,
             "period": period,
             "history": history_data
-        }
+        })
     except Exception as e:
         logger.error(f"Error fetching stock history for {symbol}: {str(e)}")
         raise HTTPException(
@@ -1126,7 +1247,81 @@ async def get_stock_history(
             detail=f"An error occurred while fetching stock history: {str(e)}"
         )
 
+@app.get("/stocks/{symbol}/indicators", tags=["Stocks"], response_class=FastJSONResponse)
+async def get_stock_indicators(
+    symbol: str,
+    period: str = Query("1y", pattern="^(1d|5d|1mo|3mo|6mo|1y|2y|5y|10y|ytd|max)$"),
+    indicators: str = Query(
+        "sma:20,ema:50,rsi:14",
+        max_length=200,
+        description="Comma-separated specs, e.g. sma:20,ema:50,rsi:14,bbands:20:2,macd:12:26:9",
+    ),
+):
+    """Compute technical indicators for a stock symbol from stored history."""
+    try:
+        symbol = symbol.upper()
+        specs = parse_indicator_specs(indicators)
+        payload = await get_indicator_payload(symbol, period, specs)
+        
+        if not payload["dates"]:
+            return FastJSONResponse({
+                **payload,
+                "error": "No historical data available for this symbol"
+            })
+        
+        return FastJSONResponse(payload)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error computing indicators for {symbol}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred while computing stock indicators: {str(e)}"
+        )
+
 # Sentiment Analysis Endpoints
+def _sentiment_cache_key(text: str) -> str:
+    """Shared-cache key for a sentiment result of the given text."""
+    return f"sentiment:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+def _normalize_sentiment(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a model result to JSON-safe label/score values."""
+    return {"label": str(result["label"]), "score": float(result["score"])}
+
+async def _read_sentiment_cache(keys: List[str]) -> Dict[str, Any]:
+    try:
+        return await get_cache_backend().get_many(keys)
+    except Exception as e:
+        logger.warning(f"Sentiment cache read failed: {str(e)}")
+        return {}
+
+async def _write_sentiment_cache(results: Dict[str, Any]) -> None:
+    try:
+        await get_cache_backend().set_many(results, settings.sentiment_cache_ttl_seconds)
+    except Exception as e:
+        logger.warning(f"Sentiment cache write failed: {str(e)}")
+
+async def _analyze_texts_cached(texts: List[str]) -> List[Dict[str, Any]]:
+    """Run the sentiment model over texts, reusing cached results per text."""
+    keys = [_sentiment_cache_key(text) for text in texts]
+    cached = await _read_sentiment_cache(keys)
+
+    missing_texts = list(dict.fromkeys(
+        text for text, key in zip(texts, keys) if key not in cached
+    ))
+    if missing_texts:
+        fresh_results = {
+            _sentiment_cache_key(text): _normalize_sentiment(result)
+            for text, result in zip(missing_texts, globalSetting.sentiment_model(missing_texts))
+        }
+        await _write_sentiment_cache(fresh_results)
+        cached.update(fresh_results)
+
+    return [cached[key] for key in keys]
+
 @app.post("/sentiment/analyze", response_model=SentimentOut, tags=["Sentiment Analysis"])
 async def analyze_text(
     text_input: TextInput,
@@ -1141,8 +1336,13 @@ async def analyze_text(
                 detail="Sentiment analysis service is not available"
             )
         
-        # Analyze text
-        result = globalSetting.sentiment_model.analyze(text_input.text)[0]
+        # Analyze text (results are shared across workers via the cache backend)
+        cache_key = _sentiment_cache_key(text_input.text)
+        cached = await _read_sentiment_cache([cache_key])
+        result = cached.get(cache_key)
+        if result is None:
+            result = _normalize_sentiment(globalSetting.sentiment_model.analyze(text_input.text)[0])
+            await _write_sentiment_cache({cache_key: result})
         
         # Extract sentiment and confidence
         sentiment = result["label"]
@@ -1189,7 +1389,7 @@ async def analyze_text(
 
 @app.post("/sentiment/analyze-tweets", response_model=SentimentBatchResult, tags=["Sentiment Analysis"])
 async def analyze_tweets(
-    symbol: str = Query(..., min_length=1, max_length=10, regex="^[A-Za-z0-9.]{1,10}$"),
+    symbol: str = Query(..., min_length=1, max_length=10, pattern="^[A-Za-z0-9.]{1,10}$"),
     count: int = Query(10, ge=1, le=100),
     db: AsyncSession = Depends(get_db_dependency)
 ):
@@ -1232,8 +1432,8 @@ async def analyze_tweets(
             elif isinstance(tweet, str):
                 tweet_texts.append(tweet)
         
-        # Analyze sentiment
-        results = globalSetting.sentiment_model(tweet_texts)
+        # Analyze sentiment, only running the model on texts not seen before
+        results = await _analyze_texts_cached(tweet_texts)
         
         # Aggregate sentiment scores
         positive = sum(1 for r in results if r["label"] == "positive")
@@ -1293,7 +1493,7 @@ async def analyze_tweets(
 
 @app.get("/sentiment/history/{symbol}", tags=["Sentiment Analysis"])
 async def get_sentiment_history(
-    symbol: str = Path(..., min_length=1, max_length=10, regex="^[A-Za-z0-9.]{1,10}$"),
+    symbol: str = Path(..., min_length=1, max_length=10, pattern="^[A-Za-z0-9.]{1,10}$"),
     days: int = Query(7, ge=1, le=30),
     db: AsyncSession = Depends(get_db_dependency)
 ):
@@ -1360,9 +1560,26 @@ async def get_sentiment_history(
         )
 
 # Currency Conversion Endpoints
-@lru_cache(maxsize=128)
+async def get_cached_exchange_rates(base: str = "USD") -> Dict[str, Any]:
+    """Return exchange rates from the shared cache, fetching them on a miss."""
+    cache_key = f"fx:{base}"
+    cache = get_cache_backend()
+    try:
+        cached_rates = await cache.get(cache_key)
+        if cached_rates is not None:
+            return cached_rates
+    except Exception as e:
+        logger.warning(f"Exchange rate cache read failed: {str(e)}")
+
+    rates_data = await market_data.run(get_exchange_rates_from_api, base)
+    try:
+        await cache.set(cache_key, rates_data, settings.fx_rates_cache_ttl_seconds)
+    except Exception as e:
+        logger.warning(f"Exchange rate cache write failed: {str(e)}")
+    return rates_data
+
 def get_exchange_rates_from_api(base: str = "USD") -> Dict[str, Any]:
-    """Fetch exchange rates from a free API (cached)."""
+    """Fetch exchange rates from a free API (blocking, uncached)."""
     import requests
     try:
         # Using exchangerate-api.com free tier (no API key needed for basic usage)
@@ -1414,7 +1631,7 @@ async def convert_currency(request: CurrencyConversionRequest):
         amount = request.amount
 
         # Get exchange rates
-        rates_data = get_exchange_rates_from_api(from_currency)
+        rates_data = await get_cached_exchange_rates(from_currency)
         rates = rates_data["rates"]
 
         if to_currency not in rates:
@@ -1449,7 +1666,7 @@ async def get_exchange_rates(base: str = Query("USD", min_length=3, max_length=3
     """Get current exchange rates for a base currency."""
     try:
         base = base.upper()
-        rates_data = get_exchange_rates_from_api(base)
+        rates_data = await get_cached_exchange_rates(base)
 
         return ExchangeRatesResponse(
             base=rates_data["base"],
@@ -2071,7 +2288,7 @@ async def get_watchlist(
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_db_dependency),
 ):
-    """Return all symbols on the authenticated user's watchlist, with latest sentiment."""
+    """Return all symbols on the authenticated user's watchlist, with latest price and sentiment."""
     result = await db.execute(
         select(WatchlistItem)
         .where(WatchlistItem.user_id == current_user.id)
@@ -2079,6 +2296,9 @@ async def get_watchlist(
     )
     items = result.scalars().all()
 
+    # Quote every watched symbol with a single batched request.
+    latest_prices = await market_data.get_latest_prices(item.symbol for item in items)
+
     # Enrich each item with the latest sentiment (one query per symbol).
     # For typical watchlist sizes (< 50 symbols) this is acceptable.
     output: List[WatchlistItemOut] = []
@@ -2090,6 +2310,7 @@ async def get_watchlist(
                 display_name=item.display_name,
                 added_at=item.created_at,
                 notes=item.notes,
+                latest_price=latest_prices.get(item.symbol.upper()),
                 latest_sentiment=latest_sentiment,
             )
         )
@@ -0,0 +1,207 @@
+# market_cache.py
+"""
+In-process TTL cache with single-flight request coalescing.
+
+Used by the market-data service so that concurrent requests for the same
+symbol share one upstream fetch and repeat requests within the freshness
+window are served from memory. An optional shared ``CacheBackend`` acts as a
+second tier so other workers (and restarted ones) reuse the same values.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Iterable, List, Optional, Tuple, TypeVar
+
+from .cache_backends import CacheBackend
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING: Any = object()
+
+
+@dataclass
+class CacheStats:
+    """Counters reported by a ``MarketDataCache``."""
+
+    hits: int = 0
+    shared_hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class MarketDataCache(Generic[K, V]):
+    """LRU cache with a freshness TTL and single-flight fetches.
+
+    A key is either fresh in the cache (hit), already being fetched by
+    another caller (coalesced onto that fetch), or fetched by this caller
+    (miss). Keys a fetch fails to return are not cached.
+
+    When ``shared_backend`` is given, misses are looked up there (a shared
+    hit) before calling the fetch function, and fetched values are written
+    back. Backend errors are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        *,
+        namespace: str = "",
+        shared_backend: Optional[Callable[[], CacheBackend]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = max(int(max_entries), 1)
+        self.namespace = namespace
+        self.stats = CacheStats()
+        self._shared_backend = shared_backend
+        self._clock = clock
+        self._entries: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self._in_flight: Dict[K, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: K) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: K, value: V, ttl_seconds: Optional[float] = None) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (self._clock() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def get_many(
+        self,
+        keys: Iterable[K],
+        fetch_many: Callable[[List[K]], Awaitable[Dict[K, V]]],
+    ) -> Dict[K, V]:
+        """Return cached values for ``keys``, fetching misses in one call.
+
+        Keys that ``fetch_many`` does not return are omitted from the result.
+        """
+
+        results: Dict[K, V] = {}
+        waiting: Dict[K, asyncio.Future] = {}
+        to_fetch: List[K] = []
+
+        for key in dict.fromkeys(keys):
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.stats.hits += 1
+                results[key] = value
+            elif key in self._in_flight:
+                self.stats.coalesced += 1
+                waiting[key] = self._in_flight[key]
+            else:
+                to_fetch.append(key)
+
+        if to_fetch:
+            loop = asyncio.get_running_loop()
+            owned = {key: loop.create_future() for key in to_fetch}
+            self._in_flight.update(owned)
+            fetched: Dict[K, V] = {}
+            try:
+                fetched = await self._load_shared(to_fetch)
+                remaining = [key for key in to_fetch if key not in fetched]
+                self.stats.misses += len(remaining)
+                if remaining:
+                    fetched_now = await fetch_many(remaining)
+                    fetched.update(fetched_now)
+                    await self._save_shared(fetched_now)
+            finally:
+                for key, future in owned.items():
+                    if self._in_flight.get(key) is future:
+                        del self._in_flight[key]
+                    value = fetched.get(key, _MISSING)
+                    if value is not _MISSING:
+                        self._store(key, value)
+                        results[key] = value
+                    if not future.done():
+                        future.set_result(value)
+
+        for key, future in waiting.items():
+            # Shield so that cancelling this caller does not cancel the
+            # fetch other callers are waiting on.
+            value = await asyncio.shield(future)
+            if value is not _MISSING:
+                results[key] = value
+
+        return results
+
+    def _shared_key(self, key: K) -> str:
+        return f"{self.namespace}{key}"
+
+    async def _load_shared(self, keys: List[K]) -> Dict[K, V]:
+        if self._shared_backend is None or self.ttl_seconds <= 0:
+            return {}
+        try:
+            stored = await self._shared_backend().get_many([self._shared_key(key) for key in keys])
+        except Exception as exc:
+            logger.warning("Shared cache read failed for %s: %s", self.namespace or "cache", exc)
+            return {}
+
+        now = time.time()
+        loaded: Dict[K, V] = {}
+        for key in keys:
+            envelope = stored.get(self._shared_key(key))
+            if envelope is None or envelope["expires_at"] <= now:
+                continue
+            # Keep the local copy no longer than the shared one is valid.
+            self._store(key, envelope["value"], envelope["expires_at"] - now)
+            loaded[key] = envelope["value"]
+            self.stats.shared_hits += 1
+        return loaded
+
+    async def _save_shared(self, values: Dict[K, V]) -> None:
+        if self._shared_backend is None or self.ttl_seconds <= 0 or not values:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        try:
+            await self._shared_backend().set_many(
+                {
+                    self._shared_key(key): {"value": value, "expires_at": expires_at}
+                    for key, value in values.items()
+                },
+                self.ttl_seconds,
+            )
+        except Exception as exc:
+            logger.warning("Shared cache write failed for %s: %s", self.namespace or "cache", exc)
+
+    async def get(self, key: K, fetch: Callable[[K], Awaitable[V]]) -> V:
+        """Single-key variant of ``get_many``; errors from ``fetch`` propagate."""
+
+        async def _fetch_one(keys: List[K]) -> Dict[K, V]:
+            return {keys[0]: await fetch(keys[0])}
+
+        results = await self.get_many([key], _fetch_one)
+        if key not in results:
+            raise LookupError(f"No value was fetched for {key!r}")
+        return results[key]
+
+    def clear(self) -> None:
+        """Drop every locally cached entry and reset counters."""
+
+        self._entries.clear()
+        self.stats = CacheStats()
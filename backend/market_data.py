@@ -0,0 +1,272 @@
+# market_data.py
+"""
+Non-blocking access to yfinance market data.
+
+yfinance is a synchronous, network-bound client. Calling it directly from an
+async route freezes the event loop for every other request on the worker, so
+all market-data reads go through ``MarketDataService``, which runs them on a
+bounded thread pool with per-call timeouts.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import yfinance as yf
+
+from .config import settings
+from .cache_backends import get_cache_backend
+from .market_cache import MarketDataCache
+
+logger = logging.getLogger(__name__)
+
+
+class MarketDataError(Exception):
+    """Raised when market data for a symbol cannot be retrieved."""
+
+
+class MarketDataTimeout(MarketDataError):
+    """Raised when a market-data call does not finish within its timeout."""
+
+
+class MarketDataService:
+    """Async facade over yfinance backed by a bounded thread pool.
+
+    Latest quotes and history frames are served through single-flight TTL
+    caches, so concurrent requests for the same symbol share one fetch.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        timeout_seconds: float,
+        *,
+        quote_cache: Optional[MarketDataCache[str, float]] = None,
+        history_cache: Optional[MarketDataCache[Tuple[str, str], pd.DataFrame]] = None,
+    ):
+        self.max_workers = max(int(max_workers), 1)
+        self.timeout_seconds = float(timeout_seconds)
+        self.quote_cache = quote_cache or MarketDataCache(ttl_seconds=60, max_entries=5000)
+        self.history_cache = history_cache or MarketDataCache(ttl_seconds=300, max_entries=256)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="market-data",
+            )
+        return self._executor
+
+    async def run(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Run a blocking call on the market-data pool.
+
+        If the timeout expires (or the awaiting task is cancelled) the pending
+        pool future is cancelled too, so queued calls for abandoned requests
+        never occupy a worker thread.
+        """
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._get_executor(),
+            functools.partial(func, *args, **kwargs),
+        )
+        effective_timeout = self.timeout_seconds if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(future, timeout=effective_timeout)
+        except asyncio.TimeoutError as exc:
+            raise MarketDataTimeout(
+                f"Market data call {getattr(func, '__name__', func)!r} timed out "
+                f"after {effective_timeout:.1f}s"
+            ) from exc
+
+    async def get_history(
+        self,
+        symbol: str,
+        period: str = "1d",
+        *,
+        timeout: Optional[float] = None,
+    ) -> pd.DataFrame:
+        """Return the OHLCV history DataFrame for a symbol."""
+
+        async def _fetch(key: Tuple[str, str]) -> pd.DataFrame:
+            return await self.run(_fetch_history, key[0], key[1], timeout=timeout)
+
+        return await self.history_cache.get((symbol.upper(), period), _fetch)
+
+    async def fetch_history(
+        self,
+        symbol: str,
+        *,
+        period: Optional[str] = None,
+        start: Optional[date] = None,
+        timeout: Optional[float] = None,
+    ) -> pd.DataFrame:
+        """Fetch history straight from upstream, bypassing the history cache.
+
+        Pass ``start`` to fetch only the bars from that date onwards, or
+        ``period`` for a window ending today.
+        """
+
+        return await self.run(_fetch_history, symbol.upper(), period, start=start, timeout=timeout)
+
+    async def fetch_histories(
+        self,
+        symbols: Iterable[str],
+        *,
+        period: Optional[str] = None,
+        start: Optional[date] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, pd.DataFrame]:
+        """Fetch history for many symbols with one upstream download.
+
+        Uncached like ``fetch_history``. Symbols without data are omitted.
+        """
+
+        unique_symbols = list(dict.fromkeys(str(symbol).upper() for symbol in symbols if symbol))
+        if not unique_symbols:
+            return {}
+        return await self.run(_fetch_histories, unique_symbols, period, start=start, timeout=timeout)
+
+    async def get_latest_price(self, symbol: str, *, timeout: Optional[float] = None) -> float:
+        """Return the latest close for a symbol or raise ``MarketDataError``."""
+
+        symbol = symbol.upper()
+        prices = await self.get_latest_prices([symbol], timeout=timeout)
+        if symbol not in prices:
+            raise MarketDataError(f"No price data available for {symbol}")
+        return prices[symbol]
+
+    async def get_latest_prices(
+        self,
+        symbols: Iterable[str],
+        *,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, float]:
+        """Return the latest close for many symbols with one upstream request.
+
+        Symbols are upper-cased and de-duplicated. Symbols without data are
+        omitted from the result instead of raising, so callers can apply
+        their own fallback per holding.
+        """
+
+        unique_symbols = [str(symbol).upper() for symbol in symbols if symbol]
+        if not unique_symbols:
+            return {}
+
+        async def _fetch(missing_symbols: List[str]) -> Dict[str, float]:
+            try:
+                return await self.run(_fetch_latest_closes, missing_symbols, timeout=timeout)
+            except Exception as exc:
+                logger.warning("Batch quote fetch failed for %s symbols: %s", len(missing_symbols), exc)
+                return {}
+
+        return await self.quote_cache.get_many(unique_symbols, _fetch)
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Return hit/miss/coalesced counters for the quote and history caches."""
+
+        return {
+            "quotes": {**self.quote_cache.stats.as_dict(), "entries": len(self.quote_cache)},
+            "history": {**self.history_cache.stats.as_dict(), "entries": len(self.history_cache)},
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker pool, dropping any calls that have not started."""
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _fetch_history(symbol: str, period: Optional[str], start: Optional[date] = None) -> pd.DataFrame:
+    if start is not None:
+        return yf.Ticker(symbol).history(start=start.isoformat())
+    return yf.Ticker(symbol).history(period=period)
+
+
+def _fetch_histories(
+    symbols: List[str],
+    period: Optional[str],
+    start: Optional[date] = None,
+) -> Dict[str, pd.DataFrame]:
+    if len(symbols) == 1:
+        history = _fetch_history(symbols[0], period, start=start)
+        return {symbols[0]: history} if history is not None and not history.empty else {}
+
+    window = {"start": start.isoformat()} if start is not None else {"period": period}
+    # actions=True keeps the split/dividend columns the price store checks.
+    frame = yf.download(symbols, group_by="ticker", auto_adjust=True, actions=True, progress=False, **window)
+    if frame is None or frame.empty or not isinstance(frame.columns, pd.MultiIndex):
+        return {}
+
+    # The ticker sits on level 0 with group_by="ticker", but be tolerant of
+    # yfinance versions that return (field, ticker) columns instead.
+    level = 0 if set(symbols) & set(frame.columns.get_level_values(0)) else 1
+    available = set(frame.columns.get_level_values(level))
+    histories: Dict[str, pd.DataFrame] = {}
+    for symbol in symbols:
+        if symbol not in available:
+            continue
+        history = frame.xs(symbol, axis=1, level=level).dropna(how="all")
+        if not history.empty:
+            histories[symbol] = history
+    return histories
+
+
+def _fetch_latest_closes(symbols: List[str]) -> Dict[str, float]:
+    if len(symbols) == 1:
+        history = _fetch_history(symbols[0], "1d")
+        close_series = {symbols[0]: history["Close"]} if not history.empty else {}
+    else:
+        # A short window rather than "1d" so symbols on exchanges that have
+        # not traded yet today still resolve to their last close.
+        frame = yf.download(
+            symbols,
+            period="5d",
+            group_by="column",
+            auto_adjust=True,
+            progress=False,
+        )
+        if frame is None or frame.empty:
+            return {}
+        close_frame = frame["Close"]
+        if isinstance(close_frame, pd.Series):
+            close_frame = close_frame.to_frame(symbols[0])
+        close_series = {
+            symbol: close_frame[symbol]
+            for symbol in symbols
+            if symbol in close_frame.columns
+        }
+
+    prices: Dict[str, float] = {}
+    for symbol, series in close_series.items():
+        series = series.dropna()
+        if not series.empty:
+            prices[symbol] = float(series.iloc[-1])
+    return prices
+
+
+market_data = MarketDataService(
+    max_workers=settings.market_data_max_workers,
+    timeout_seconds=settings.market_data_timeout_seconds,
+    quote_cache=MarketDataCache(
+        ttl_seconds=settings.quote_cache_ttl_seconds,
+        max_entries=settings.quote_cache_max_entries,
+        namespace="quote:",
+        shared_backend=get_cache_backend,
+    ),
+    history_cache=MarketDataCache(
+        ttl_seconds=settings.history_cache_ttl_seconds,
+        max_entries=settings.history_cache_max_entries,
+    ),
+)
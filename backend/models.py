@@ -1,6 +1,6 @@
 # models.py
 from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text, Index, Date
-from sqlalchemy.sql import func
+from sqlalchemy.sql import false, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declared_attr
 from datetime import datetime, timezone
@@ -128,6 +128,8 @@ class PortfolioSnapshot(Base):
     total_profit_loss_percent = Column(Float, nullable=False)
     asset_count = Column(Integer, nullable=False)
     captured_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    # Holdings moved to the columnar archive (see snapshot_archive.py)
+    holdings_archived = Column(Boolean, nullable=False, default=False, server_default=false())
 
     portfolio = relationship("Portfolio", back_populates="snapshots")
     holdings = relationship(
@@ -181,6 +183,115 @@ class PortfolioSnapshotHolding(Base):
             f"symbol='{self.symbol}')>"
         )
 
+class PortfolioSnapshotRollup(Base):
+    """Weekly or monthly OHLC summary of a portfolio's daily snapshots."""
+
+    __tablename__ = "portfolio_snapshot_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    portfolio_id = Column(Integer, ForeignKey("portfolios.id", ondelete="CASCADE"), nullable=False)
+    resolution = Column(String(10), nullable=False)
+    period_start = Column(Date, nullable=False)
+    period_end = Column(Date, nullable=False)
+    open_value = Column(Float, nullable=False)
+    high_value = Column(Float, nullable=False)
+    low_value = Column(Float, nullable=False)
+    close_value = Column(Float, nullable=False)
+    close_cost = Column(Float, nullable=False)
+    close_profit_loss = Column(Float, nullable=False)
+    close_profit_loss_percent = Column(Float, nullable=False)
+    snapshot_count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index(
+            "idx_snapshot_rollup_portfolio_resolution_start",
+            "portfolio_id",
+            "resolution",
+            "period_start",
+            unique=True,
+        ),
+    )
+
+    def __repr__(self):
+        return (
+            f"<PortfolioSnapshotRollup(portfolio_id={self.portfolio_id}, resolution='{self.resolution}', "
+            f"period_start={self.period_start})>"
+        )
+
+
+class SnapshotBackfillRun(Base, TimestampMixin):
+    """A snapshot backfill over a date range, resumable from its checkpoints."""
+
+    __tablename__ = "snapshot_backfill_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    shard_index = Column(Integer, nullable=False, default=0)
+    shard_count = Column(Integer, nullable=False, default=1)
+    workers = Column(Integer, nullable=False, default=1)
+    status = Column(String(20), nullable=False, default="running")
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    checkpoints = relationship(
+        "SnapshotBackfillCheckpoint",
+        back_populates="run",
+        cascade="all, delete-orphan",
+    )
+
+    def __repr__(self):
+        return (
+            f"<SnapshotBackfillRun(id={self.id}, start_date={self.start_date}, "
+            f"end_date={self.end_date}, status='{self.status}')>"
+        )
+
+
+class SnapshotBackfillCheckpoint(Base):
+    """One date finished by one worker shard of a backfill run."""
+
+    __tablename__ = "snapshot_backfill_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("snapshot_backfill_runs.id", ondelete="CASCADE"), nullable=False)
+    shard_index = Column(Integer, nullable=False)
+    shard_count = Column(Integer, nullable=False)
+    snapshot_date = Column(Date, nullable=False)
+    snapshots_created = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)
+    completed_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    run = relationship("SnapshotBackfillRun", back_populates="checkpoints")
+
+    __table_args__ = (
+        Index(
+            "idx_backfill_checkpoint_run_shard_date",
+            "run_id",
+            "shard_index",
+            "shard_count",
+            "snapshot_date",
+            unique=True,
+        ),
+    )
+
+    def __repr__(self):
+        return (
+            f"<SnapshotBackfillCheckpoint(run_id={self.run_id}, "
+            f"shard={self.shard_index}/{self.shard_count}, snapshot_date={self.snapshot_date})>"
+        )
+
+class SchedulerLease(Base):
+    """Time-limited leadership of a named scheduled job, shared by all workers."""
+
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(100), primary_key=True)
+    holder = Column(String(255), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    last_completed_key = Column(String(100), nullable=True)
+
+    def __repr__(self):
+        return f"<SchedulerLease(name='{self.name}', holder='{self.holder}', expires_at={self.expires_at})>"
+
 class SentimentResult(Base, TimestampMixin):
     """Model for storing sentiment analysis results."""
 
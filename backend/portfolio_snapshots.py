@@ -1,13 +1,15 @@
+import asyncio
 import logging
-from dataclasses import dataclass
 from datetime import date, datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Collection, Mapping, Optional, Sequence
 
-import yfinance as yf
-from sqlalchemy import delete, select
+import numpy as np
+from sqlalchemy import Select, case, delete, func, insert, or_, select, true, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from .database import dialect_insert
+from .downsampling import lttb_indices
 from .models import (
     Asset,
     AssetPriceHistory,
@@ -17,6 +19,7 @@ from .models import (
 )
 from .schemas import (
     HistoricalSnapshotPoint,
+    PortfolioSnapshotAnalyticsOut,
     PortfolioSnapshotComparisonOut,
     PortfolioSnapshotComparisonSummaryOut,
     PortfolioSnapshotHistoryResponse,
@@ -24,25 +27,18 @@ from .schemas import (
     PortfolioSnapshotHoldingOut,
     PortfolioSnapshotOut,
     PortfolioSummary,
+    SnapshotReturnPoint,
+    SnapshotVolatilityPoint,
 )
+from .snapshot_analytics import compute_snapshot_analytics, quantity_change_flows
+from .snapshot_archive import snapshot_archive
+from .snapshot_cache import snapshot_response_cache
+from .snapshot_rollups import RESOLUTION_DAY, get_snapshot_rollups, pick_resolution, refresh_snapshot_rollups
+from .valuation import PRICE_SOURCE_PURCHASE, PortfolioValuation, value_holdings, valuation_engine
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class ResolvedSnapshotHolding:
-    """Normalized holding values ready to persist into a snapshot row."""
-
-    asset_id: Optional[int]
-    symbol: str
-    quantity: float
-    price: float
-    current_value: float
-    total_cost: float
-    profit_loss: float
-    profit_loss_percent: float
-
-
 async def get_owned_portfolio(
     db: AsyncSession,
     portfolio_id: int,
@@ -60,58 +56,63 @@ async def get_owned_portfolio(
     return result.scalars().first()
 
 
-async def resolve_asset_price(
+async def resolve_asset_prices(
     db: AsyncSession,
-    asset: Asset,
+    assets: Sequence[Asset],
     captured_at: datetime,
-) -> float:
-    """Resolve the best available price for a snapshot.
+    *,
+    deadline_seconds: Optional[float] = None,
+) -> dict[int, float]:
+    """Resolve the best available price for every asset in a snapshot.
 
-    Order of preference:
-    1. Fresh yfinance quote and persist it into AssetPriceHistory
-    2. Most recent stored AssetPriceHistory row
-    3. Purchase price
+    Prices come from the valuation engine (live quote, then most recent
+    stored price, then purchase price). Live quotes are persisted into
+    AssetPriceHistory so later captures can fall back to them.
     """
 
-    try:
-        stock = yf.Ticker(str(asset.symbol))
-        history = stock.history(period="1d")
-        latest_close = history["Close"].iloc[-1]
-        latest_price = float(latest_close)
-
-        db.add(
-            AssetPriceHistory(
-                asset_id=int(asset.id),
-                price=latest_price,
-                timestamp=captured_at,
+    asset_prices = await valuation_engine.price_assets(db, assets, deadline_seconds=deadline_seconds)
+    for asset_id, asset_price in asset_prices.items():
+        if asset_price.is_live:
+            db.add(
+                AssetPriceHistory(
+                    asset_id=asset_id,
+                    price=asset_price.price,
+                    timestamp=captured_at,
+                )
             )
-        )
-        return latest_price
-    except Exception as exc:
-        logger.warning("Could not fetch live price for %s during snapshot capture: %s", asset.symbol, exc)
+        elif asset_price.source == PRICE_SOURCE_PURCHASE:
+            logger.warning(
+                "Snapshot capture for asset %s fell back to purchase price because no historical price exists",
+                asset_id,
+            )
+    return {asset_id: asset_price.price for asset_id, asset_price in asset_prices.items()}
 
-    result = await db.execute(
-        select(AssetPriceHistory.price)
-        .where(AssetPriceHistory.asset_id == asset.id)
-        .order_by(AssetPriceHistory.timestamp.desc())
-        .limit(1)
-    )
-    latest_stored_price = result.scalar_one_or_none()
-    if latest_stored_price is not None:
-        return float(latest_stored_price)
 
-    logger.warning(
-        "Snapshot capture for %s fell back to purchase price because no historical price exists",
-        asset.symbol,
+async def load_snapshot_holdings(snapshot: PortfolioSnapshot) -> Sequence[Any]:
+    """Holdings of ``snapshot`` from SQL, or from the archive once compacted.
+
+    SQL rows are returned as loaded (``holdings`` should be eager-loaded);
+    archived ones as ``PortfolioSnapshotHoldingOut`` with the same fields.
+    """
+
+    if not snapshot.holdings_archived:
+        return snapshot.holdings
+    rows = await asyncio.to_thread(
+        snapshot_archive.read_holdings,
+        int(snapshot.portfolio_id),
+        snapshot.snapshot_date,
     )
-    return float(asset.purchase_price)
+    return [PortfolioSnapshotHoldingOut(**row) for row in rows]
 
 
-def build_snapshot_response(snapshot: PortfolioSnapshot) -> PortfolioSnapshotOut:
+def build_snapshot_response(
+    snapshot: PortfolioSnapshot,
+    holdings: Optional[Sequence[Any]] = None,
+) -> PortfolioSnapshotOut:
     """Serialize an ORM snapshot row into the API response shape."""
 
     ordered_holdings = sorted(
-        snapshot.holdings,
+        snapshot.holdings if holdings is None else holdings,
         key=lambda holding: holding.current_value,
         reverse=True,
     )
@@ -149,8 +150,17 @@ async def capture_portfolio_snapshot(
     owner_id: int,
     *,
     snapshot_date: Optional[date] = None,
+    asset_prices: Optional[Mapping[int, float]] = None,
 ) -> Optional[PortfolioSnapshotOut]:
-    """Capture or refresh the daily snapshot for a portfolio."""
+    """Capture or refresh the daily snapshot for a portfolio.
+
+    The snapshot row is upserted on ``(portfolio_id, snapshot_date)``, its
+    holdings are replaced with one bulk insert, and the response is built
+    from the values just written instead of being read back.
+
+    ``asset_prices`` lets a batch job pass prices it already resolved for
+    many portfolios at once; only assets missing from it are priced here.
+    """
 
     portfolio = await get_owned_portfolio(db, portfolio_id, owner_id, include_assets=True)
     if portfolio is None:
@@ -159,100 +169,273 @@ async def capture_portfolio_snapshot(
     target_date = snapshot_date or datetime.now(timezone.utc).date()
     captured_at = datetime.now(timezone.utc)
 
-    resolved_holdings: list[ResolvedSnapshotHolding] = []
-    total_cost = 0.0
-    total_value = 0.0
-
-    for asset in portfolio.assets:
-        price = await resolve_asset_price(db, asset, captured_at)
-        quantity = float(asset.quantity)
-        total_asset_cost = quantity * float(asset.purchase_price)
-        current_value = quantity * price
-        profit_loss = current_value - total_asset_cost
-        profit_loss_percent = (profit_loss / total_asset_cost) * 100 if total_asset_cost > 0 else 0.0
-
-        resolved_holdings.append(
-            ResolvedSnapshotHolding(
-                asset_id=int(asset.id),
-                symbol=str(asset.symbol),
-                quantity=quantity,
-                price=price,
-                current_value=current_value,
-                total_cost=total_asset_cost,
-                profit_loss=profit_loss,
-                profit_loss_percent=profit_loss_percent,
-            )
-        )
-        total_cost += total_asset_cost
-        total_value += current_value
+    assets = list(portfolio.assets)
+    asset_prices = asset_prices or {}
+    # Copy only this portfolio's entries; the batch map covers every pending portfolio.
+    prices = {int(asset.id): asset_prices[int(asset.id)] for asset in assets if int(asset.id) in asset_prices}
+    unpriced_assets = [asset for asset in assets if int(asset.id) not in prices]
+    if unpriced_assets:
+        prices.update(await resolve_asset_prices(db, unpriced_assets, captured_at))
+    valuation = value_holdings(
+        [asset.quantity for asset in assets],
+        [asset.purchase_price for asset in assets],
+        [prices[int(asset.id)] for asset in assets],
+    )
+    snapshot = await write_portfolio_snapshot(db, portfolio_id, target_date, captured_at, assets, valuation)
+    await db.commit()
+    snapshot_response_cache.invalidate(portfolio_id, target_date)
+    return snapshot
 
-    total_profit_loss = total_value - total_cost
-    total_profit_loss_percent = (total_profit_loss / total_cost) * 100 if total_cost > 0 else 0.0
 
-    result = await db.execute(
-        select(PortfolioSnapshot)
-        .where(PortfolioSnapshot.portfolio_id == portfolio_id)
-        .where(PortfolioSnapshot.snapshot_date == target_date)
-        .limit(1)
+async def update_portfolio_snapshot_assets(
+    db: AsyncSession,
+    portfolio_id: int,
+    owner_id: int,
+    asset_ids: Collection[int],
+) -> Optional[date]:
+    """Apply changes to a few assets to today's snapshot without a full capture.
+
+    Only the changed assets are priced. Their holding rows are replaced,
+    then the totals are re-summed from the holding rows and every
+    allocation percent is rescaled from the new total, each with one
+    ``UPDATE``. Other holdings keep the prices they were captured with.
+    Holdings whose asset has been deleted (``asset_id`` set to NULL by the
+    foreign key) are dropped as well.
+
+    The snapshot row is locked (``SELECT ... FOR UPDATE``) after pricing,
+    so concurrent updates of the same snapshot apply one after the other
+    and each sees the holdings the previous one committed.
+
+    Falls back to ``capture_portfolio_snapshot`` when today has no snapshot
+    yet. Returns the snapshot date, or None when the portfolio is not
+    owned by ``owner_id``.
+    """
+
+    portfolio = await get_owned_portfolio(db, portfolio_id, owner_id)
+    if portfolio is None:
+        return None
+
+    target_date = datetime.now(timezone.utc).date()
+    captured_at = datetime.now(timezone.utc)
+    snapshot = (
+        await db.execute(
+            select(PortfolioSnapshot.id, PortfolioSnapshot.holdings_archived)
+            .where(PortfolioSnapshot.portfolio_id == portfolio_id)
+            .where(PortfolioSnapshot.snapshot_date == target_date)
+        )
+    ).first()
+    if snapshot is None or snapshot.holdings_archived:
+        captured = await capture_portfolio_snapshot(db, portfolio_id, owner_id)
+        return captured.as_of if captured is not None else None
+
+    snapshot_id = int(snapshot.id)
+    changed_ids = sorted({int(asset_id) for asset_id in asset_ids})
+    assets = list(
+        (
+            await db.execute(
+                select(Asset)
+                .where(Asset.portfolio_id == portfolio_id)
+                .where(Asset.id.in_(changed_ids))
+                .order_by(Asset.id)
+            )
+        ).scalars().all()
+    )
+    prices = await resolve_asset_prices(db, assets, captured_at) if assets else {}
+    valuation = value_holdings(
+        [asset.quantity for asset in assets],
+        [asset.purchase_price for asset in assets],
+        [prices[int(asset.id)] for asset in assets],
     )
-    snapshot = result.scalars().first()
 
-    if snapshot is None:
-        snapshot = PortfolioSnapshot(
-            portfolio_id=portfolio_id,
-            snapshot_date=target_date,
+    # Held until commit; a no-op on SQLite, where the first write takes the database lock.
+    await db.execute(
+        select(PortfolioSnapshot.id).where(PortfolioSnapshot.id == snapshot_id).with_for_update()
+    )
+    await db.execute(
+        delete(PortfolioSnapshotHolding)
+        .where(PortfolioSnapshotHolding.portfolio_snapshot_id == snapshot_id)
+        .where(
+            or_(
+                PortfolioSnapshotHolding.asset_id.in_(changed_ids),
+                PortfolioSnapshotHolding.asset_id.is_(None),
+            )
+        )
+    )
+    if assets:
+        await db.execute(
+            insert(PortfolioSnapshotHolding),
+            [
+                {
+                    "portfolio_snapshot_id": snapshot_id,
+                    "asset_id": int(asset.id),
+                    "symbol": str(asset.symbol),
+                    "quantity": quantity,
+                    "price": price,
+                    "current_value": current_value,
+                    "allocation_percent": 0.0,  # rescaled below with the rest
+                    "total_cost": cost,
+                    "profit_loss": profit_loss,
+                    "profit_loss_percent": profit_loss_percent,
+                }
+                for asset, quantity, price, current_value, cost, profit_loss, profit_loss_percent in zip(
+                    assets,
+                    valuation.quantity.tolist(),
+                    valuation.price.tolist(),
+                    valuation.current_value.tolist(),
+                    valuation.total_cost.tolist(),
+                    valuation.profit_loss.tolist(),
+                    valuation.profit_loss_percent.tolist(),
+                )
+            ],
+        )
+
+    holdings_of_snapshot = PortfolioSnapshotHolding.portfolio_snapshot_id == snapshot_id
+    total_value = (
+        select(func.coalesce(func.sum(PortfolioSnapshotHolding.current_value), 0.0))
+        .where(holdings_of_snapshot)
+        .scalar_subquery()
+    )
+    total_cost = (
+        select(func.coalesce(func.sum(PortfolioSnapshotHolding.total_cost), 0.0))
+        .where(holdings_of_snapshot)
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(PortfolioSnapshot)
+        .where(PortfolioSnapshot.id == snapshot_id)
+        .values(
             total_value=total_value,
             total_cost=total_cost,
-            total_profit_loss=total_profit_loss,
-            total_profit_loss_percent=total_profit_loss_percent,
-            asset_count=len(resolved_holdings),
+            total_profit_loss=total_value - total_cost,
+            total_profit_loss_percent=case(
+                (total_cost > 0, (total_value - total_cost) / total_cost * 100.0),
+                else_=0.0,
+            ),
+            asset_count=select(func.count()).where(holdings_of_snapshot).scalar_subquery(),
             captured_at=captured_at,
         )
-        db.add(snapshot)
-        await db.flush()
-    else:
-        snapshot.total_value = total_value
-        snapshot.total_cost = total_cost
-        snapshot.total_profit_loss = total_profit_loss
-        snapshot.total_profit_loss_percent = total_profit_loss_percent
-        snapshot.asset_count = len(resolved_holdings)
-        snapshot.captured_at = captured_at
-        await db.flush()
-        await db.execute(
-            delete(PortfolioSnapshotHolding).where(
-                PortfolioSnapshotHolding.portfolio_snapshot_id == snapshot.id
+        .execution_options(synchronize_session=False)
+    )
+    snapshot_total = (
+        select(PortfolioSnapshot.total_value).where(PortfolioSnapshot.id == snapshot_id).scalar_subquery()
+    )
+    await db.execute(
+        update(PortfolioSnapshotHolding)
+        .where(holdings_of_snapshot)
+        .values(
+            allocation_percent=case(
+                (snapshot_total > 0, PortfolioSnapshotHolding.current_value * 100.0 / snapshot_total),
+                else_=0.0,
             )
         )
+        .execution_options(synchronize_session=False)
+    )
+    await refresh_snapshot_rollups(db, portfolio_id, target_date)
+    await db.commit()
+    snapshot_response_cache.invalidate(portfolio_id, target_date)
+    return target_date
 
-    for holding in resolved_holdings:
-        allocation_percent = (holding.current_value / total_value) * 100 if total_value > 0 else 0.0
-        db.add(
-            PortfolioSnapshotHolding(
-                portfolio_snapshot_id=int(snapshot.id),
-                asset_id=holding.asset_id,
-                symbol=holding.symbol,
-                quantity=holding.quantity,
-                price=holding.price,
-                current_value=holding.current_value,
-                allocation_percent=allocation_percent,
-                total_cost=holding.total_cost,
-                profit_loss=holding.profit_loss,
-                profit_loss_percent=holding.profit_loss_percent,
+
+async def write_portfolio_snapshot(
+    db: AsyncSession,
+    portfolio_id: int,
+    snapshot_date: date,
+    captured_at: datetime,
+    assets: Sequence[Asset],
+    valuation: PortfolioValuation,
+) -> PortfolioSnapshotOut:
+    """Upsert a snapshot and replace its holdings without committing.
+
+    ``assets`` only needs ``id`` and ``symbol`` and must line up with the
+    rows of ``valuation``.
+    """
+
+    total_value = valuation.portfolio_value
+    total_cost = valuation.portfolio_cost
+    total_profit_loss = valuation.portfolio_profit_loss
+    total_profit_loss_percent = valuation.portfolio_profit_loss_percent
+
+    snapshot_values = {
+        "total_value": total_value,
+        "total_cost": total_cost,
+        "total_profit_loss": total_profit_loss,
+        "total_profit_loss_percent": total_profit_loss_percent,
+        "asset_count": len(assets),
+        "captured_at": captured_at,
+        # A re-captured archived date keeps its new holdings in SQL again.
+        "holdings_archived": False,
+    }
+    upsert = dialect_insert(db)(PortfolioSnapshot).values(
+        portfolio_id=portfolio_id,
+        snapshot_date=snapshot_date,
+        **snapshot_values,
+    )
+    snapshot = (
+        await db.execute(
+            upsert.on_conflict_do_update(
+                index_elements=[PortfolioSnapshot.portfolio_id, PortfolioSnapshot.snapshot_date],
+                set_=snapshot_values,
             )
+            .returning(PortfolioSnapshot)
+            .execution_options(populate_existing=True)
         )
+    ).scalar_one()
+    snapshot_id = int(snapshot.id)
+    await refresh_snapshot_rollups(db, portfolio_id, snapshot_date)
 
-    await db.commit()
-
-    result = await db.execute(
-        select(PortfolioSnapshot)
-        .options(selectinload(PortfolioSnapshot.holdings))
-        .where(PortfolioSnapshot.id == snapshot.id)
+    await db.execute(
+        delete(PortfolioSnapshotHolding).where(
+            PortfolioSnapshotHolding.portfolio_snapshot_id == snapshot_id
+        )
     )
-    saved_snapshot = result.scalars().first()
-    if saved_snapshot is None:
-        return None
+    holding_rows = [
+        {
+            "asset_id": int(asset.id),
+            "symbol": str(asset.symbol),
+            "quantity": quantity,
+            "price": price,
+            "current_value": current_value,
+            "allocation_percent": allocation,
+            "total_cost": cost,
+            "profit_loss": profit_loss,
+            "profit_loss_percent": profit_loss_percent,
+        }
+        for asset, quantity, price, current_value, allocation, cost, profit_loss, profit_loss_percent in zip(
+            assets,
+            valuation.quantity.tolist(),
+            valuation.price.tolist(),
+            valuation.current_value.tolist(),
+            valuation.allocation_percent.tolist(),
+            valuation.total_cost.tolist(),
+            valuation.profit_loss.tolist(),
+            valuation.profit_loss_percent.tolist(),
+        )
+    ]
+    if holding_rows:
+        await db.execute(
+            insert(PortfolioSnapshotHolding),
+            [{"portfolio_snapshot_id": snapshot_id, **row} for row in holding_rows],
+        )
 
-    return build_snapshot_response(saved_snapshot)
+    # The holdings were replaced behind the ORM's back; reload them on next access.
+    db.expire(snapshot, ["holdings"])
+
+    return PortfolioSnapshotOut(
+        portfolio_id=portfolio_id,
+        as_of=snapshot_date,
+        captured_at=captured_at,
+        summary=PortfolioSummary(
+            total_value=total_value,
+            total_cost=total_cost,
+            total_profit_loss=total_profit_loss,
+            total_profit_loss_percent=total_profit_loss_percent,
+            last_updated=captured_at,
+        ),
+        holdings=[
+            PortfolioSnapshotHoldingOut(**row)
+            for row in sorted(holding_rows, key=lambda row: row["current_value"], reverse=True)
+        ],
+    )
 
 
 async def get_portfolio_snapshot_history(
@@ -261,8 +444,16 @@ async def get_portfolio_snapshot_history(
     owner_id: int,
     *,
     days: int = 30,
+    max_points: Optional[int] = None,
+    resolution: str = "auto",
 ) -> Optional[PortfolioSnapshotHistoryResponse]:
-    """Return persisted daily portfolio value history."""
+    """Return persisted portfolio value history.
+
+    ``resolution="auto"`` serves daily rows for ranges up to a year and
+    weekly or monthly rollups beyond that. Rollup points are dated at the
+    last snapshot of their period and carry the period's open/high/low.
+    When ``max_points`` is given the series is reduced with LTTB.
+    """
 
     portfolio = await get_owned_portfolio(db, portfolio_id, owner_id)
     if portfolio is None:
@@ -270,27 +461,68 @@ async def get_portfolio_snapshot_history(
 
     to_date = datetime.now(timezone.utc).date()
     from_date = to_date - timedelta(days=max(days - 1, 0))
-
-    result = await db.execute(
-        select(PortfolioSnapshot)
-        .where(PortfolioSnapshot.portfolio_id == portfolio_id)
-        .where(PortfolioSnapshot.snapshot_date >= from_date)
-        .where(PortfolioSnapshot.snapshot_date <= to_date)
-        .order_by(PortfolioSnapshot.snapshot_date.asc())
+    if resolution == "auto":
+        resolution = pick_resolution(days)
+
+    # A rollup's open/high/low also cover the days of its period before from_date.
+    window_start = from_date if resolution == RESOLUTION_DAY else from_date - timedelta(days=31)
+    return await snapshot_response_cache.get(
+        portfolio_id,
+        ("history", from_date, to_date, resolution, max_points),
+        (window_start, to_date),
+        lambda: _load_snapshot_history(db, portfolio_id, from_date, to_date, resolution, max_points),
     )
-    snapshots = result.scalars().all()
 
-    return PortfolioSnapshotHistoryResponse(
-        portfolio_id=portfolio_id,
-        from_date=from_date,
-        to_date=to_date,
-        points=[
+
+async def _load_snapshot_history(
+    db: AsyncSession,
+    portfolio_id: int,
+    from_date: date,
+    to_date: date,
+    resolution: str,
+    max_points: Optional[int],
+) -> PortfolioSnapshotHistoryResponse:
+    if resolution == RESOLUTION_DAY:
+        result = await db.execute(
+            select(PortfolioSnapshot)
+            .where(PortfolioSnapshot.portfolio_id == portfolio_id)
+            .where(PortfolioSnapshot.snapshot_date >= from_date)
+            .where(PortfolioSnapshot.snapshot_date <= to_date)
+            .order_by(PortfolioSnapshot.snapshot_date.asc())
+        )
+        points = [
             HistoricalSnapshotPoint(
                 as_of=snapshot.snapshot_date,
                 portfolio_value=float(snapshot.total_value),
             )
-            for snapshot in snapshots
-        ],
+            for snapshot in result.scalars().all()
+        ]
+    else:
+        points = [
+            HistoricalSnapshotPoint(
+                as_of=rollup.period_end,
+                portfolio_value=float(rollup.close_value),
+                open_value=float(rollup.open_value),
+                high_value=float(rollup.high_value),
+                low_value=float(rollup.low_value),
+            )
+            for rollup in await get_snapshot_rollups(db, portfolio_id, resolution, from_date, to_date)
+        ]
+
+    if max_points is not None and len(points) > max_points:
+        keep = lttb_indices(
+            [point.as_of.toordinal() for point in points],
+            [point.portfolio_value for point in points],
+            max_points,
+        )
+        points = [points[index] for index in keep]
+
+    return PortfolioSnapshotHistoryResponse(
+        portfolio_id=portfolio_id,
+        from_date=from_date,
+        to_date=to_date,
+        resolution=resolution,
+        points=points,
     )
 
 
@@ -317,7 +549,7 @@ async def get_portfolio_snapshot_by_date(
     if snapshot is None:
         return None
 
-    return build_snapshot_response(snapshot)
+    return build_snapshot_response(snapshot, await load_snapshot_holdings(snapshot))
 
 
 async def get_portfolio_snapshot_comparison(
@@ -341,77 +573,254 @@ async def get_portfolio_snapshot_comparison(
     if current_date is not None and previous_date is not None and previous_date >= current_date:
         raise ValueError("previous_date must be earlier than current_date")
 
-    if current_date is None:
-        current_result = await db.execute(
-            select(PortfolioSnapshot)
-            .options(selectinload(PortfolioSnapshot.holdings))
-            .where(PortfolioSnapshot.portfolio_id == portfolio_id)
-            .order_by(PortfolioSnapshot.snapshot_date.desc())
-            .limit(1)
+    # Without an explicit previous date any earlier snapshot may become the
+    # baseline; without a current date the latest one, whenever it lands.
+    window = (
+        previous_date or date.min,
+        current_date or date.max,
+    )
+    return await snapshot_response_cache.get(
+        portfolio_id,
+        ("compare", current_date, previous_date),
+        window,
+        lambda: _load_snapshot_comparison(db, portfolio_id, current_date, previous_date),
+    )
+
+
+_COMPARISON_SIDES = ("current", "previous")
+_COMPARISON_SNAPSHOT_FIELDS = (
+    "id",
+    "snapshot_date",
+    "total_value",
+    "total_cost",
+    "total_profit_loss",
+    "total_profit_loss_percent",
+    "archived",
+)
+# Holding column -> stem of the current_/previous_/_change fields in the response.
+_COMPARISON_HOLDING_FIELDS = {
+    "quantity": "quantity",
+    "price": "price",
+    "current_value": "value",
+    "allocation_percent": "allocation_percent",
+    "profit_loss": "profit_loss",
+}
+
+
+def _snapshot_comparison_statement(
+    portfolio_id: int,
+    current_date: Optional[date],
+    previous_date: Optional[date],
+) -> Select:
+    """One statement returning both snapshots' totals and a delta row per symbol.
+
+    ``row_number()`` ranks the portfolio's snapshots up to ``current_date``;
+    rank 1 is the current snapshot and the previous one is rank 2 or
+    ``previous_date``. Their holdings are pivoted by symbol with conditional
+    aggregates, which acts as a full outer join on symbol on every backend.
+    Each row carries the totals of both snapshots (``current_*`` and
+    ``previous_*``); when neither has holdings a single row with NULL
+    holding columns is returned.
+    """
+
+    ranked_query = select(
+        PortfolioSnapshot.id,
+        PortfolioSnapshot.snapshot_date,
+        PortfolioSnapshot.total_value,
+        PortfolioSnapshot.total_cost,
+        PortfolioSnapshot.total_profit_loss,
+        PortfolioSnapshot.total_profit_loss_percent,
+        case((PortfolioSnapshot.holdings_archived, 1), else_=0).label("archived"),
+        func.row_number().over(order_by=PortfolioSnapshot.snapshot_date.desc()).label("snapshot_rank"),
+    ).where(PortfolioSnapshot.portfolio_id == portfolio_id)
+    if current_date is not None:
+        ranked_query = ranked_query.where(PortfolioSnapshot.snapshot_date <= current_date)
+    ranked = ranked_query.cte("ranked")
+    previous_match = (
+        ranked.c.snapshot_date == previous_date if previous_date is not None else ranked.c.snapshot_rank == 2
+    )
+    targets = (
+        select(
+            ranked,
+            case((ranked.c.snapshot_rank == 1, "current"), else_="previous").label("side"),
         )
-        current_snapshot = current_result.scalars().first()
-    else:
-        current_result = await db.execute(
-            select(PortfolioSnapshot)
-            .options(selectinload(PortfolioSnapshot.holdings))
-            .where(PortfolioSnapshot.portfolio_id == portfolio_id)
-            .where(PortfolioSnapshot.snapshot_date == current_date)
-            .limit(1)
+        .where(or_(ranked.c.snapshot_rank == 1, previous_match))
+        .cte("targets")
+    )
+
+    pair = select(
+        *(
+            func.max(case((targets.c.side == side, targets.c[field]))).label(f"{side}_{field}")
+            for side in _COMPARISON_SIDES
+            for field in _COMPARISON_SNAPSHOT_FIELDS
+        )
+    ).cte("pair")
+
+    holding = PortfolioSnapshotHolding
+
+    def _on_side(side: str, column: Any) -> Any:
+        return case((targets.c.side == side, column))
+
+    symbols = (
+        select(
+            holding.symbol,
+            func.coalesce(
+                func.max(_on_side("current", holding.asset_id)),
+                func.max(_on_side("previous", holding.asset_id)),
+            ).label("asset_id"),
+            *(func.count(_on_side(side, holding.id)).label(f"{side}_count") for side in _COMPARISON_SIDES),
+            *(
+                func.coalesce(
+                    # Several lots of one symbol add up; they share a price.
+                    (func.max if column == "price" else func.sum)(_on_side(side, getattr(holding, column))),
+                    0.0,
+                ).label(f"{side}_{stem}")
+                for side in _COMPARISON_SIDES
+                for column, stem in _COMPARISON_HOLDING_FIELDS.items()
+            ),
+        )
+        .select_from(targets.join(holding, holding.portfolio_snapshot_id == targets.c.id))
+        .group_by(holding.symbol)
+        .subquery("symbols")
+    )
+
+    changes = {
+        stem: symbols.c[f"current_{stem}"] - symbols.c[f"previous_{stem}"]
+        for stem in _COMPARISON_HOLDING_FIELDS.values()
+    }
+    status = case(
+        (symbols.c.previous_count == 0, "added"),
+        (symbols.c.current_count == 0, "removed"),
+        (
+            or_(*(func.abs(changes[stem]) > 1e-6 for stem in ("value", "quantity", "price", "allocation_percent"))),
+            "changed",
+        ),
+        else_="unchanged",
+    )
+    return (
+        select(
+            pair,
+            symbols.c.symbol,
+            symbols.c.asset_id,
+            status.label("status"),
+            *(
+                symbols.c[f"{side}_{stem}"]
+                for stem in _COMPARISON_HOLDING_FIELDS.values()
+                for side in _COMPARISON_SIDES
+            ),
+            *(change.label(f"{stem}_change") for stem, change in changes.items()),
         )
-        current_snapshot = current_result.scalars().first()
+        .select_from(pair.outerjoin(symbols, true()))
+        .order_by(func.abs(changes["value"]).desc(), symbols.c.symbol)
+    )
+
 
-    if current_snapshot is None:
+async def _load_snapshot_comparison(
+    db: AsyncSession,
+    portfolio_id: int,
+    current_date: Optional[date],
+    previous_date: Optional[date],
+) -> Optional[PortfolioSnapshotComparisonOut]:
+    rows = (
+        await db.execute(_snapshot_comparison_statement(portfolio_id, current_date, previous_date))
+    ).mappings().all()
+    totals = rows[0]
+    if totals["current_id"] is None or totals["previous_id"] is None:
+        return None
+    if current_date is not None and totals["current_snapshot_date"] != current_date:
         return None
 
-    if previous_date is None:
-        previous_result = await db.execute(
-            select(PortfolioSnapshot)
-            .options(selectinload(PortfolioSnapshot.holdings))
-            .where(PortfolioSnapshot.portfolio_id == portfolio_id)
-            .where(PortfolioSnapshot.snapshot_date < current_snapshot.snapshot_date)
-            .order_by(PortfolioSnapshot.snapshot_date.desc())
-            .limit(1)
-        )
-        previous_snapshot = previous_result.scalars().first()
+    if totals["current_archived"] or totals["previous_archived"]:
+        holdings = await _archived_holding_deltas(db, int(totals["current_id"]), int(totals["previous_id"]))
     else:
-        previous_result = await db.execute(
-            select(PortfolioSnapshot)
-            .options(selectinload(PortfolioSnapshot.holdings))
-            .where(PortfolioSnapshot.portfolio_id == portfolio_id)
-            .where(PortfolioSnapshot.snapshot_date == previous_date)
-            .limit(1)
-        )
-        previous_snapshot = previous_result.scalars().first()
+        holdings = [
+            PortfolioSnapshotHoldingDeltaOut.model_validate(dict(row)) for row in rows if row["symbol"] is not None
+        ]
 
-    if previous_snapshot is None:
-        return None
+    current = {field: float(totals[f"current_{field}"]) for field in _COMPARISON_SNAPSHOT_FIELDS[2:6]}
+    previous = {field: float(totals[f"previous_{field}"]) for field in _COMPARISON_SNAPSHOT_FIELDS[2:6]}
+    value_change = current["total_value"] - previous["total_value"]
+    value_change_percent = (
+        (value_change / previous["total_value"]) * 100 if previous["total_value"] > 0 else 0.0
+    )
 
-    previous_holdings = {
-        holding.symbol: holding for holding in previous_snapshot.holdings
-    }
-    current_holdings = {
-        holding.symbol: holding for holding in current_snapshot.holdings
+    return PortfolioSnapshotComparisonOut(
+        portfolio_id=portfolio_id,
+        current_as_of=totals["current_snapshot_date"],
+        previous_as_of=totals["previous_snapshot_date"],
+        summary=PortfolioSnapshotComparisonSummaryOut(
+            current_value=current["total_value"],
+            previous_value=previous["total_value"],
+            value_change=value_change,
+            value_change_percent=value_change_percent,
+            current_cost=current["total_cost"],
+            previous_cost=previous["total_cost"],
+            cost_change=current["total_cost"] - previous["total_cost"],
+            current_profit_loss=current["total_profit_loss"],
+            previous_profit_loss=previous["total_profit_loss"],
+            profit_loss_change=current["total_profit_loss"] - previous["total_profit_loss"],
+            current_profit_loss_percent=current["total_profit_loss_percent"],
+            previous_profit_loss_percent=previous["total_profit_loss_percent"],
+            profit_loss_percent_change=current["total_profit_loss_percent"]
+            - previous["total_profit_loss_percent"],
+        ),
+        holdings=holdings,
+    )
+
+
+def _sum_lots_by_symbol(holdings: Sequence[Any]) -> dict[str, dict[str, Any]]:
+    """Merge holdings per symbol like the comparison statement: lots add up, price is the max."""
+
+    merged: dict[str, dict[str, Any]] = {}
+    for holding in holdings:
+        lot = {column: float(getattr(holding, column)) for column in _COMPARISON_HOLDING_FIELDS}
+        symbol_total = merged.get(holding.symbol)
+        if symbol_total is None:
+            merged[holding.symbol] = {**lot, "asset_id": holding.asset_id}
+            continue
+        for column, value in lot.items():
+            combine = max if column == "price" else sum
+            symbol_total[column] = combine((symbol_total[column], value))
+        asset_ids = [asset_id for asset_id in (symbol_total["asset_id"], holding.asset_id) if asset_id is not None]
+        symbol_total["asset_id"] = max(asset_ids, default=None)
+    return merged
+
+
+async def _archived_holding_deltas(
+    db: AsyncSession,
+    current_id: int,
+    previous_id: int,
+) -> list[PortfolioSnapshotHoldingDeltaOut]:
+    """Holding deltas computed in Python, for snapshots whose holdings left SQL."""
+
+    snapshots = {
+        int(snapshot.id): snapshot
+        for snapshot in (
+            await db.execute(
+                select(PortfolioSnapshot)
+                .options(selectinload(PortfolioSnapshot.holdings))
+                .where(PortfolioSnapshot.id.in_([current_id, previous_id]))
+            )
+        ).scalars().all()
     }
+    previous_holdings = _sum_lots_by_symbol(await load_snapshot_holdings(snapshots[previous_id]))
+    current_holdings = _sum_lots_by_symbol(await load_snapshot_holdings(snapshots[current_id]))
 
     holding_deltas: list[PortfolioSnapshotHoldingDeltaOut] = []
     for symbol in sorted(set(previous_holdings) | set(current_holdings)):
         current_holding = current_holdings.get(symbol)
         previous_holding = previous_holdings.get(symbol)
 
-        current_quantity = float(current_holding.quantity) if current_holding else 0.0
-        previous_quantity = float(previous_holding.quantity) if previous_holding else 0.0
-        current_price = float(current_holding.price) if current_holding else 0.0
-        previous_price = float(previous_holding.price) if previous_holding else 0.0
-        current_value = float(current_holding.current_value) if current_holding else 0.0
-        previous_value = float(previous_holding.current_value) if previous_holding else 0.0
-        current_allocation_percent = (
-            float(current_holding.allocation_percent) if current_holding else 0.0
-        )
-        previous_allocation_percent = (
-            float(previous_holding.allocation_percent) if previous_holding else 0.0
-        )
-        current_profit_loss = float(current_holding.profit_loss) if current_holding else 0.0
-        previous_profit_loss = float(previous_holding.profit_loss) if previous_holding else 0.0
+        current_quantity = current_holding["quantity"] if current_holding else 0.0
+        previous_quantity = previous_holding["quantity"] if previous_holding else 0.0
+        current_price = current_holding["price"] if current_holding else 0.0
+        previous_price = previous_holding["price"] if previous_holding else 0.0
+        current_value = current_holding["current_value"] if current_holding else 0.0
+        previous_value = previous_holding["current_value"] if previous_holding else 0.0
+        current_allocation_percent = current_holding["allocation_percent"] if current_holding else 0.0
+        previous_allocation_percent = previous_holding["allocation_percent"] if previous_holding else 0.0
+        current_profit_loss = current_holding["profit_loss"] if current_holding else 0.0
+        previous_profit_loss = previous_holding["profit_loss"] if previous_holding else 0.0
 
         if previous_holding is None:
             status = "added"
@@ -429,7 +838,14 @@ async def get_portfolio_snapshot_comparison(
 
         holding_deltas.append(
             PortfolioSnapshotHoldingDeltaOut(
-                asset_id=current_holding.asset_id if current_holding else previous_holding.asset_id,
+                asset_id=next(
+                    (
+                        lots["asset_id"]
+                        for lots in (current_holding, previous_holding)
+                        if lots and lots["asset_id"] is not None
+                    ),
+                    None,
+                ),
                 symbol=symbol,
                 status=status,
                 current_quantity=current_quantity,
@@ -450,38 +866,126 @@ async def get_portfolio_snapshot_comparison(
             )
         )
 
-    ordered_deltas = sorted(
-        holding_deltas,
-        key=lambda holding: abs(holding.value_change),
-        reverse=True,
+    return sorted(holding_deltas, key=lambda holding: abs(holding.value_change), reverse=True)
+
+
+async def get_portfolio_snapshot_analytics(
+    db: AsyncSession,
+    portfolio_id: int,
+    owner_id: int,
+    *,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    volatility_window: int = 21,
+) -> Optional[PortfolioSnapshotAnalyticsOut]:
+    """Return performance analytics over the daily snapshots in a date range.
+
+    ``to_date`` defaults to today and ``from_date`` to 364 days before it.
+    Returns None when the portfolio is not owned by ``owner_id`` or the
+    range holds fewer than two snapshots.
+    """
+
+    portfolio = await get_owned_portfolio(db, portfolio_id, owner_id)
+    if portfolio is None:
+        return None
+
+    to_date = to_date or datetime.now(timezone.utc).date()
+    from_date = from_date or to_date - timedelta(days=364)
+    if from_date > to_date:
+        raise ValueError("from_date must not be later than to_date")
+
+    return await snapshot_response_cache.get(
+        portfolio_id,
+        ("analytics", from_date, to_date, volatility_window),
+        (from_date, to_date),
+        lambda: _load_snapshot_analytics(db, portfolio_id, from_date, to_date, volatility_window),
     )
 
-    value_change = float(current_snapshot.total_value) - float(previous_snapshot.total_value)
-    previous_total_value = float(previous_snapshot.total_value)
-    value_change_percent = (
-        (value_change / previous_total_value) * 100 if previous_total_value > 0 else 0.0
+
+async def _load_snapshot_analytics(
+    db: AsyncSession,
+    portfolio_id: int,
+    from_date: date,
+    to_date: date,
+    volatility_window: int,
+) -> Optional[PortfolioSnapshotAnalyticsOut]:
+    in_range = (
+        PortfolioSnapshot.portfolio_id == portfolio_id,
+        PortfolioSnapshot.snapshot_date >= from_date,
+        PortfolioSnapshot.snapshot_date <= to_date,
     )
+    rows = (
+        await db.execute(
+            select(PortfolioSnapshot.snapshot_date, PortfolioSnapshot.total_value, PortfolioSnapshot.holdings_archived)
+            .where(*in_range)
+            .order_by(PortfolioSnapshot.snapshot_date.asc())
+        )
+    ).all()
+    if len(rows) < 2:
+        return None
 
-    return PortfolioSnapshotComparisonOut(
+    dates, values, archived = zip(*rows)
+    holdings = (
+        await db.execute(
+            select(
+                PortfolioSnapshot.snapshot_date,
+                PortfolioSnapshotHolding.symbol,
+                PortfolioSnapshotHolding.quantity,
+                PortfolioSnapshotHolding.price,
+            )
+            .join(PortfolioSnapshot, PortfolioSnapshotHolding.portfolio_snapshot_id == PortfolioSnapshot.id)
+            .where(*in_range)
+        )
+    ).all()
+    ordinals = np.array([snapshot_date.toordinal() for snapshot_date, *_ in holdings], dtype=np.int64)
+    symbols = np.array([str(symbol) for _, symbol, *_ in holdings], dtype=object)
+    quantities = np.array([quantity for *_, quantity, _ in holdings], dtype=np.float64)
+    prices = np.array([price for *_, price in holdings], dtype=np.float64)
+    archived_dates = [snapshot_date for snapshot_date, is_archived in zip(dates, archived) if is_archived]
+    if archived_dates:
+        columns = await asyncio.to_thread(
+            snapshot_archive.read_portfolio_range,
+            portfolio_id,
+            archived_dates[0],
+            archived_dates[-1],
+            ("symbol", "quantity", "price"),
+        )
+        # The archive can still hold rows of dates re-captured into SQL since.
+        keep = np.isin(columns["snapshot_date"], [day.toordinal() for day in archived_dates])
+        ordinals = np.concatenate([ordinals, columns["snapshot_date"][keep]])
+        symbols = np.concatenate([symbols, columns["symbol"][keep].astype(object)])
+        quantities = np.concatenate([quantities, columns["quantity"][keep]])
+        prices = np.concatenate([prices, columns["price"][keep]])
+
+    snapshot_index = np.searchsorted([day.toordinal() for day in dates], ordinals)
+    _, symbol_index = np.unique(symbols.astype(str), return_inverse=True)
+    flows = quantity_change_flows(snapshot_index, symbol_index, quantities, prices, len(rows))
+    analytics = compute_snapshot_analytics(values, flows, volatility_window)
+    period_dates = dates[1:]
+    returns = analytics.period_returns
+
+    def _day(index: int) -> SnapshotReturnPoint:
+        return SnapshotReturnPoint(as_of=period_dates[index], return_percent=float(returns[index]) * 100)
+
+    filled = np.flatnonzero(~np.isnan(analytics.rolling_volatility))
+    return PortfolioSnapshotAnalyticsOut(
         portfolio_id=portfolio_id,
-        current_as_of=current_snapshot.snapshot_date,
-        previous_as_of=previous_snapshot.snapshot_date,
-        summary=PortfolioSnapshotComparisonSummaryOut(
-            current_value=float(current_snapshot.total_value),
-            previous_value=float(previous_snapshot.total_value),
-            value_change=value_change,
-            value_change_percent=value_change_percent,
-            current_cost=float(current_snapshot.total_cost),
-            previous_cost=float(previous_snapshot.total_cost),
-            cost_change=float(current_snapshot.total_cost) - float(previous_snapshot.total_cost),
-            current_profit_loss=float(current_snapshot.total_profit_loss),
-            previous_profit_loss=float(previous_snapshot.total_profit_loss),
-            profit_loss_change=float(current_snapshot.total_profit_loss)
-            - float(previous_snapshot.total_profit_loss),
-            current_profit_loss_percent=float(current_snapshot.total_profit_loss_percent),
-            previous_profit_loss_percent=float(previous_snapshot.total_profit_loss_percent),
-            profit_loss_percent_change=float(current_snapshot.total_profit_loss_percent)
-            - float(previous_snapshot.total_profit_loss_percent),
-        ),
-        holdings=ordered_deltas,
+        from_date=from_date,
+        to_date=to_date,
+        snapshot_count=len(rows),
+        start_value=float(values[0]),
+        end_value=float(values[-1]),
+        net_contributions=float(flows.sum()),
+        time_weighted_return_percent=analytics.time_weighted_return * 100,
+        max_drawdown_percent=analytics.max_drawdown * 100,
+        drawdown_peak_date=dates[analytics.peak_index],
+        drawdown_trough_date=dates[analytics.trough_index],
+        volatility_percent=analytics.volatility * 100,
+        volatility_window=volatility_window,
+        rolling_volatility=[
+            SnapshotVolatilityPoint(as_of=period_dates[index], volatility_percent=volatility * 100)
+            for index, volatility in zip(filled.tolist(), analytics.rolling_volatility[filled].tolist())
+        ],
+        best_day=_day(analytics.best_index),
+        worst_day=_day(analytics.worst_index),
     )
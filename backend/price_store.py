@@ -0,0 +1,503 @@
+# price_store.py
+"""
+Local, append-only store of daily OHLCV bars.
+
+Each symbol has one binary file of fixed-size records (``BAR_DTYPE``) in
+date order, read back through ``numpy.memmap`` so answering a history
+request is a slice of a local file rather than a yfinance download. A small
+JSON sidecar records when the symbol was last checked upstream.
+
+The first request for a symbol downloads its full history; afterwards only
+the tail since the last stored bar is fetched, at most once per
+``PRICE_STORE_REFRESH_SECONDS``. The last stored bar is re-fetched with the
+tail and overwritten in place, so a bar stored mid-session ends up with its
+final close.
+
+yfinance adjusts every earlier bar for splits and dividends, so a tail
+that carries a split or dividend dated after the last stored bar makes the
+stored bars stale. The symbol's full history is then downloaded again and
+the file replaced.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import settings
+from .market_data import MarketDataService, market_data
+
+logger = logging.getLogger(__name__)
+
+BAR_DTYPE = np.dtype(
+    [
+        ("timestamp", "<i8"),  # trading date as naive-midnight nanoseconds
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("volume", "<f8"),
+    ]
+)
+
+_SYMBOL_PATTERN = re.compile(r"^[A-Z0-9.^=_-]{1,24}$")
+
+# Periods counted in trading days rather than calendar offsets.
+_PERIOD_BARS = {"1d": 1, "5d": 5}
+_PERIOD_OFFSETS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+
+def is_valid_symbol(symbol: str) -> bool:
+    """Whether ``symbol`` (upper-cased) can be kept in the store."""
+
+    return bool(_SYMBOL_PATTERN.match(symbol.upper()))
+
+
+def _trading_timestamps(index: pd.Index) -> np.ndarray:
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        # Keep the exchange-local trading date; converting to UTC would move
+        # bars of exchanges east of UTC onto the previous day.
+        index = index.tz_localize(None)
+    return index.normalize().values.astype("datetime64[ns]").astype(np.int64)
+
+
+def frame_to_bars(frame: pd.DataFrame) -> np.ndarray:
+    """Convert a yfinance history frame into sorted, de-duplicated bars."""
+
+    if frame is None or frame.empty or "Close" not in frame.columns:
+        return np.empty(0, dtype=BAR_DTYPE)
+
+    frame = frame[frame["Close"].notna()]
+    timestamps = _trading_timestamps(frame.index)
+
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    bars["timestamp"] = timestamps
+    for field, column in (("open", "Open"), ("high", "High"), ("low", "Low"), ("close", "Close"), ("volume", "Volume")):
+        if column in frame.columns:
+            bars[field] = frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            bars[field] = np.nan
+
+    if len(bars) < 2:
+        return bars
+    bars = bars[np.argsort(bars["timestamp"], kind="stable")]
+    # Keep the last row for any repeated date.
+    return bars[np.append(bars["timestamp"][1:] != bars["timestamp"][:-1], True)]
+
+
+def has_corporate_action_after(frame: pd.DataFrame, timestamp: int) -> bool:
+    """Whether ``frame`` has a split or dividend dated after ``timestamp``."""
+
+    if frame is None or frame.empty:
+        return False
+    actions = np.zeros(len(frame), dtype=bool)
+    for column in ("Stock Splits", "Dividends"):
+        if column in frame.columns:
+            actions |= frame[column].fillna(0).to_numpy(dtype=np.float64) != 0
+    if not actions.any():
+        return False
+    return bool((_trading_timestamps(frame.index)[actions] > timestamp).any())
+
+
+def period_start_index(timestamps: np.ndarray, period: str) -> int:
+    """Index of the first of the sorted ``timestamps`` inside ``period``.
+
+    The period is measured back from the last timestamp.
+    """
+
+    if len(timestamps) == 0 or period == "max":
+        return 0
+    if period in _PERIOD_BARS:
+        return max(len(timestamps) - _PERIOD_BARS[period], 0)
+
+    last = pd.Timestamp(int(timestamps[-1]))
+    if period == "ytd":
+        start = pd.Timestamp(year=last.year, month=1, day=1)
+    elif period in _PERIOD_OFFSETS:
+        start = last - _PERIOD_OFFSETS[period]
+    else:
+        raise ValueError(f"Unsupported period: {period}")
+    return int(np.searchsorted(timestamps, start.value, side="left"))
+
+
+def slice_period(bars: np.ndarray, period: str) -> np.ndarray:
+    """Return the bars covering ``period``, measured back from the last bar."""
+
+    return bars[period_start_index(bars["timestamp"], period):]
+
+
+def format_dates(timestamps: np.ndarray) -> List[str]:
+    """Format bar timestamps as ``YYYY-MM-DD`` strings in one pass."""
+
+    return np.datetime_as_string(np.asarray(timestamps).astype("datetime64[ns]"), unit="D").tolist()
+
+
+def closes_as_of(bars: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """Close of the last bar on or before each of ``days`` (``datetime64[D]``).
+
+    Days before the first bar are NaN; weekends and holidays carry the
+    previous trading day's close.
+    """
+
+    targets = np.asarray(days, dtype="datetime64[D]").astype("datetime64[ns]").astype(np.int64)
+    positions = np.searchsorted(bars["timestamp"], targets, side="right") - 1
+    closes = np.full(len(targets), np.nan)
+    known = positions >= 0
+    closes[known] = bars["close"][positions[known]]
+    return closes
+
+
+def column_to_list(values: np.ndarray) -> List[Optional[float]]:
+    """Convert a float column to a list, with ``None`` for missing values."""
+
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    if missing.any():
+        return np.where(missing, None, values).tolist()
+    return values.tolist()
+
+
+def bars_to_columns(bars: np.ndarray) -> Dict[str, List[Any]]:
+    """Convert bars to JSON-ready column lists in one vectorized pass.
+
+    Dates are formatted as ``YYYY-MM-DD`` for the whole array at once and
+    missing values become ``None``.
+    """
+
+    columns: Dict[str, List[Any]] = {
+        "date": format_dates(bars["timestamp"]),
+    }
+    for field in ("open", "high", "low", "close", "volume"):
+        columns[field] = column_to_list(bars[field])
+    return columns
+
+
+def bars_to_records(bars: np.ndarray) -> List[Dict[str, Any]]:
+    """Format bars as the row dictionaries returned by the history endpoint."""
+
+    columns = bars_to_columns(bars)
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
+
+
+class PriceStore:
+    """Per-symbol bar files with incremental refresh from upstream."""
+
+    def __init__(
+        self,
+        root: str,
+        *,
+        refresh_seconds: float,
+        fetch_timeout_seconds: Optional[float] = None,
+        market: MarketDataService = market_data,
+    ):
+        self.root = root
+        self.refresh_seconds = float(refresh_seconds)
+        self.fetch_timeout_seconds = fetch_timeout_seconds
+        self.market = market
+        self._refreshing: Dict[str, asyncio.Future] = {}
+
+    def _path(self, symbol: str, suffix: str) -> str:
+        if not _SYMBOL_PATTERN.match(symbol):
+            raise ValueError(f"Invalid symbol: {symbol!r}")
+        return os.path.join(self.root, f"{symbol}{suffix}")
+
+    def read(self, symbol: str) -> np.ndarray:
+        """Return every stored bar for ``symbol`` as a read-only memmap."""
+
+        path = self._path(symbol.upper(), ".bars")
+        try:
+            count = os.path.getsize(path) // BAR_DTYPE.itemsize
+        except FileNotFoundError:
+            count = 0
+        if count == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.memmap(path, dtype=BAR_DTYPE, mode="r", shape=(count,))
+
+    def _last_checked(self, symbol: str) -> Optional[float]:
+        try:
+            with open(self._path(symbol, ".meta.json")) as meta_file:
+                return float(json.load(meta_file)["checked_at"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _mark_checked(self, symbol: str) -> None:
+        path = self._path(symbol, ".meta.json")
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as meta_file:
+            json.dump({"checked_at": time.time()}, meta_file)
+        os.replace(tmp_path, path)
+
+    def append(self, symbol: str, bars: np.ndarray) -> int:
+        """Add ``bars`` newer than the stored tail and return how many were written.
+
+        A bar dated the same day as the last stored bar overwrites it. The
+        file is locked so workers refreshing the same symbol cannot
+        interleave records, and it never shrinks while readers may have it
+        mapped.
+        """
+
+        symbol = symbol.upper()
+        os.makedirs(self.root, exist_ok=True)
+        fd = os.open(self._path(symbol, ".bars"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            size = os.fstat(fd).st_size
+            count = size // BAR_DTYPE.itemsize
+            if size % BAR_DTYPE.itemsize:
+                # Drop a partial record left by an interrupted write.
+                os.ftruncate(fd, count * BAR_DTYPE.itemsize)
+
+            offset = count * BAR_DTYPE.itemsize
+            if count:
+                last = np.frombuffer(
+                    os.pread(fd, BAR_DTYPE.itemsize, offset - BAR_DTYPE.itemsize),
+                    dtype=BAR_DTYPE,
+                )[0]
+                bars = bars[bars["timestamp"] >= last["timestamp"]]
+                if len(bars) and bars["timestamp"][0] == last["timestamp"]:
+                    offset -= BAR_DTYPE.itemsize
+            if len(bars):
+                os.pwrite(fd, np.ascontiguousarray(bars).tobytes(), offset)
+            return len(bars)
+        finally:
+            os.close(fd)
+
+    def replace(self, symbol: str, bars: np.ndarray) -> None:
+        """Replace every stored bar for ``symbol`` with ``bars``.
+
+        The new file is written aside and renamed over the old one, so
+        readers that already mapped the old file keep a consistent view.
+        """
+
+        symbol = symbol.upper()
+        path = self._path(symbol, ".bars")
+        os.makedirs(self.root, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Hold the appenders' lock so no tail lands between read and rename.
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as bars_file:
+                bars_file.write(np.ascontiguousarray(bars).tobytes())
+            os.replace(tmp_path, path)
+        finally:
+            os.close(fd)
+
+    async def _reload(self, symbol: str) -> None:
+        frame = await self.market.fetch_history(symbol, period="max", timeout=self.fetch_timeout_seconds)
+        bars = frame_to_bars(frame)
+        if len(bars):
+            await asyncio.to_thread(self.replace, symbol, bars)
+            logger.info("Reloaded %s bars for %s after a split or dividend", len(bars), symbol)
+
+    async def refresh(self, symbol: str) -> None:
+        """Fetch bars missing from the store for ``symbol``.
+
+        If the upstream call fails and bars are already stored, the stale
+        bars keep being served and the next request retries.
+        """
+
+        symbol = symbol.upper()
+        stored = self.read(symbol)
+        try:
+            if len(stored):
+                last_date = pd.Timestamp(int(stored["timestamp"][-1])).date()
+                frame = await self.market.fetch_history(
+                    symbol, start=last_date, timeout=self.fetch_timeout_seconds
+                )
+            else:
+                frame = await self.market.fetch_history(
+                    symbol, period="max", timeout=self.fetch_timeout_seconds
+                )
+        except Exception as exc:
+            if not len(stored):
+                raise
+            logger.warning("Serving stored bars for %s; refresh failed: %s", symbol, exc)
+            return
+
+        if len(stored) and has_corporate_action_after(frame, int(stored["timestamp"][-1])):
+            try:
+                await self._reload(symbol)
+            except Exception as exc:
+                # Leave the symbol due so the next request retries the reload.
+                logger.warning("Reloading %s after a split or dividend failed: %s", symbol, exc)
+                return
+            await asyncio.to_thread(self._mark_checked, symbol)
+            return
+
+        bars = frame_to_bars(frame)
+        if len(bars):
+            written = await asyncio.to_thread(self.append, symbol, bars)
+            logger.debug("Stored %s bars for %s", written, symbol)
+        await asyncio.to_thread(self._mark_checked, symbol)
+
+    async def refresh_many(self, symbols: List[str]) -> None:
+        """Refresh several symbols with at most two batched downloads.
+
+        Symbols with nothing stored get their full history in one download;
+        the rest share one download starting at the oldest of their last
+        stored dates. Failures are logged and leave the affected symbols
+        due for the next request.
+        """
+
+        if len(symbols) == 1:
+            try:
+                await self.refresh(symbols[0])
+            except Exception as exc:
+                logger.warning("Price store refresh failed for %s: %s", symbols[0], exc)
+            return
+
+        last_dates = {}
+        for symbol in symbols:
+            stored = self.read(symbol)
+            if len(stored):
+                last_dates[symbol] = pd.Timestamp(int(stored["timestamp"][-1])).date()
+
+        groups = [
+            ([symbol for symbol in symbols if symbol not in last_dates], {"period": "max"}),
+            (list(last_dates), {"start": min(last_dates.values())} if last_dates else {}),
+        ]
+        for group, window in groups:
+            if not group:
+                continue
+            try:
+                frames = await self.market.fetch_histories(
+                    group, timeout=self.fetch_timeout_seconds, **window
+                )
+            except Exception as exc:
+                logger.warning("Price store refresh failed for %s symbols: %s", len(group), exc)
+                continue
+            for symbol in group:
+                frame = frames.get(symbol)
+                if symbol in last_dates and has_corporate_action_after(
+                    frame, int(self.read(symbol)["timestamp"][-1])
+                ):
+                    try:
+                        await self._reload(symbol)
+                    except Exception as exc:
+                        logger.warning("Reloading %s after a split or dividend failed: %s", symbol, exc)
+                        continue
+                else:
+                    bars = frame_to_bars(frame)
+                    if len(bars):
+                        await asyncio.to_thread(self.append, symbol, bars)
+                await asyncio.to_thread(self._mark_checked, symbol)
+
+    def _is_due(self, symbol: str) -> bool:
+        checked_at = self._last_checked(symbol)
+        return checked_at is None or time.time() - checked_at >= self.refresh_seconds
+
+    def _track(self, symbols: List[str], task: asyncio.Future) -> None:
+        for symbol in symbols:
+            self._refreshing[symbol] = task
+
+        def _untrack(_: asyncio.Future) -> None:
+            for symbol in symbols:
+                if self._refreshing.get(symbol) is task:
+                    del self._refreshing[symbol]
+
+        task.add_done_callback(_untrack)
+
+    async def ensure_fresh(self, symbol: str) -> None:
+        """Refresh ``symbol`` if it was not checked within the refresh window.
+
+        Concurrent callers for the same symbol share one refresh.
+        """
+
+        symbol = symbol.upper()
+        self._path(symbol, ".bars")  # reject unsafe symbols before any I/O
+        if not self._is_due(symbol):
+            return
+
+        task = self._refreshing.get(symbol)
+        if task is None:
+            task = asyncio.ensure_future(self.refresh(symbol))
+            self._track([symbol], task)
+        await asyncio.shield(task)
+
+    async def ensure_fresh_many(self, symbols: List[str]) -> None:
+        """Refresh every due symbol in ``symbols`` through ``refresh_many``.
+
+        Symbols already being refreshed by another caller are awaited
+        rather than fetched again. Refresh failures are logged, not raised.
+        """
+
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        for symbol in symbols:
+            self._path(symbol, ".bars")
+
+        pending = {self._refreshing[symbol] for symbol in symbols if symbol in self._refreshing}
+        due = [symbol for symbol in symbols if symbol not in self._refreshing and self._is_due(symbol)]
+        if due:
+            task = asyncio.ensure_future(self.refresh_many(due))
+            self._track(due, task)
+            pending.add(task)
+
+        for task in pending:
+            try:
+                await asyncio.shield(task)
+            except Exception as exc:
+                logger.warning("Price store refresh failed: %s", exc)
+
+    async def get_bars(self, symbol: str, period: str = "max") -> np.ndarray:
+        """Return the stored bars for ``period``, refreshing the store first if due."""
+
+        await self.ensure_fresh(symbol)
+        return slice_period(self.read(symbol), period)
+
+    async def get_aligned(
+        self,
+        symbols: List[str],
+        period: str = "max",
+        field: str = "close",
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Return one ``field`` series per symbol on a shared date index.
+
+        The index is the union of the symbols' trading dates, cut to
+        ``period`` measured back from the latest of them. Dates on which a
+        symbol has no bar hold NaN. Symbols without data are omitted.
+        """
+
+        if field not in BAR_DTYPE.names or field == "timestamp":
+            raise ValueError(f"Unsupported field: {field}")
+
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        await self.ensure_fresh_many(symbols)
+        stored = {symbol: self.read(symbol) for symbol in symbols}
+        stored = {symbol: bars for symbol, bars in stored.items() if len(bars)}
+        if not stored:
+            return np.empty(0, dtype=np.int64), {}
+
+        timestamps = np.unique(np.concatenate([bars["timestamp"] for bars in stored.values()]))
+        timestamps = timestamps[period_start_index(timestamps, period):]
+
+        aligned: Dict[str, np.ndarray] = {}
+        for symbol, bars in stored.items():
+            bars = bars[bars["timestamp"] >= timestamps[0]]
+            values = np.full(len(timestamps), np.nan)
+            values[np.searchsorted(timestamps, bars["timestamp"])] = bars[field]
+            aligned[symbol] = values
+        return timestamps, aligned
+
+price_store = PriceStore(
+    settings.price_store_dir,
+    refresh_seconds=settings.price_store_refresh_seconds,
+    fetch_timeout_seconds=settings.price_store_fetch_timeout_seconds,
+)
@@ -0,0 +1,23 @@
+# responses.py
+"""Response classes for endpoints that return large JSON payloads."""
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used instead
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` encoded with orjson when it is installed.
+
+    Returning it directly from a route also skips FastAPI's per-value
+    ``jsonable_encoder`` walk, so content must already be JSON-ready.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
@@ -0,0 +1,181 @@
+# scheduler_lease.py
+"""
+Leader election for scheduled jobs through a lease row in the database.
+
+Every worker that runs the scheduler competes for the same named lease. A
+worker holds it by writing its holder id and an expiry with a conditional
+``UPDATE`` that only succeeds when the lease is free, expired or already
+its own, so exactly one worker runs the job at a time. Expiries are
+computed and compared with the database clock, so clock skew between
+worker hosts cannot hand the lease to two holders. The leader renews the
+lease while the job runs. If it dies, the lease expires and another
+worker takes over on its next poll. The lease also records the last
+completed run key so the other workers do not repeat a finished run.
+
+A table lease is used rather than a PostgreSQL advisory lock because it
+behaves the same on SQLite (tests, development) and does not tie leadership
+to one pooled connection staying open for the whole run.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .database import async_session_factory, db_now
+from .models import SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def default_holder_id() -> str:
+    """Identify this process: host, pid and a random suffix for restarts."""
+
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderLease:
+    """A named lease that at most one holder owns until it expires."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        ttl_seconds: float,
+        holder: Optional[str] = None,
+        session_factory=async_session_factory,
+    ):
+        self.name = name
+        self.ttl_seconds = float(ttl_seconds)
+        self.holder = holder or default_holder_id()
+        self.session_factory = session_factory
+
+    async def acquire(self) -> bool:
+        """Take the lease if it is free, expired or already ours."""
+
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == self.name)
+                .where(or_(SchedulerLease.holder == self.holder, SchedulerLease.expires_at <= db_now(db)))
+                .values(holder=self.holder, expires_at=db_now(db, self.ttl_seconds))
+            )
+            if result.rowcount == 1:
+                await db.commit()
+                return True
+
+            try:
+                await db.execute(
+                    insert(SchedulerLease).values(
+                        name=self.name,
+                        holder=self.holder,
+                        expires_at=db_now(db, self.ttl_seconds),
+                    )
+                )
+                await db.commit()
+            except IntegrityError:
+                # Another holder owns the existing row.
+                await db.rollback()
+                return False
+            return True
+
+    async def renew(self) -> bool:
+        """Extend the lease; False when another holder has taken it over."""
+
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == self.name)
+                .where(SchedulerLease.holder == self.holder)
+                .values(expires_at=db_now(db, self.ttl_seconds))
+            )
+            await db.commit()
+            return result.rowcount == 1
+
+    async def release(self) -> None:
+        """Expire the lease now so another worker does not wait for the TTL."""
+
+        async with self.session_factory() as db:
+            await db.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == self.name)
+                .where(SchedulerLease.holder == self.holder)
+                .values(expires_at=db_now(db))
+            )
+            await db.commit()
+
+    async def last_completed_key(self) -> Optional[str]:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(SchedulerLease.last_completed_key).where(SchedulerLease.name == self.name)
+            )
+            return result.scalar_one_or_none()
+
+    async def mark_completed(self, key: str) -> None:
+        async with self.session_factory() as db:
+            await db.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == self.name)
+                .where(SchedulerLease.holder == self.holder)
+                .values(last_completed_key=key)
+            )
+            await db.commit()
+
+    async def _renew_until_done(self, job: asyncio.Future, lost: asyncio.Event) -> None:
+        while not job.done():
+            await asyncio.sleep(self.ttl_seconds / 3)
+            if job.done():
+                return
+            try:
+                renewed = await self.renew()
+            except Exception as exc:
+                logger.warning("Could not renew lease %s: %s", self.name, exc)
+                renewed = False
+            if not renewed:
+                logger.warning("Lost lease %s; cancelling the running job", self.name)
+                lost.set()
+                job.cancel()
+                return
+
+    async def run_exclusive(
+        self,
+        job_factory: Callable[[], Awaitable[T]],
+        *,
+        completion_key: Optional[str] = None,
+    ) -> bool:
+        """Run ``job_factory()`` only if this holder wins the lease.
+
+        The lease is renewed every third of its TTL while the job runs and
+        released afterwards. Returns False when the lease was not won or was
+        lost mid-run (the job is cancelled in that case). On success
+        ``completion_key`` is recorded for ``last_completed_key``.
+        """
+
+        if not await self.acquire():
+            return False
+
+        lost = asyncio.Event()
+        job = asyncio.ensure_future(job_factory())
+        renewer = asyncio.ensure_future(self._renew_until_done(job, lost))
+        try:
+            try:
+                await job
+            except asyncio.CancelledError:
+                if not lost.is_set():
+                    raise
+                return False
+            if completion_key is not None:
+                await self.mark_completed(completion_key)
+            return True
+        finally:
+            renewer.cancel()
+            if not job.done():
+                job.cancel()
+            if not lost.is_set():
+                await self.release()
@@ -95,6 +95,8 @@ class AssetWithPerformance(AssetOut):
     current_value: Optional[float] = None
     profit_loss: Optional[float] = None
     profit_loss_percent: Optional[float] = None
+    # "live", "stale" (last stored price) or "purchase_price"
+    price_source: Optional[str] = None
     last_updated: Optional[datetime] = None
     
     model_config = ConfigDict(from_attributes=True)
@@ -134,11 +136,35 @@ class PortfolioOut(PortfolioBase):
 
 class PortfolioWithSummary(PortfolioOut):
     """Schema for portfolio data with performance summary."""
+    assets: List[AssetWithPerformance] = []
     summary: Optional[PortfolioSummary] = None
     
     model_config = ConfigDict(from_attributes=True)
 
 
+class PortfolioTotalsOut(BaseModel):
+    """Totals for one portfolio within the net-worth summary."""
+
+    portfolio_id: int
+    name: str
+    asset_count: int
+    total_value: float
+    total_cost: float
+    total_profit_loss: float
+    total_profit_loss_percent: float
+    # Share of the user's overall net worth held in this portfolio
+    allocation_percent: float
+    # Holdings valued from a stale or purchase price instead of a live quote
+    estimated_asset_count: int
+
+
+class NetWorthSummaryOut(BaseModel):
+    """Overall totals across every portfolio owned by a user."""
+
+    summary: PortfolioSummary
+    portfolios: List[PortfolioTotalsOut]
+
+
 class PortfolioSnapshotHoldingOut(BaseModel):
     """Schema for a single holding captured in a portfolio snapshot."""
 
@@ -170,6 +196,10 @@ class HistoricalSnapshotPoint(BaseModel):
 
     as_of: date
     portfolio_value: float
+    # Set for weekly/monthly points, which summarise a period of daily snapshots.
+    open_value: Optional[float] = None
+    high_value: Optional[float] = None
+    low_value: Optional[float] = None
 
 
 class PortfolioSnapshotHistoryResponse(BaseModel):
@@ -178,6 +208,7 @@ class PortfolioSnapshotHistoryResponse(BaseModel):
     portfolio_id: int
     from_date: date
     to_date: date
+    resolution: str = "day"
     points: List[HistoricalSnapshotPoint]
 
 
@@ -231,6 +262,41 @@ class PortfolioSnapshotComparisonOut(BaseModel):
     summary: PortfolioSnapshotComparisonSummaryOut
     holdings: List[PortfolioSnapshotHoldingDeltaOut]
 
+
+class SnapshotReturnPoint(BaseModel):
+    """Return of the interval ending at one snapshot."""
+
+    as_of: date
+    return_percent: float
+
+
+class SnapshotVolatilityPoint(BaseModel):
+    """Annualised volatility of the trailing window ending at one snapshot."""
+
+    as_of: date
+    volatility_percent: float
+
+
+class PortfolioSnapshotAnalyticsOut(BaseModel):
+    """Performance analytics over a range of persisted portfolio snapshots."""
+
+    portfolio_id: int
+    from_date: date
+    to_date: date
+    snapshot_count: int
+    start_value: float
+    end_value: float
+    net_contributions: float
+    time_weighted_return_percent: float
+    max_drawdown_percent: float
+    drawdown_peak_date: date
+    drawdown_trough_date: date
+    volatility_percent: float
+    volatility_window: int
+    rolling_volatility: List[SnapshotVolatilityPoint]
+    best_day: SnapshotReturnPoint
+    worst_day: SnapshotReturnPoint
+
 # Sentiment analysis schemas
 class TextInput(BaseModel):
     """Schema for text input for sentiment analysis."""
@@ -403,6 +469,7 @@ class WatchlistItemOut(BaseModel):
     display_name: Optional[str] = None
     added_at: datetime
     notes: Optional[str] = None
+    latest_price: Optional[float] = None
     latest_sentiment: Optional[WatchlistItemSentiment] = None
 
     model_config = ConfigDict(from_attributes=True)
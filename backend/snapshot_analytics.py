@@ -0,0 +1,125 @@
+# snapshot_analytics.py
+"""
+Performance analytics over a series of daily portfolio snapshots.
+
+Snapshot values move for two reasons: prices change, and the owner adds or
+removes holdings. The second is a cash flow worth the market value of the
+quantity change, not its cost: selling shares withdraws what they are
+worth. Each period's flow is valued at the period's closing price (the
+last known price for a holding that was removed) and the period return is
+
+    r_t = (V_t - F_t - V_{t-1}) / V_{t-1},    F_t = sum((q_t - q_{t-1}) * p_t)
+
+Chaining these gives the time-weighted return. Drawdown and volatility are
+measured on the same flow-adjusted growth series, so a deposit is not
+mistaken for a gain and a withdrawal is not mistaken for a drawdown. A
+"day" is one interval between consecutive snapshots.
+"""
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+@dataclass(frozen=True)
+class SnapshotAnalytics:
+    """Arrays and summary figures from ``compute_snapshot_analytics``.
+
+    Per-period arrays have one entry fewer than the input series; entry
+    ``i`` covers the interval ending at snapshot ``i + 1``. Returns and
+    volatilities are fractions, volatilities annualised.
+    """
+
+    period_returns: np.ndarray
+    rolling_volatility: np.ndarray
+    time_weighted_return: float
+    max_drawdown: float
+    peak_index: int
+    trough_index: int
+    volatility: float
+    best_index: int
+    worst_index: int
+
+
+def quantity_change_flows(
+    snapshot_index: np.ndarray,
+    symbol_index: np.ndarray,
+    quantities: np.ndarray,
+    prices: np.ndarray,
+    snapshot_count: int,
+) -> np.ndarray:
+    """Market value of the quantity changes between consecutive snapshots.
+
+    Takes one entry per holding row: the position of its snapshot, an
+    integer code for its symbol, its quantity and price. Returns
+    ``snapshot_count - 1`` flows; entry ``i`` covers the interval ending at
+    snapshot ``i + 1``.
+    """
+
+    snapshot_index = np.asarray(snapshot_index, dtype=np.int64)
+    symbol_index = np.asarray(symbol_index, dtype=np.int64)
+    symbol_count = int(symbol_index.max()) + 1 if symbol_index.size else 0
+    held = np.zeros((snapshot_count, symbol_count))
+    np.add.at(held, (snapshot_index, symbol_index), np.asarray(quantities, dtype=np.float64))
+    price = np.full((snapshot_count, symbol_count), np.nan)
+    price[snapshot_index, symbol_index] = prices
+    flow_price = np.where(np.isnan(price[1:]), price[:-1], price[1:])
+    # Unpriced cells only occur where the quantity is 0 on both sides.
+    return np.nansum(np.diff(held, axis=0) * flow_price, axis=1)
+
+
+def compute_snapshot_analytics(
+    values: Sequence[float],
+    flows: Sequence[float],
+    volatility_window: int,
+) -> SnapshotAnalytics:
+    """Compute returns, drawdown and volatility for at least two snapshots.
+
+    ``flows`` has one entry per interval (see ``quantity_change_flows``).
+    Periods that start from nothing invested (``V_{t-1} <= 0``) have a
+    return of 0. ``rolling_volatility`` is NaN until ``volatility_window``
+    periods are available.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    flows = np.asarray(flows, dtype=np.float64)
+    if values.size < 2:
+        raise ValueError("At least two snapshots are required")
+    if flows.size != values.size - 1:
+        raise ValueError("flows must have one entry per interval between snapshots")
+
+    start = values[:-1]
+    returns = np.divide(
+        values[1:] - flows - start,
+        start,
+        out=np.zeros_like(start),
+        where=start > 0,
+    )
+
+    growth = np.concatenate(([1.0], np.cumprod(1.0 + returns)))
+    peaks = np.maximum.accumulate(growth)
+    drawdowns = growth / peaks - 1.0
+    trough_index = int(np.argmin(drawdowns))
+    # The peak is the last snapshot at the running high before the trough.
+    peak_index = trough_index - int(np.argmax(growth[trough_index::-1] == peaks[trough_index]))
+
+    annualisation = np.sqrt(TRADING_DAYS_PER_YEAR)
+    volatility = float(returns.std(ddof=1) * annualisation) if returns.size > 1 else 0.0
+    rolling_volatility = np.full(returns.size, np.nan)
+    if volatility_window > 1 and returns.size >= volatility_window:
+        windows = np.lib.stride_tricks.sliding_window_view(returns, volatility_window)
+        rolling_volatility[volatility_window - 1:] = windows.std(axis=1, ddof=1) * annualisation
+
+    return SnapshotAnalytics(
+        period_returns=returns,
+        rolling_volatility=rolling_volatility,
+        time_weighted_return=float(growth[-1] - 1.0),
+        max_drawdown=float(drawdowns[trough_index]),
+        peak_index=peak_index,
+        trough_index=trough_index,
+        volatility=volatility,
+        best_index=int(np.argmax(returns)),
+        worst_index=int(np.argmin(returns)),
+    )
@@ -0,0 +1,358 @@
+# snapshot_archive.py
+"""
+Columnar archive for old snapshot holdings.
+
+``portfolio_snapshot_holdings`` grows by holdings x portfolios every day,
+while holdings older than a few months are only read one date at a time.
+Compaction moves the holdings of snapshots older than
+``SNAPSHOT_HOLDINGS_RETENTION_DAYS`` into compressed ``.npz`` files (one
+array per column), flags those snapshots as archived and deletes their SQL
+holding rows. The aggregate ``portfolio_snapshots`` rows stay in SQL, so
+history, rollups and comparisons of totals are unaffected; holding detail
+for an archived date is read back from the archive.
+
+Each calendar month is split into ``SNAPSHOT_ARCHIVE_BUCKETS`` files by
+``portfolio_id % buckets``, with rows sorted by (portfolio, date). A read
+decompresses one bucket's key columns, finds its row range by binary
+search and slices the rest; a compaction rewrites only the buckets that
+receive rows. Bucket files are rewritten whole (read, merge, write to a
+temp file, ``os.replace``) under a per-file lock, so readers always see a
+complete file and compaction can be re-run safely.
+
+The bucket count is recorded in ``archive.json`` by the first write and
+used from then on. Changing ``SNAPSHOT_ARCHIVE_BUCKETS`` later only logs a
+warning; it cannot strand archived holdings in buckets nobody reads.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .models import PortfolioSnapshot, PortfolioSnapshotHolding
+
+logger = logging.getLogger(__name__)
+
+_FLOAT_COLUMNS = (
+    "quantity",
+    "price",
+    "current_value",
+    "allocation_percent",
+    "total_cost",
+    "profit_loss",
+    "profit_loss_percent",
+)
+_SYMBOL_DTYPE = "<U20"  # matches PortfolioSnapshotHolding.symbol
+_NO_ASSET_ID = -1
+
+
+def _empty_columns() -> Dict[str, np.ndarray]:
+    columns = {
+        "portfolio_id": np.empty(0, dtype=np.int64),
+        "snapshot_date": np.empty(0, dtype=np.int64),  # date.toordinal()
+        "asset_id": np.empty(0, dtype=np.int64),
+        "symbol": np.empty(0, dtype=_SYMBOL_DTYPE),
+    }
+    columns.update({name: np.empty(0, dtype=np.float64) for name in _FLOAT_COLUMNS})
+    return columns
+
+
+def _row_keys(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    return (columns["portfolio_id"].astype(np.int64) << 32) | columns["snapshot_date"].astype(np.int64)
+
+
+class SnapshotArchive:
+    """Month- and portfolio-bucket-partitioned holding files under ``root``."""
+
+    def __init__(self, root: str, buckets: int = 64):
+        self.root = root
+        self.buckets = max(int(buckets), 1)
+        self._warned_buckets: Optional[int] = None
+
+    def _bucket_count(self, *, create: bool = False) -> int:
+        """The bucket count the files under ``root`` were written with.
+
+        Falls back to the configured count while nothing is stored; with
+        ``create`` the configured count is recorded first.
+        """
+
+        path = os.path.join(self.root, "archive.json")
+        if create:
+            os.makedirs(self.root, exist_ok=True)
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                pass
+            else:
+                with os.fdopen(fd, "w") as layout_file:
+                    json.dump({"buckets": self.buckets}, layout_file)
+                return self.buckets
+        try:
+            with open(path) as layout_file:
+                stored = int(json.load(layout_file)["buckets"])
+        except FileNotFoundError:
+            return self.buckets
+        if stored != self.buckets and self._warned_buckets != stored:
+            self._warned_buckets = stored
+            logger.warning(
+                "Snapshot archive %s was written with %s buckets; ignoring SNAPSHOT_ARCHIVE_BUCKETS=%s",
+                self.root,
+                stored,
+                self.buckets,
+            )
+        return stored
+
+    def _path(self, month: date, bucket: int, suffix: str = ".npz") -> str:
+        return os.path.join(self.root, f"holdings-{month:%Y-%m}-b{bucket:03d}{suffix}")
+
+    @contextmanager
+    def _locked(self, month: date, bucket: int) -> Iterator[None]:
+        os.makedirs(self.root, exist_ok=True)
+        fd = os.open(self._path(month, bucket, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def read_bucket(self, month: date, bucket: int) -> Dict[str, np.ndarray]:
+        try:
+            with np.load(self._path(month, bucket)) as archive:
+                return {name: archive[name] for name in archive.files}
+        except FileNotFoundError:
+            return _empty_columns()
+
+    def write_month(
+        self,
+        month: date,
+        rows: List[Dict[str, Any]],
+        snapshots: Optional[Sequence[Tuple[int, date]]] = None,
+    ) -> int:
+        """Merge holding ``rows`` for ``month`` into its bucket files.
+
+        Each row needs ``portfolio_id``, ``snapshot_date`` and the holding
+        columns. Archived holdings of every ``(portfolio_id, snapshot_date)``
+        in ``snapshots`` (default: those present in ``rows``) are replaced,
+        so re-archiving a re-captured snapshot does not duplicate it, even
+        when it no longer has holdings. Only buckets with rows or replaced
+        snapshots are rewritten. Returns the number of rows written.
+        """
+
+        new = _empty_columns()
+        if rows:
+            new["portfolio_id"] = np.array([row["portfolio_id"] for row in rows], dtype=np.int64)
+            new["snapshot_date"] = np.array(
+                [row["snapshot_date"].toordinal() for row in rows], dtype=np.int64
+            )
+            new["asset_id"] = np.array(
+                [_NO_ASSET_ID if row["asset_id"] is None else row["asset_id"] for row in rows],
+                dtype=np.int64,
+            )
+            new["symbol"] = np.array([row["symbol"] for row in rows], dtype=_SYMBOL_DTYPE)
+            for name in _FLOAT_COLUMNS:
+                new[name] = np.array([row[name] for row in rows], dtype=np.float64)
+
+        if snapshots is None:
+            replaced_pids, replaced_days = new["portfolio_id"], new["snapshot_date"]
+        else:
+            replaced_pids = np.array([pid for pid, _ in snapshots], dtype=np.int64)
+            replaced_days = np.array([day.toordinal() for _, day in snapshots], dtype=np.int64)
+        replaced = _row_keys({"portfolio_id": replaced_pids, "snapshot_date": replaced_days})
+
+        buckets = self._bucket_count(create=True)
+        new_buckets = new["portfolio_id"] % buckets
+        for bucket in np.union1d(np.unique(new_buckets), np.unique(replaced_pids % buckets)):
+            bucket = int(bucket)
+            in_bucket = new_buckets == bucket
+            with self._locked(month, bucket):
+                existing = self.read_bucket(month, bucket)
+                keep = ~np.isin(_row_keys(existing), replaced)
+                merged = {
+                    name: np.concatenate([existing[name][keep], new[name][in_bucket]]) for name in new
+                }
+                order = np.lexsort((merged["snapshot_date"], merged["portfolio_id"]))
+                merged = {name: values[order] for name, values in merged.items()}
+
+                path = self._path(month, bucket)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as archive_file:
+                    np.savez_compressed(archive_file, **merged)
+                os.replace(tmp_path, path)
+        return len(rows)
+
+    def read_holdings(self, portfolio_id: int, snapshot_date: date) -> List[Dict[str, Any]]:
+        """Archived holdings of one snapshot as ``PortfolioSnapshotHoldingOut`` fields."""
+
+        path = self._path(snapshot_date.replace(day=1), portfolio_id % self._bucket_count())
+        try:
+            archive = np.load(path)
+        except FileNotFoundError:
+            return []
+        with archive:
+            # npz members decompress on access: the keys first, then only
+            # the columns needed, sliced to this snapshot's sorted row range.
+            keys = _row_keys({name: archive[name] for name in ("portfolio_id", "snapshot_date")})
+            target = (np.int64(portfolio_id) << 32) | np.int64(snapshot_date.toordinal())
+            lo, hi = np.searchsorted(keys, [target, target + 1])
+            if lo == hi:
+                return []
+            selected = {
+                name: archive[name][lo:hi] for name in ("asset_id", "symbol", *_FLOAT_COLUMNS)
+            }
+        holdings = []
+        for index in range(int(hi - lo)):
+            asset_id = int(selected["asset_id"][index])
+            holding = {
+                "asset_id": None if asset_id == _NO_ASSET_ID else asset_id,
+                "symbol": str(selected["symbol"][index]),
+            }
+            holding.update({name: float(selected[name][index]) for name in _FLOAT_COLUMNS})
+            holdings.append(holding)
+        return holdings
+
+    def read_portfolio_range(
+        self,
+        portfolio_id: int,
+        start_date: date,
+        end_date: date,
+        columns: Sequence[str],
+    ) -> Dict[str, np.ndarray]:
+        """``columns`` of every archived holding of ``portfolio_id`` in a date range.
+
+        ``snapshot_date`` is always included, as ``date.toordinal()`` values.
+        Reads the portfolio's bucket file of each month in the range.
+        """
+
+        names = ["snapshot_date", *(name for name in columns if name != "snapshot_date")]
+        lo_key = (np.int64(portfolio_id) << 32) | np.int64(start_date.toordinal())
+        hi_key = (np.int64(portfolio_id) << 32) | np.int64(end_date.toordinal() + 1)
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+        bucket = portfolio_id % self._bucket_count()
+        month = start_date.replace(day=1)
+        while month <= end_date:
+            try:
+                archive = np.load(self._path(month, bucket))
+            except FileNotFoundError:
+                month = _next_month(month)
+                continue
+            with archive:
+                keys = _row_keys({name: archive[name] for name in ("portfolio_id", "snapshot_date")})
+                lo, hi = np.searchsorted(keys, [lo_key, hi_key])
+                for name in names:
+                    parts[name].append(archive[name][lo:hi])
+            month = _next_month(month)
+
+        empty = _empty_columns()
+        return {
+            name: np.concatenate(parts[name]) if parts[name] else empty[name] for name in names
+        }
+
+
+@dataclass
+class CompactionResult:
+    cutoff: date
+    snapshots_archived: int = 0
+    holdings_archived: int = 0
+
+
+def _next_month(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+async def compact_snapshot_holdings(
+    db: AsyncSession,
+    cutoff: date,
+    *,
+    archive: Optional[SnapshotArchive] = None,
+) -> CompactionResult:
+    """Archive the holdings of every snapshot dated before ``cutoff``.
+
+    Works one month at a time: the month file is written before the SQL
+    rows are flagged and deleted in one commit, so a crash in between only
+    leaves archived rows that the next run overwrites.
+    """
+
+    archive = archive or snapshot_archive
+    result = CompactionResult(cutoff=cutoff)
+    months = (
+        await db.execute(
+            select(PortfolioSnapshot.snapshot_date)
+            .where(PortfolioSnapshot.snapshot_date < cutoff)
+            .where(PortfolioSnapshot.holdings_archived.is_(False))
+            .distinct()
+        )
+    ).scalars().all()
+
+    for month in sorted({snapshot_date.replace(day=1) for snapshot_date in months}):
+        month_end = min(_next_month(month), cutoff)
+        pending = (
+            select(PortfolioSnapshot.id)
+            .where(PortfolioSnapshot.snapshot_date >= month)
+            .where(PortfolioSnapshot.snapshot_date < month_end)
+            .where(PortfolioSnapshot.holdings_archived.is_(False))
+        )
+        snapshots = (
+            await db.execute(
+                select(PortfolioSnapshot.portfolio_id, PortfolioSnapshot.snapshot_date)
+                .where(PortfolioSnapshot.id.in_(pending))
+            )
+        ).all()
+        rows = (
+            await db.execute(
+                select(
+                    PortfolioSnapshot.portfolio_id,
+                    PortfolioSnapshot.snapshot_date,
+                    PortfolioSnapshotHolding.asset_id,
+                    PortfolioSnapshotHolding.symbol,
+                    *(getattr(PortfolioSnapshotHolding, name) for name in _FLOAT_COLUMNS),
+                )
+                .join(PortfolioSnapshot, PortfolioSnapshotHolding.portfolio_snapshot_id == PortfolioSnapshot.id)
+                .where(PortfolioSnapshot.id.in_(pending))
+            )
+        ).mappings().all()
+
+        written = await asyncio.to_thread(
+            archive.write_month,
+            month,
+            [dict(row) for row in rows],
+            [(int(pid), snapshot_date) for pid, snapshot_date in snapshots],
+        )
+        await db.execute(
+            delete(PortfolioSnapshotHolding).where(PortfolioSnapshotHolding.portfolio_snapshot_id.in_(pending))
+        )
+        flagged = await db.execute(
+            update(PortfolioSnapshot)
+            .where(PortfolioSnapshot.id.in_(pending))
+            .values(holdings_archived=True)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+        result.snapshots_archived += flagged.rowcount
+        result.holdings_archived += written
+        logger.info(
+            "Archived %s holdings of %s snapshots for %s",
+            written,
+            flagged.rowcount,
+            f"{month:%Y-%m}",
+        )
+    return result
+
+
+def retention_cutoff(today: date, retention_days: Optional[int] = None) -> date:
+    """First date whose holdings stay in SQL under the retention policy."""
+
+    days = settings.snapshot_holdings_retention_days if retention_days is None else retention_days
+    return today - timedelta(days=days)
+
+
+snapshot_archive = SnapshotArchive(settings.snapshot_archive_dir, settings.snapshot_archive_buckets)
@@ -0,0 +1,122 @@
+# snapshot_cache.py
+"""
+Response cache for snapshot history and comparison reads.
+
+Dashboards ask for the same history range and comparison on every load,
+but a snapshot only changes while its day is still open (or when a
+backfill writes it). Each entry records the window of snapshot dates its
+response was built from and is dropped when a snapshot inside that window
+is committed by this process.
+
+Invalidation is per process, so every entry also expires: windows that
+reach today after ``SNAPSHOT_CACHE_LIVE_TTL_SECONDS``, windows that end
+before today after the longer ``SNAPSHOT_CACHE_TTL_SECONDS``. Writes made
+elsewhere (another worker, a CLI backfill or ``--resume``, a rollup
+rebuild) are therefore seen within one TTL.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from .config import settings
+from .market_cache import CacheStats
+
+
+@dataclass
+class _Entry:
+    portfolio_id: int
+    window: Tuple[date, date]
+    expires_at: float
+    value: Any
+
+
+class SnapshotResponseCache:
+    """LRU of snapshot responses, invalidated by portfolio and snapshot date."""
+
+    def __init__(
+        self,
+        *,
+        max_entries: int,
+        ttl_seconds: float,
+        live_ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max(int(max_entries), 1)
+        self.ttl_seconds = float(ttl_seconds)
+        self.live_ttl_seconds = float(live_ttl_seconds)
+        self.stats = CacheStats()
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[int, Hashable], _Entry]" = OrderedDict()
+        # Bumped on every invalidation so a read that started before a write
+        # does not store the response it built from the old rows.
+        self._generations: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(
+        self,
+        portfolio_id: int,
+        key: Hashable,
+        window: Tuple[date, date],
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Return the cached response for ``key`` or build it with ``compute``.
+
+        ``window`` is the inclusive range of snapshot dates the response
+        depends on. ``None`` results are returned but not cached.
+        """
+
+        cache_key = (portfolio_id, key)
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            if entry.expires_at > self._clock():
+                self._entries.move_to_end(cache_key)
+                self.stats.hits += 1
+                return entry.value
+            del self._entries[cache_key]
+
+        self.stats.misses += 1
+        generation = self._generations.get(portfolio_id, 0)
+        value = await compute()
+        if value is None or self._generations.get(portfolio_id, 0) != generation:
+            return value
+
+        today = datetime.now(timezone.utc).date()
+        ttl_seconds = self.ttl_seconds if window[1] < today else self.live_ttl_seconds
+        if ttl_seconds <= 0:
+            return value
+        self._entries[cache_key] = _Entry(portfolio_id, window, self._clock() + ttl_seconds, value)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+        return value
+
+    def invalidate(self, portfolio_id: int, snapshot_date: date) -> None:
+        """Drop responses of ``portfolio_id`` whose window contains ``snapshot_date``."""
+
+        self._generations[portfolio_id] = self._generations.get(portfolio_id, 0) + 1
+        stale = [
+            cache_key
+            for cache_key, entry in self._entries.items()
+            if entry.portfolio_id == portfolio_id and entry.window[0] <= snapshot_date <= entry.window[1]
+        ]
+        for cache_key in stale:
+            del self._entries[cache_key]
+
+    def clear(self) -> None:
+        """Drop every entry and reset counters."""
+
+        self._entries.clear()
+        self._generations.clear()
+        self.stats = CacheStats()
+
+
+snapshot_response_cache = SnapshotResponseCache(
+    max_entries=settings.snapshot_cache_max_entries,
+    ttl_seconds=settings.snapshot_cache_ttl_seconds,
+    live_ttl_seconds=settings.snapshot_cache_live_ttl_seconds,
+)
@@ -3,18 +3,31 @@ import asyncio
 import logging
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta, timezone
-from typing import Optional
+from typing import Mapping, Optional, Sequence
 
-from sqlalchemy import select
+import numpy as np
+from sqlalchemy import Select, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .config import settings
 from .database import async_session_factory
-from .models import Portfolio, PortfolioSnapshot
-from .portfolio_snapshots import capture_portfolio_snapshot
+from .models import Asset, Portfolio, PortfolioSnapshot, SnapshotBackfillCheckpoint, SnapshotBackfillRun
+from .portfolio_snapshots import capture_portfolio_snapshot, resolve_asset_prices, write_portfolio_snapshot
+from .price_store import closes_as_of, is_valid_symbol, price_store
+from .scheduler_lease import LeaderLease
+from .snapshot_archive import compact_snapshot_holdings, retention_cutoff
+from .snapshot_cache import snapshot_response_cache
+from .snapshot_rollups import rebuild_snapshot_rollups
+from .valuation import value_holdings
 
 logger = logging.getLogger(__name__)
 
+BACKFILL_STATUS_RUNNING = "running"
+BACKFILL_STATUS_COMPLETED = "completed"
+BACKFILL_STATUS_FAILED = "failed"
+# Finished, but some portfolios failed; --resume retries them.
+BACKFILL_STATUS_INCOMPLETE = "incomplete"
+
 
 @dataclass
 class SnapshotJobResult:
@@ -27,44 +40,171 @@ class SnapshotJobResult:
     failures: int = 0
 
 
+@dataclass(frozen=True)
+class SnapshotShard:
+    """Deterministic slice of the portfolios: those with ``id % count == index``."""
+
+    index: int = 0
+    count: int = 1
+
+    def __post_init__(self):
+        if self.count < 1 or not 0 <= self.index < self.count:
+            raise ValueError(f"Invalid shard {self.index}/{self.count}")
+
+    @classmethod
+    def parse(cls, raw_value: str) -> "SnapshotShard":
+        """Parse a 1-based ``k/n`` value such as ``2/4``."""
+
+        try:
+            shard_number, shard_count = (int(part) for part in raw_value.split("/"))
+        except ValueError:
+            raise ValueError(f"Invalid shard '{raw_value}'; expected k/n such as 1/4")
+        if shard_count < 1 or not 1 <= shard_number <= shard_count:
+            raise ValueError(f"Invalid shard '{raw_value}'; k must be between 1 and n")
+        return cls(index=shard_number - 1, count=shard_count)
+
+    def split(self, parts: int) -> list["SnapshotShard"]:
+        """Divide this shard into ``parts`` disjoint shards that cover it exactly."""
+
+        parts = max(parts, 1)
+        return [
+            SnapshotShard(index=self.index + self.count * part, count=self.count * parts)
+            for part in range(parts)
+        ]
+
+    def apply(self, query: Select, portfolio_id_column) -> Select:
+        """Restrict ``query`` to the portfolios in this shard."""
+
+        if self.count == 1:
+            return query
+        return query.where(portfolio_id_column % self.count == self.index)
+
+
+ALL_PORTFOLIOS = SnapshotShard()
+
+
+def combine_job_results(
+    snapshot_date: date,
+    results: Sequence[SnapshotJobResult],
+) -> SnapshotJobResult:
+    """Add up the results of the workers that shared one date."""
+
+    return SnapshotJobResult(
+        snapshot_date=snapshot_date,
+        portfolios_seen=sum(result.portfolios_seen for result in results),
+        snapshots_created=sum(result.snapshots_created for result in results),
+        snapshots_skipped=sum(result.snapshots_skipped for result in results),
+        failures=sum(result.failures for result in results),
+    )
+
+
+async def resolve_job_prices(
+    db: AsyncSession,
+    snapshot_date: date,
+    shard: SnapshotShard = ALL_PORTFOLIOS,
+) -> dict[int, float]:
+    """Price every asset of the portfolios still missing a snapshot.
+
+    The assets are loaded in one query and handed to the valuation engine
+    together, so each distinct symbol is quoted once per run no matter how
+    many portfolios hold it. Live quotes are committed to AssetPriceHistory
+    before any portfolio is captured.
+    """
+
+    has_snapshot = (
+        select(PortfolioSnapshot.id)
+        .where(PortfolioSnapshot.portfolio_id == Asset.portfolio_id)
+        .where(PortfolioSnapshot.snapshot_date == snapshot_date)
+        .exists()
+    )
+    assets = (
+        await db.execute(shard.apply(select(Asset).where(~has_snapshot), Asset.portfolio_id))
+    ).scalars().all()
+    if not assets:
+        return {}
+
+    prices = await resolve_asset_prices(
+        db,
+        assets,
+        datetime.now(timezone.utc),
+        deadline_seconds=settings.snapshot_job_price_deadline_seconds,
+    )
+    await db.commit()
+    logger.info(
+        "Daily snapshot job priced %s assets across %s symbols for %s",
+        len(assets),
+        len({str(asset.symbol).upper() for asset in assets}),
+        snapshot_date,
+    )
+    return prices
+
+
 async def capture_missing_snapshots_for_date(
     db: AsyncSession,
     snapshot_date: date,
+    *,
+    shard: SnapshotShard = ALL_PORTFOLIOS,
+    asset_prices: Optional[Mapping[int, float]] = None,
 ) -> SnapshotJobResult:
-    """Capture the snapshot for every portfolio that does not already have one."""
+    """Capture the snapshot for every portfolio in ``shard`` that does not already have one.
+
+    ``asset_prices`` is the map from ``resolve_job_prices`` when the caller
+    already priced the run; otherwise the assets of this shard are priced here.
+    """
 
     result = SnapshotJobResult(snapshot_date=snapshot_date)
     portfolios = (
-        await db.execute(select(Portfolio).order_by(Portfolio.id.asc()))
-    ).scalars().all()
+        await db.execute(
+            shard.apply(
+                select(Portfolio.id, Portfolio.owner_id).order_by(Portfolio.id.asc()),
+                Portfolio.id,
+            )
+        )
+    ).all()
     result.portfolios_seen = len(portfolios)
 
-    for portfolio in portfolios:
-        existing_snapshot = (
+    existing_portfolio_ids = set(
+        (
             await db.execute(
-                select(PortfolioSnapshot.id)
-                .where(PortfolioSnapshot.portfolio_id == portfolio.id)
-                .where(PortfolioSnapshot.snapshot_date == snapshot_date)
-                .limit(1)
+                shard.apply(
+                    select(PortfolioSnapshot.portfolio_id).where(
+                        PortfolioSnapshot.snapshot_date == snapshot_date
+                    ),
+                    PortfolioSnapshot.portfolio_id,
+                )
             )
-        ).scalar_one_or_none()
-
-        if existing_snapshot is not None:
-            result.snapshots_skipped += 1
+        ).scalars().all()
+    )
+    result.snapshots_skipped = sum(
+        1 for portfolio_id, _ in portfolios if portfolio_id in existing_portfolio_ids
+    )
+    if asset_prices is None:
+        asset_prices = {}
+        if result.snapshots_skipped < len(portfolios):
+            try:
+                asset_prices = await resolve_job_prices(db, snapshot_date, shard)
+            except Exception as exc:
+                # Each portfolio prices its own assets when the shared map is unavailable.
+                await db.rollback()
+                logger.exception("Daily snapshot job could not pre-price assets for %s: %s", snapshot_date, exc)
+
+    for portfolio_id, owner_id in portfolios:
+        if portfolio_id in existing_portfolio_ids:
             continue
 
         try:
             snapshot = await capture_portfolio_snapshot(
                 db,
-                int(portfolio.id),
-                int(portfolio.owner_id),
+                int(portfolio_id),
+                int(owner_id),
                 snapshot_date=snapshot_date,
+                asset_prices=asset_prices,
             )
             if snapshot is None:
                 result.failures += 1
                 logger.warning(
                     "Daily snapshot job skipped portfolio %s because it could not be loaded",
-                    portfolio.id,
+                    portfolio_id,
                 )
                 continue
 
@@ -74,14 +214,16 @@ async def capture_missing_snapshots_for_date(
             result.failures += 1
             logger.exception(
                 "Daily snapshot job failed for portfolio %s on %s: %s",
-                portfolio.id,
+                portfolio_id,
                 snapshot_date,
                 exc,
             )
 
     logger.info(
-        "Daily snapshot job finished for %s: seen=%s created=%s skipped=%s failures=%s",
+        "Daily snapshot job finished for %s (shard %s/%s): seen=%s created=%s skipped=%s failures=%s",
         snapshot_date,
+        shard.index + 1,
+        shard.count,
         result.portfolios_seen,
         result.snapshots_created,
         result.snapshots_skipped,
@@ -90,46 +232,417 @@ async def capture_missing_snapshots_for_date(
     return result
 
 
-async def run_snapshot_job_for_date(snapshot_date: date) -> SnapshotJobResult:
-    """Run the daily capture job in its own database session."""
+async def run_snapshot_job_for_date(
+    snapshot_date: date,
+    *,
+    shard: SnapshotShard = ALL_PORTFOLIOS,
+    workers: Optional[int] = None,
+) -> SnapshotJobResult:
+    """Run the daily capture job for ``shard`` with concurrent workers.
 
+    The shard's assets are priced once up front; the shard is then split
+    into ``workers`` disjoint sub-shards, each captured in its own database
+    session.
+    """
+
+    worker_count = max(settings.snapshot_job_workers if workers is None else workers, 1)
+    if worker_count == 1:
+        async with async_session_factory() as db:
+            return await capture_missing_snapshots_for_date(db, snapshot_date, shard=shard)
+
+    asset_prices: Optional[dict[int, float]] = None
     async with async_session_factory() as db:
-        return await capture_missing_snapshots_for_date(db, snapshot_date)
+        try:
+            asset_prices = await resolve_job_prices(db, snapshot_date, shard)
+        except Exception as exc:
+            # Workers price their own sub-shards when the shared map is unavailable.
+            await db.rollback()
+            logger.exception("Daily snapshot job could not pre-price assets for %s: %s", snapshot_date, exc)
+
+    async def _run_worker(worker_shard: SnapshotShard) -> SnapshotJobResult:
+        async with async_session_factory() as worker_db:
+            return await capture_missing_snapshots_for_date(
+                worker_db,
+                snapshot_date,
+                shard=worker_shard,
+                asset_prices=asset_prices,
+            )
+
+    results = await asyncio.gather(*(_run_worker(worker_shard) for worker_shard in shard.split(worker_count)))
+    return combine_job_results(snapshot_date, results)
+
+
+async def find_missing_snapshot_pairs(
+    db: AsyncSession,
+    days: Sequence[date],
+    shard: SnapshotShard = ALL_PORTFOLIOS,
+) -> dict[date, list[int]]:
+    """Return, per date, the portfolios in ``shard`` that have no snapshot yet.
+
+    Two queries cover the whole range (the shard's portfolio ids and the
+    snapshots already stored between the first and last date) instead of an
+    existence check per (portfolio, date) pair.
+    """
+
+    if not days:
+        return {}
+
+    portfolio_ids = (
+        await db.execute(shard.apply(select(Portfolio.id).order_by(Portfolio.id.asc()), Portfolio.id))
+    ).scalars().all()
+    existing: dict[date, set[int]] = {}
+    stored = await db.execute(
+        shard.apply(
+            select(PortfolioSnapshot.snapshot_date, PortfolioSnapshot.portfolio_id)
+            .where(PortfolioSnapshot.snapshot_date >= min(days))
+            .where(PortfolioSnapshot.snapshot_date <= max(days)),
+            PortfolioSnapshot.portfolio_id,
+        )
+    )
+    for snapshot_date, portfolio_id in stored.all():
+        existing.setdefault(snapshot_date, set()).add(int(portfolio_id))
+
+    return {
+        day: [int(portfolio_id) for portfolio_id in portfolio_ids if portfolio_id not in existing.get(day, ())]
+        for day in days
+    }
+
+
+async def _checkpointed_dates(db: AsyncSession, run_id: int, shard: SnapshotShard) -> set[date]:
+    return set(
+        (
+            await db.execute(
+                select(SnapshotBackfillCheckpoint.snapshot_date)
+                .where(SnapshotBackfillCheckpoint.run_id == run_id)
+                .where(SnapshotBackfillCheckpoint.shard_index == shard.index)
+                .where(SnapshotBackfillCheckpoint.shard_count == shard.count)
+                .where(SnapshotBackfillCheckpoint.failures == 0)
+            )
+        ).scalars().all()
+    )
+
+
+async def _record_checkpoint(
+    db: AsyncSession,
+    run_id: int,
+    shard: SnapshotShard,
+    result: SnapshotJobResult,
+) -> None:
+    db.add(
+        SnapshotBackfillCheckpoint(
+            run_id=run_id,
+            shard_index=shard.index,
+            shard_count=shard.count,
+            snapshot_date=result.snapshot_date,
+            snapshots_created=result.snapshots_created,
+            failures=result.failures,
+        )
+    )
+    await db.commit()
 
 
-async def capture_missing_snapshots_for_range(
+async def backfill_snapshots_from_history(
     db: AsyncSession,
     start_date: date,
     end_date: date,
+    *,
+    shard: SnapshotShard = ALL_PORTFOLIOS,
+    run_id: Optional[int] = None,
 ) -> list[SnapshotJobResult]:
-    """Backfill missing snapshots across an inclusive date range in one session."""
+    """Value past dates from stored daily closes instead of live quotes.
+
+    Each distinct symbol's history is refreshed once through the price
+    store, then every missing (portfolio, date) in the range is valued from
+    the close on or before that date. A holding only counts from its
+    purchase date, at its current quantity; symbols without history are
+    valued at their purchase price.
+
+    With ``run_id`` every date finished without failures is checkpointed
+    for this shard and dates already checkpointed by the run are skipped.
+    """
 
     if end_date < start_date:
         raise ValueError("end_date must be greater than or equal to start_date")
 
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    if run_id is not None:
+        done = await _checkpointed_dates(db, run_id, shard)
+        days = [day for day in days if day not in done]
+    if not days:
+        return []
+
+    portfolio_count = (
+        await db.execute(shard.apply(select(func.count(Portfolio.id)), Portfolio.id))
+    ).scalar_one()
+    missing = await find_missing_snapshot_pairs(db, days, shard)
+    pending_portfolio_ids = set().union(*missing.values())
+    assets = [
+        asset
+        for asset in (
+            await db.execute(
+                shard.apply(
+                    select(
+                        Asset.id,
+                        Asset.portfolio_id,
+                        Asset.symbol,
+                        Asset.quantity,
+                        Asset.purchase_price,
+                        Asset.purchase_date,
+                    ).order_by(Asset.portfolio_id.asc(), Asset.id.asc()),
+                    Asset.portfolio_id,
+                )
+            )
+        ).all()
+        if asset.portfolio_id in pending_portfolio_ids
+    ]
+
+    asset_symbols = [str(asset.symbol).upper() for asset in assets]
+    symbols = sorted({symbol for symbol in asset_symbols if is_valid_symbol(symbol)})
+    await price_store.ensure_fresh_many(symbols)
+    day_array = np.array(days, dtype="datetime64[D]")
+    closes = {symbol: closes_as_of(price_store.read(symbol), day_array) for symbol in symbols}
+    missing_symbols = sorted(
+        {symbol for symbol in asset_symbols if symbol not in closes or np.isnan(closes[symbol]).all()}
+    )
+    if missing_symbols:
+        logger.warning(
+            "Snapshot backfill has no stored history for %s; using purchase prices",
+            ", ".join(missing_symbols),
+        )
+
+    no_history = np.full(len(days), np.nan)
+    asset_closes = np.array([closes.get(symbol, no_history) for symbol in asset_symbols]).reshape(
+        len(assets), len(days)
+    )
+    quantities = np.array([asset.quantity for asset in assets], dtype=np.float64)
+    purchase_prices = np.array([asset.purchase_price for asset in assets], dtype=np.float64)
+    purchase_days = np.array([asset.purchase_date.date() for asset in assets], dtype="datetime64[D]")
+    asset_portfolio_ids = np.array([asset.portfolio_id for asset in assets], dtype=np.int64)
+    # Assets are ordered by portfolio, so each portfolio owns one contiguous slice.
+    group_ids, group_starts = np.unique(asset_portfolio_ids, return_index=True)
+    group_ends = np.append(group_starts[1:], len(assets))
+    bounds = {int(pid): (int(lo), int(hi)) for pid, lo, hi in zip(group_ids, group_starts, group_ends)}
+
     results: list[SnapshotJobResult] = []
-    current_date = start_date
-    while current_date <= end_date:
-        results.append(await capture_missing_snapshots_for_date(db, current_date))
-        current_date += timedelta(days=1)
+    for day_index, snapshot_date in enumerate(days):
+        result = SnapshotJobResult(
+            snapshot_date=snapshot_date,
+            portfolios_seen=portfolio_count,
+            snapshots_skipped=portfolio_count - len(missing[snapshot_date]),
+        )
+        held = purchase_days <= day_array[day_index]
+        day_closes = asset_closes[:, day_index]
+        prices = np.where(np.isnan(day_closes), purchase_prices, day_closes)
+        captured_at = datetime.now(timezone.utc)
+
+        for portfolio_id in missing[snapshot_date]:
+            lo, hi = bounds.get(portfolio_id, (0, 0))
+            rows = lo + np.flatnonzero(held[lo:hi])
+            try:
+                await write_portfolio_snapshot(
+                    db,
+                    portfolio_id,
+                    snapshot_date,
+                    captured_at,
+                    [assets[row] for row in rows],
+                    value_holdings(quantities[rows], purchase_prices[rows], prices[rows]),
+                )
+                await db.commit()
+                snapshot_response_cache.invalidate(portfolio_id, snapshot_date)
+                result.snapshots_created += 1
+            except Exception as exc:
+                await db.rollback()
+                result.failures += 1
+                logger.exception(
+                    "Snapshot backfill failed for portfolio %s on %s: %s",
+                    portfolio_id,
+                    snapshot_date,
+                    exc,
+                )
 
+        if run_id is not None and not result.failures:
+            await _record_checkpoint(db, run_id, shard, result)
+        results.append(result)
+
+    logger.info(
+        "Snapshot backfill finished for %s..%s (shard %s/%s): symbols=%s created=%s skipped=%s failures=%s",
+        start_date,
+        end_date,
+        shard.index + 1,
+        shard.count,
+        len(symbols),
+        sum(result.snapshots_created for result in results),
+        sum(result.snapshots_skipped for result in results),
+        sum(result.failures for result in results),
+    )
     return results
 
 
+async def find_resumable_backfill_run(db: AsyncSession) -> Optional[SnapshotBackfillRun]:
+    """Return the most recent backfill run that did not complete."""
+
+    result = await db.execute(
+        select(SnapshotBackfillRun)
+        .where(SnapshotBackfillRun.status != BACKFILL_STATUS_COMPLETED)
+        .order_by(SnapshotBackfillRun.id.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+
+async def _set_backfill_run_status(run_id: int, status: str) -> None:
+    async with async_session_factory() as db:
+        run = await db.get(SnapshotBackfillRun, run_id)
+        run.status = status
+        if status == BACKFILL_STATUS_COMPLETED:
+            run.completed_at = datetime.now(timezone.utc)
+        await db.commit()
+
+
 async def run_snapshot_backfill(
-    start_date: date,
-    end_date: date,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    *,
+    shard: SnapshotShard = ALL_PORTFOLIOS,
+    workers: Optional[int] = None,
+    resume_run_id: Optional[int] = None,
 ) -> list[SnapshotJobResult]:
-    """Backfill missing snapshots across an inclusive date range."""
+    """Backfill missing snapshots across an inclusive date range.
+
+    The run is recorded in ``snapshot_backfill_runs`` and each worker
+    checkpoints every date it finishes without failures. A run where any
+    portfolio failed ends ``incomplete`` rather than ``completed``. Passing
+    ``resume_run_id`` continues that run with its original range, shard and
+    worker count, skipping the checkpointed dates, so only the failed
+    portfolios and unfinished dates are captured again.
+
+    Past dates are valued from stored closes by
+    ``backfill_snapshots_from_history``, one sub-shard per worker. Today
+    (UTC) and later are left to the live daily job.
+    """
 
     async with async_session_factory() as db:
-        return await capture_missing_snapshots_for_range(db, start_date, end_date)
+        if resume_run_id is None:
+            if start_date is None or end_date is None:
+                raise ValueError("start_date and end_date are required for a new backfill run")
+            if end_date < start_date:
+                raise ValueError("end_date must be greater than or equal to start_date")
+            run = SnapshotBackfillRun(
+                start_date=start_date,
+                end_date=end_date,
+                shard_index=shard.index,
+                shard_count=shard.count,
+                workers=max(settings.snapshot_job_workers if workers is None else workers, 1),
+                status=BACKFILL_STATUS_RUNNING,
+            )
+            db.add(run)
+        else:
+            run = await db.get(SnapshotBackfillRun, resume_run_id)
+            if run is None:
+                raise ValueError(f"Backfill run {resume_run_id} does not exist")
+            run.status = BACKFILL_STATUS_RUNNING
+        await db.commit()
+
+        run_id = int(run.id)
+        start_date = run.start_date
+        end_date = run.end_date
+        shard = SnapshotShard(index=run.shard_index, count=run.shard_count)
+        worker_count = int(run.workers)
+        logger.info(
+            "%s snapshot backfill run %s for %s..%s (shard %s/%s, %s workers)",
+            "Resuming" if resume_run_id is not None else "Starting",
+            run_id,
+            start_date,
+            end_date,
+            shard.index + 1,
+            shard.count,
+            worker_count,
+        )
 
+    try:
+        today = datetime.now(timezone.utc).date()
+        results: list[SnapshotJobResult] = []
+        history_end = min(end_date, today - timedelta(days=1))
+        if start_date <= history_end:
+
+            async def _run_worker(worker_shard: SnapshotShard) -> list[SnapshotJobResult]:
+                async with async_session_factory() as worker_db:
+                    return await backfill_snapshots_from_history(
+                        worker_db,
+                        start_date,
+                        history_end,
+                        shard=worker_shard,
+                        run_id=run_id,
+                    )
+
+            worker_results = await asyncio.gather(
+                *(_run_worker(worker_shard) for worker_shard in shard.split(worker_count))
+            )
+            results_by_date: dict[date, list[SnapshotJobResult]] = {}
+            for results_for_worker in worker_results:
+                for day_result in results_for_worker:
+                    results_by_date.setdefault(day_result.snapshot_date, []).append(day_result)
+            results.extend(
+                combine_job_results(snapshot_date, day_results)
+                for snapshot_date, day_results in sorted(results_by_date.items())
+            )
+
+        if end_date >= today:
+            async with async_session_factory() as db:
+                already_done = today in await _checkpointed_dates(db, run_id, shard)
+            if not already_done:
+                live_result = await run_snapshot_job_for_date(today, shard=shard, workers=worker_count)
+                if not live_result.failures:
+                    async with async_session_factory() as db:
+                        await _record_checkpoint(db, run_id, shard, live_result)
+                results.append(live_result)
+    except Exception:
+        await _set_backfill_run_status(run_id, BACKFILL_STATUS_FAILED)
+        raise
+
+    failures = sum(result.failures for result in results)
+    if failures:
+        logger.warning(
+            "Snapshot backfill run %s finished with %s failures; resume it with --resume %s",
+            run_id,
+            failures,
+            run_id,
+        )
+        await _set_backfill_run_status(run_id, BACKFILL_STATUS_INCOMPLETE)
+    else:
+        await _set_backfill_run_status(run_id, BACKFILL_STATUS_COMPLETED)
+    return results
+
+
+def _scheduler_backoff_seconds(failures: int) -> float:
+    """Poll interval doubled per consecutive failure, capped at an hour."""
+
+    base = max(settings.snapshot_scheduler_poll_seconds, 30)
+    return float(min(base * 2 ** min(failures - 1, 16), max(base, 3600)))
 
-async def run_daily_snapshot_scheduler(stop_event: asyncio.Event) -> None:
-    """Run a lightweight scheduler loop for a single dedicated process."""
 
+async def run_daily_snapshot_scheduler(
+    stop_event: asyncio.Event,
+    *,
+    shard: SnapshotShard = ALL_PORTFOLIOS,
+    workers: Optional[int] = None,
+    lease: Optional[LeaderLease] = None,
+) -> None:
+    """Run the scheduler loop; safe to start in every worker process.
+
+    Each scheduled capture runs under a lease named after the shard, so only
+    the worker holding it captures. The others see the completed run key and
+    skip the date, or take over on a later poll if the leader dies and its
+    lease expires. Errors in an iteration are logged and retried with
+    backoff instead of stopping the loop.
+    """
+
+    lease = lease or LeaderLease(
+        f"snapshot-daily:{shard.index + 1}/{shard.count}",
+        ttl_seconds=settings.snapshot_scheduler_lease_seconds,
+    )
     last_attempted_date: Optional[date] = None
+    failures = 0
 
     while not stop_event.is_set():
         now = datetime.now(timezone.utc)
@@ -142,22 +655,46 @@ async def run_daily_snapshot_scheduler(stop_event: asyncio.Event) -> None:
         should_run = (
             now >= target_today and last_attempted_date != now.date()
         )
+        delay = max(settings.snapshot_scheduler_poll_seconds, 30)
 
         if should_run:
-            logger.info(
-                "Running scheduled daily snapshot capture for %s at %s UTC",
-                now.date(),
-                now.isoformat(),
-            )
-            await run_snapshot_job_for_date(now.date())
-            last_attempted_date = now.date()
-            continue
+            run_key = now.date().isoformat()
+            try:
+                if await lease.last_completed_key() == run_key:
+                    last_attempted_date = now.date()
+                    failures = 0
+                    continue
+
+                ran = await lease.run_exclusive(
+                    lambda: run_snapshot_job_for_date(now.date(), shard=shard, workers=workers),
+                    completion_key=run_key,
+                )
+            except Exception as exc:
+                # A database outage or a failed run must not end the loop;
+                # the date stays due and is retried after the backoff.
+                failures += 1
+                delay = _scheduler_backoff_seconds(failures)
+                logger.exception(
+                    "Daily snapshot scheduler failed for %s (attempt %s), retrying in %.0fs: %s",
+                    now.date(),
+                    failures,
+                    delay,
+                    exc,
+                )
+            else:
+                failures = 0
+                if ran:
+                    logger.info(
+                        "Scheduled daily snapshot capture for %s finished as lease holder %s",
+                        now.date(),
+                        lease.holder,
+                    )
+                    last_attempted_date = now.date()
+                    continue
+                logger.debug("Daily snapshot capture for %s is held by another worker", now.date())
 
         try:
-            await asyncio.wait_for(
-                stop_event.wait(),
-                timeout=max(settings.snapshot_scheduler_poll_seconds, 30),
-            )
+            await asyncio.wait_for(stop_event.wait(), timeout=delay)
         except TimeoutError:
             continue
 
@@ -167,7 +704,10 @@ def _parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--date",
         dest="snapshot_date",
-        help="Capture missing snapshots for a single YYYY-MM-DD date. Defaults to today (UTC).",
+        help=(
+            "Capture missing snapshots for a single YYYY-MM-DD date. Defaults to today (UTC); "
+            "past dates are valued from stored closes."
+        ),
     )
     parser.add_argument(
         "--backfill-start",
@@ -184,6 +724,37 @@ def _parse_args() -> argparse.Namespace:
         action="store_true",
         help="Run the lightweight scheduler loop for a dedicated process.",
     )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="latest",
+        default=None,
+        help="Resume a backfill run by id, or the most recent unfinished run when no id is given.",
+    )
+    parser.add_argument(
+        "--rebuild-rollups",
+        dest="rebuild_rollups",
+        action="store_true",
+        help="Recompute the weekly and monthly snapshot rollups from the daily rows.",
+    )
+    parser.add_argument(
+        "--compact-holdings",
+        dest="compact_holdings",
+        action="store_true",
+        help="Move holdings older than SNAPSHOT_HOLDINGS_RETENTION_DAYS into the columnar archive.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=SnapshotShard.parse,
+        default=ALL_PORTFOLIOS,
+        help="Only process shard k of n (1-based, e.g. 2/4): portfolios whose id %% n == k - 1.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Concurrent workers within this process. Defaults to SNAPSHOT_JOB_WORKERS.",
+    )
     return parser.parse_args()
 
 
@@ -197,26 +768,51 @@ async def _run_from_args(args: argparse.Namespace) -> None:
     if args.daemon:
         stop_event = asyncio.Event()
         try:
-            await run_daily_snapshot_scheduler(stop_event)
+            await run_daily_snapshot_scheduler(stop_event, shard=args.shard, workers=args.workers)
         except asyncio.CancelledError:
             logger.info("Daily snapshot scheduler cancelled")
             raise
         return
 
+    if args.compact_holdings:
+        async with async_session_factory() as db:
+            await compact_snapshot_holdings(db, retention_cutoff(datetime.now(timezone.utc).date()))
+        return
+
+    if args.rebuild_rollups:
+        async with async_session_factory() as db:
+            await rebuild_snapshot_rollups(db)
+        return
+
+    if args.resume:
+        if args.resume == "latest":
+            async with async_session_factory() as db:
+                run = await find_resumable_backfill_run(db)
+            if run is None:
+                logger.info("No unfinished snapshot backfill run to resume")
+                return
+            resume_run_id = int(run.id)
+        else:
+            resume_run_id = int(args.resume)
+        await run_snapshot_backfill(resume_run_id=resume_run_id)
+        return
+
     if args.backfill_start:
         start_date = _parse_date_arg(args.backfill_start)
         end_date = _parse_date_arg(
             args.backfill_end,
             datetime.now(timezone.utc).date(),
         )
-        await run_snapshot_backfill(start_date, end_date)
+        await run_snapshot_backfill(start_date, end_date, shard=args.shard, workers=args.workers)
         return
 
-    snapshot_date = _parse_date_arg(
-        args.snapshot_date,
-        datetime.now(timezone.utc).date(),
-    )
-    await run_snapshot_job_for_date(snapshot_date)
+    today = datetime.now(timezone.utc).date()
+    snapshot_date = _parse_date_arg(args.snapshot_date, today)
+    if snapshot_date < today:
+        # Live quotes would value a past day at today's prices.
+        await run_snapshot_backfill(snapshot_date, snapshot_date, shard=args.shard, workers=args.workers)
+        return
+    await run_snapshot_job_for_date(snapshot_date, shard=args.shard, workers=args.workers)
 
 
 def main() -> None:
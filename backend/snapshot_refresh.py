@@ -0,0 +1,132 @@
+# snapshot_refresh.py
+"""
+Debounced background refresh of today's snapshot after asset writes.
+
+Creating, updating or deleting an asset changes today's snapshot, but
+recapturing it means live quotes for every holding and a rewrite of its
+holdings. Doing that inside each request made a bulk edit of N assets pay
+for N full captures. Instead the request enqueues the portfolio and
+returns. One task per portfolio waits ``SNAPSHOT_REFRESH_DEBOUNCE_SECONDS``
+so that further writes in the window fold into the same refresh, then
+refreshes once in its own session. A write that lands while a refresh is
+running schedules exactly one more.
+
+Writes that name the asset they touched are applied incrementally with
+``update_portfolio_snapshot_assets`` (only those assets are re-priced and
+rewritten); a write without an asset id forces a full capture.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+from .config import settings
+from .database import async_session_factory
+from .portfolio_snapshots import capture_portfolio_snapshot, update_portfolio_snapshot_assets
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingRefresh:
+    owner_id: int
+    # Changed asset ids, or None when the whole snapshot must be recaptured.
+    asset_ids: Optional[Set[int]]
+
+
+class SnapshotRefreshQueue:
+    """Coalesces snapshot refreshes per portfolio and runs them in the background."""
+
+    def __init__(self, *, debounce_seconds: float, session_factory=async_session_factory):
+        self.debounce_seconds = float(debounce_seconds)
+        self.session_factory = session_factory
+        self._pending: Dict[int, PendingRefresh] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._flush: Optional[asyncio.Event] = None
+
+    def _flush_event(self) -> asyncio.Event:
+        if self._flush is None:
+            self._flush = asyncio.Event()
+        return self._flush
+
+    def enqueue(self, portfolio_id: int, owner_id: int, asset_id: Optional[int] = None) -> None:
+        """Request a refresh of ``portfolio_id`` after a write to ``asset_id``; never blocks."""
+
+        pending = self._pending.get(portfolio_id)
+        if pending is None:
+            pending = self._pending[portfolio_id] = PendingRefresh(owner_id, set())
+        pending.owner_id = owner_id
+        if asset_id is None:
+            pending.asset_ids = None
+        elif pending.asset_ids is not None:
+            pending.asset_ids.add(int(asset_id))
+        if portfolio_id not in self._tasks:
+            self._tasks[portfolio_id] = asyncio.ensure_future(self._run(portfolio_id))
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def _wait_debounce(self) -> None:
+        try:
+            await asyncio.wait_for(self._flush_event().wait(), timeout=self.debounce_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, portfolio_id: int) -> None:
+        try:
+            while portfolio_id in self._pending:
+                await self._wait_debounce()
+                await self._refresh(portfolio_id, self._pending.pop(portfolio_id))
+        finally:
+            self._tasks.pop(portfolio_id, None)
+
+    async def _refresh(self, portfolio_id: int, pending: PendingRefresh) -> None:
+        async with self.session_factory() as db:
+            try:
+                if pending.asset_ids is None:
+                    snapshot = await capture_portfolio_snapshot(db, portfolio_id, pending.owner_id)
+                    as_of = snapshot.as_of if snapshot is not None else None
+                else:
+                    as_of = await update_portfolio_snapshot_assets(
+                        db, portfolio_id, pending.owner_id, pending.asset_ids
+                    )
+                if as_of is not None:
+                    logger.info(
+                        "Refreshed portfolio snapshot for portfolio %s as of %s",
+                        portfolio_id,
+                        as_of,
+                    )
+            except Exception as exc:
+                await db.rollback()
+                logger.warning(
+                    "Portfolio snapshot refresh failed for portfolio %s after asset mutation: %s",
+                    portfolio_id,
+                    exc,
+                )
+
+    async def drain(self) -> None:
+        """Run every pending refresh now, without waiting out the debounce."""
+
+        flush = self._flush_event()
+        flush.set()
+        try:
+            while self._tasks:
+                await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+        finally:
+            flush.clear()
+
+    async def close(self, *, flush: bool = True) -> None:
+        """Stop the queue, running pending refreshes first unless ``flush`` is False."""
+
+        if flush:
+            await self.drain()
+            return
+        self._pending.clear()
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+snapshot_refresh_queue = SnapshotRefreshQueue(debounce_seconds=settings.snapshot_refresh_debounce_seconds)
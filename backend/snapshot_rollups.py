@@ -0,0 +1,207 @@
+# snapshot_rollups.py
+"""
+Weekly and monthly rollups of daily portfolio snapshots.
+
+Each rollup row holds the OHLC of portfolio value over one calendar week
+(Monday start) or month, plus cost and P&L at the period's last snapshot.
+Writing a daily snapshot refreshes the week and month containing it by
+re-aggregating that period's daily rows, so same-day re-captures and
+out-of-order backfills stay correct. Long-range history reads these rows
+instead of every daily snapshot.
+"""
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import dialect_insert
+from .models import PortfolioSnapshot, PortfolioSnapshotRollup
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION_DAY = "day"
+RESOLUTION_WEEK = "week"
+RESOLUTION_MONTH = "month"
+ROLLUP_RESOLUTIONS = (RESOLUTION_WEEK, RESOLUTION_MONTH)
+
+# Longest range (in days) served at each resolution when the caller asks for "auto".
+DAILY_MAX_DAYS = 366
+WEEKLY_MAX_DAYS = 3 * 366
+
+_ROLLUP_FIELDS = (
+    "period_end",
+    "open_value",
+    "high_value",
+    "low_value",
+    "close_value",
+    "close_cost",
+    "close_profit_loss",
+    "close_profit_loss_percent",
+    "snapshot_count",
+)
+_REBUILD_BATCH_SIZE = 1000
+
+
+def pick_resolution(days: int) -> str:
+    """Choose the coarsest resolution that still gives a useful chart for ``days``."""
+
+    if days <= DAILY_MAX_DAYS:
+        return RESOLUTION_DAY
+    if days <= WEEKLY_MAX_DAYS:
+        return RESOLUTION_WEEK
+    return RESOLUTION_MONTH
+
+
+def period_start(day: date, resolution: str) -> date:
+    if resolution == RESOLUTION_WEEK:
+        return day - timedelta(days=day.weekday())
+    if resolution == RESOLUTION_MONTH:
+        return day.replace(day=1)
+    raise ValueError(f"Unknown rollup resolution: {resolution}")
+
+
+def _period_last_day(day: date, resolution: str) -> date:
+    if resolution == RESOLUTION_WEEK:
+        return period_start(day, resolution) + timedelta(days=6)
+    next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def _aggregate(rows: Sequence[Any]) -> Dict[str, Any]:
+    """OHLC and closing figures for date-ordered daily snapshot rows."""
+
+    values = [float(row.total_value) for row in rows]
+    last = rows[-1]
+    return {
+        "period_end": last.snapshot_date,
+        "open_value": values[0],
+        "high_value": max(values),
+        "low_value": min(values),
+        "close_value": values[-1],
+        "close_cost": float(last.total_cost),
+        "close_profit_loss": float(last.total_profit_loss),
+        "close_profit_loss_percent": float(last.total_profit_loss_percent),
+        "snapshot_count": len(rows),
+    }
+
+
+def _daily_rows_query(portfolio_id: Optional[int] = None):
+    query = select(
+        PortfolioSnapshot.portfolio_id,
+        PortfolioSnapshot.snapshot_date,
+        PortfolioSnapshot.total_value,
+        PortfolioSnapshot.total_cost,
+        PortfolioSnapshot.total_profit_loss,
+        PortfolioSnapshot.total_profit_loss_percent,
+    ).order_by(PortfolioSnapshot.portfolio_id.asc(), PortfolioSnapshot.snapshot_date.asc())
+    if portfolio_id is not None:
+        query = query.where(PortfolioSnapshot.portfolio_id == portfolio_id)
+    return query
+
+
+async def refresh_snapshot_rollups(db: AsyncSession, portfolio_id: int, snapshot_date: date) -> None:
+    """Re-aggregate the week and month containing ``snapshot_date``; does not commit."""
+
+    periods = [
+        (resolution, period_start(snapshot_date, resolution), _period_last_day(snapshot_date, resolution))
+        for resolution in ROLLUP_RESOLUTIONS
+    ]
+    rows = (
+        await db.execute(
+            _daily_rows_query(portfolio_id)
+            .where(PortfolioSnapshot.snapshot_date >= min(start for _, start, _ in periods))
+            .where(PortfolioSnapshot.snapshot_date <= max(end for _, _, end in periods))
+        )
+    ).all()
+
+    rollups = []
+    for resolution, start, end in periods:
+        period_rows = [row for row in rows if start <= row.snapshot_date <= end]
+        if period_rows:
+            rollups.append(
+                {
+                    "portfolio_id": portfolio_id,
+                    "resolution": resolution,
+                    "period_start": start,
+                    **_aggregate(period_rows),
+                }
+            )
+    if not rollups:
+        return
+
+    upsert = dialect_insert(db)(PortfolioSnapshotRollup).values(rollups)
+    await db.execute(
+        upsert.on_conflict_do_update(
+            index_elements=[
+                PortfolioSnapshotRollup.portfolio_id,
+                PortfolioSnapshotRollup.resolution,
+                PortfolioSnapshotRollup.period_start,
+            ],
+            set_={field: upsert.excluded[field] for field in _ROLLUP_FIELDS},
+        )
+    )
+
+
+async def rebuild_snapshot_rollups(db: AsyncSession, portfolio_id: Optional[int] = None) -> int:
+    """Recompute every rollup (for one portfolio or all) from the daily rows.
+
+    Used once after the rollup table is introduced, or to repair it. Returns
+    the number of rollup rows written.
+    """
+
+    delete_query = delete(PortfolioSnapshotRollup)
+    if portfolio_id is not None:
+        delete_query = delete_query.where(PortfolioSnapshotRollup.portfolio_id == portfolio_id)
+    await db.execute(delete_query)
+
+    # Daily rows are streamed; only the (much smaller) rollup rows are kept in memory.
+    rollups: List[Dict[str, Any]] = []
+    groups: Dict[tuple, List[Any]] = {}
+    current_portfolio_id = None
+    async for row in await db.stream(_daily_rows_query(portfolio_id)):
+        if row.portfolio_id != current_portfolio_id:
+            rollups.extend(_group_rollups(groups))
+            groups = {}
+            current_portfolio_id = row.portfolio_id
+        for resolution in ROLLUP_RESOLUTIONS:
+            groups.setdefault(
+                (row.portfolio_id, resolution, period_start(row.snapshot_date, resolution)), []
+            ).append(row)
+    rollups.extend(_group_rollups(groups))
+
+    for start in range(0, len(rollups), _REBUILD_BATCH_SIZE):
+        await db.execute(insert(PortfolioSnapshotRollup), rollups[start:start + _REBUILD_BATCH_SIZE])
+    await db.commit()
+    written = len(rollups)
+
+    logger.info("Rebuilt %s snapshot rollup rows", written)
+    return written
+
+
+def _group_rollups(groups: Dict[tuple, List[Any]]) -> List[Dict[str, Any]]:
+    return [
+        {"portfolio_id": portfolio_id, "resolution": resolution, "period_start": start, **_aggregate(rows)}
+        for (portfolio_id, resolution, start), rows in groups.items()
+    ]
+
+
+async def get_snapshot_rollups(
+    db: AsyncSession,
+    portfolio_id: int,
+    resolution: str,
+    from_date: date,
+    to_date: date,
+) -> List[PortfolioSnapshotRollup]:
+    """Rollups whose period overlaps ``from_date``..``to_date``, oldest first."""
+
+    result = await db.execute(
+        select(PortfolioSnapshotRollup)
+        .where(PortfolioSnapshotRollup.portfolio_id == portfolio_id)
+        .where(PortfolioSnapshotRollup.resolution == resolution)
+        .where(PortfolioSnapshotRollup.period_start >= period_start(from_date, resolution))
+        .where(PortfolioSnapshotRollup.period_start <= to_date)
+        .order_by(PortfolioSnapshotRollup.period_start.asc())
+    )
+    return list(result.scalars().all())
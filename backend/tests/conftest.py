@@ -5,10 +5,15 @@ Uses an in-memory SQLite database so tests run without a running PostgreSQL
 instance. All tests that hit the database should use the ``test_client`` or
 ``auth_client`` fixtures defined here.
 """
+import os
+
 import pytest
 import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
+# Keep shared caches in-process during tests (must be set before importing backend).
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
 from backend.models import Base
 from backend.database import get_db_dependency
 from backend import main
@@ -62,6 +67,55 @@ async def test_db(test_engine):
         yield session
 
 
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch, tmp_path):
+    """
+    Start every test with empty caches and market-data caching disabled.
+
+    The local price store is pointed at a per-test directory for the same
+    reason.
+
+    Tests mock yfinance with different prices for the same symbol, so a
+    cached quote would leak between (and within) tests. Cache behaviour is
+    covered directly in ``test_market_cache_new.py`` and
+    ``test_cache_backends_new.py``.
+    """
+    from backend.cache_backends import InMemoryCacheBackend, set_cache_backend
+    from backend.indicators import indicator_cache
+    from backend.market_data import market_data
+    from backend.price_store import price_store
+    from backend.snapshot_cache import snapshot_response_cache
+
+    monkeypatch.setattr(price_store, "root", str(tmp_path / "price_store"))
+    set_cache_backend(InMemoryCacheBackend())
+    for cache in (market_data.quote_cache, market_data.history_cache, indicator_cache):
+        cache.clear()
+        monkeypatch.setattr(cache, "ttl_seconds", 0)
+    snapshot_response_cache.clear()
+    yield
+    set_cache_backend(None)
+
+
+@pytest.fixture(autouse=True)
+async def snapshot_refresh_queue(monkeypatch, test_engine):
+    """
+    Background snapshot refreshes against the test database, run only on drain.
+
+    The debounce is long so asset writes never refresh in the middle of a
+    test; tests that check the refreshed snapshot call ``drain()``.
+    Anything still pending is dropped at teardown.
+    """
+    from backend.snapshot_refresh import SnapshotRefreshQueue
+
+    queue = SnapshotRefreshQueue(
+        debounce_seconds=3600,
+        session_factory=async_sessionmaker(test_engine, expire_on_commit=False, class_=AsyncSession),
+    )
+    monkeypatch.setattr(main, "snapshot_refresh_queue", queue)
+    yield queue
+    await queue.close(flush=False)
+
+
 # ---------------------------------------------------------------------------
 # App / HTTP client fixtures
 # ---------------------------------------------------------------------------
@@ -0,0 +1,86 @@
+"""
+Tests for the pluggable shared cache backends.
+
+The Redis backend runs against the in-process ``FakeRedis`` stand-in, so no
+server is required.
+"""
+import time
+
+import pytest
+
+from backend.cache_backends import (
+    FakeRedis,
+    InMemoryCacheBackend,
+    RedisCacheBackend,
+    SQLiteCacheBackend,
+)
+from backend.market_cache import MarketDataCache
+
+
+@pytest.fixture(params=["memory", "redis", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryCacheBackend()
+    if request.param == "redis":
+        return RedisCacheBackend(FakeRedis())
+    return SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"))
+
+
+@pytest.mark.asyncio
+async def test_round_trips_json_values(backend):
+    await backend.set_many({"fx:USD": {"base": "USD", "rates": {"EUR": 0.92}}, "quote:AAPL": 150.5})
+
+    values = await backend.get_many(["fx:USD", "quote:AAPL", "quote:MISSING"])
+
+    assert values == {"fx:USD": {"base": "USD", "rates": {"EUR": 0.92}}, "quote:AAPL": 150.5}
+    assert await backend.get("quote:MISSING") is None
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_after_ttl(backend, monkeypatch):
+    await backend.set("quote:AAPL", 150.0, ttl_seconds=10)
+    assert await backend.get("quote:AAPL") == 150.0
+
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + 11)
+
+    assert await backend.get("quote:AAPL") is None
+
+
+@pytest.mark.asyncio
+async def test_delete_and_clear_by_prefix(backend):
+    await backend.set_many({"quote:AAPL": 1.0, "quote:MSFT": 2.0, "fx:USD": {"base": "USD"}})
+
+    await backend.delete(["quote:AAPL"])
+    assert await backend.get_many(["quote:AAPL", "quote:MSFT"]) == {"quote:MSFT": 2.0}
+
+    await backend.clear("quote:")
+    assert await backend.get_many(["quote:MSFT", "fx:USD"]) == {"fx:USD": {"base": "USD"}}
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    await SQLiteCacheBackend(path).set("quote:AAPL", 150.0, ttl_seconds=60)
+
+    # A second instance stands in for another worker process (or a restart).
+    assert await SQLiteCacheBackend(path).get("quote:AAPL") == 150.0
+
+
+@pytest.mark.asyncio
+async def test_market_data_caches_share_values_through_backend():
+    shared = RedisCacheBackend(FakeRedis())
+    worker_a = MarketDataCache(ttl_seconds=60, max_entries=10, namespace="quote:", shared_backend=lambda: shared)
+    worker_b = MarketDataCache(ttl_seconds=60, max_entries=10, namespace="quote:", shared_backend=lambda: shared)
+    calls = []
+
+    async def fetch_many(keys):
+        calls.append(list(keys))
+        return {key: 101.0 for key in keys}
+
+    assert await worker_a.get_many(["AAPL"], fetch_many) == {"AAPL": 101.0}
+    assert await worker_b.get_many(["AAPL", "MSFT"], fetch_many) == {"AAPL": 101.0, "MSFT": 101.0}
+
+    assert calls == [["AAPL"], ["MSFT"]]
+    assert worker_b.stats.shared_hits == 1
+    assert worker_b.stats.misses == 1
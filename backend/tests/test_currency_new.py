@@ -11,15 +11,10 @@ Covers:
 import pytest
 from unittest.mock import patch
 from fastapi.testclient import TestClient
-from backend.main import app, get_exchange_rates_from_api
+from backend.main import app
 
-
-# Ensure the lru_cache is cleared before each test to avoid cross-test contamination.
-@pytest.fixture(autouse=True)
-def clear_rate_cache():
-    get_exchange_rates_from_api.cache_clear()
-    yield
-    get_exchange_rates_from_api.cache_clear()
+# Cached rates live in the shared cache backend, which the conftest
+# ``fresh_caches`` fixture replaces before each test.
 
 
 _MOCK_RATES_USD = {
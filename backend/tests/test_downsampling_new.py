@@ -0,0 +1,109 @@
+"""
+Tests for LTTB chart downsampling and the ``max_points`` query parameter.
+"""
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.downsampling import lttb_indices
+from backend.main import app
+from backend.portfolio_snapshots import capture_portfolio_snapshot
+
+
+def test_returns_everything_when_series_fits():
+    assert lttb_indices(range(5), [1, 2, 3, 4, 5], 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_keeps_endpoints_count_and_order():
+    x = np.arange(10_000)
+    y = np.sin(x / 300.0)
+    keep = lttb_indices(x, y, 200)
+
+    assert len(keep) == 200
+    assert keep[0] == 0 and keep[-1] == len(x) - 1
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_preserves_isolated_spike():
+    y = np.zeros(1_000)
+    y[437] = 50.0
+    y[803] = -40.0
+    keep = lttb_indices(np.arange(1_000), y, 20)
+
+    assert 437 in keep
+    assert 803 in keep
+
+
+def test_stock_history_max_points():
+    mock_ticker = MagicMock()
+    periods = 500
+    mock_ticker.history.return_value = pd.DataFrame(
+        {
+            "Open": np.linspace(100, 200, periods),
+            "High": np.linspace(101, 201, periods),
+            "Low": np.linspace(99, 199, periods),
+            "Close": np.linspace(100, 200, periods),
+            "Volume": [1_000_000] * periods,
+        },
+        index=pd.date_range("2023-01-01", periods=periods, freq="D"),
+    )
+    with patch("yfinance.Ticker", return_value=mock_ticker):
+        client = TestClient(app)
+        resp = client.get("/stocks/AAPL/history?period=max&max_points=50")
+
+    assert resp.status_code == 200, resp.text
+    history = resp.json()["history"]
+    assert len(history) == 50
+    assert history[0]["date"] == "2023-01-01"
+    assert history[-1]["date"] == "2024-05-14"
+
+
+def test_stock_history_rejects_too_few_points():
+    client = TestClient(app)
+    resp = client.get("/stocks/AAPL/history?max_points=2")
+    assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_snapshot_history_max_points(auth_client, test_db):
+    resp = await auth_client.post("/portfolios", json={"name": "Downsampled Portfolio"})
+    assert resp.status_code == 200, resp.text
+    pid, owner_id = resp.json()["id"], resp.json()["owner_id"]
+
+    mock_ticker = MagicMock()
+    with patch("yfinance.Ticker", return_value=mock_ticker):
+        mock_ticker.history.return_value = pd.DataFrame(
+            {"Close": [100.0]}, index=[pd.Timestamp("2024-01-01")]
+        )
+        asset_resp = await auth_client.post(
+            f"/portfolios/{pid}/assets",
+            json={
+                "symbol": "AAPL",
+                "quantity": 1.0,
+                "purchase_price": 90.0,
+                "purchase_date": "2024-01-01T00:00:00Z",
+            },
+        )
+        assert asset_resp.status_code == 200, asset_resp.text
+
+        today = datetime.now(timezone.utc).date()
+        for offset in range(20):
+            mock_ticker.history.return_value = pd.DataFrame(
+                {"Close": [100.0 + offset]}, index=[pd.Timestamp("2024-01-01")]
+            )
+            await capture_portfolio_snapshot(
+                test_db, pid, owner_id, snapshot_date=today - timedelta(days=19 - offset)
+            )
+
+    full = await auth_client.get(f"/portfolios/{pid}/snapshots?days=30")
+    sampled = await auth_client.get(f"/portfolios/{pid}/snapshots?days=30&max_points=5")
+
+    assert len(full.json()["points"]) == 20
+    points = sampled.json()["points"]
+    assert len(points) == 5
+    assert points[0]["as_of"] == full.json()["points"][0]["as_of"]
+    assert points[-1]["as_of"] == full.json()["points"][-1]["as_of"]
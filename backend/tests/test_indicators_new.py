@@ -0,0 +1,108 @@
+"""
+Tests for technical indicators and GET /stocks/{symbol}/indicators.
+
+yfinance is mocked so these tests run offline.
+"""
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.indicators import IndicatorSpec, compute_indicators, indicator_cache, parse_indicator_specs
+from backend.main import app
+
+
+def _history_ticker(periods=120):
+    close = 100 + 10 * np.sin(np.arange(periods) / 7.0)
+    mock_ticker = MagicMock()
+    mock_ticker.history.return_value = pd.DataFrame(
+        {"Open": close, "High": close + 1, "Low": close - 1, "Close": close, "Volume": [1_000] * periods},
+        index=pd.date_range("2024-01-01", periods=periods, freq="D"),
+    )
+    return mock_ticker
+
+
+def test_parse_fills_defaults_and_normalises():
+    specs = parse_indicator_specs(" RSI, sma:5 ,bbands,sma:5")
+
+    assert specs == [
+        IndicatorSpec("bbands", (20, 2)),
+        IndicatorSpec("rsi", (14,)),
+        IndicatorSpec("sma", (5,)),
+    ]
+
+
+@pytest.mark.parametrize("spec", ["", "foo:3", "sma:x", "sma:0", "sma:1:2", "macd:26:12"])
+def test_parse_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        parse_indicator_specs(spec)
+
+
+def test_compute_indicators_matches_reference_values():
+    close = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 4.0])
+    results = compute_indicators(
+        close,
+        [IndicatorSpec("sma", (3,)), IndicatorSpec("rsi", (2,)), IndicatorSpec("bbands", (3, 2))],
+    )
+
+    assert np.isnan(results["sma_3"][:2]).all()
+    assert results["sma_3"][2:].tolist() == pytest.approx([2.0, 3.0, 4.0, 13 / 3])
+    # Only gains until the last bar.
+    assert results["rsi_2"][2:5].tolist() == pytest.approx([100.0, 100.0, 100.0])
+    assert results["rsi_2"][5] < 100.0
+    # A flat window has neither gains nor losses and is neutral.
+    flat = compute_indicators(np.full(5, 10.0), [IndicatorSpec("rsi", (2,))])
+    assert flat["rsi_2"][2:].tolist() == pytest.approx([50.0, 50.0, 50.0])
+    middle = results["bbands_3_2_middle"][2]
+    assert results["bbands_3_2_upper"][2] - middle == pytest.approx(2 * np.std([1.0, 2.0, 3.0]))
+
+
+def test_indicator_endpoint_returns_aligned_columns():
+    with patch("yfinance.Ticker", return_value=_history_ticker()):
+        client = TestClient(app)
+        resp = client.get("/stocks/aapl/indicators?period=1mo&indicators=sma:5,macd")
+
+    assert resp.status_code == 200, resp.text
+    data = resp.json()
+    assert data["symbol"] == "AAPL"
+    assert len(data["dates"]) == len(data["close"]) == 32
+    assert set(data["indicators"]) == {"sma_5", "macd_12_26_9", "macd_12_26_9_signal", "macd_12_26_9_hist"}
+    # Computed over the full history, so the period starts warmed up.
+    assert all(len(values) == 32 and values[0] is not None for values in data["indicators"].values())
+
+
+def test_indicator_endpoint_rejects_unknown_indicator():
+    client = TestClient(app)
+    resp = client.get("/stocks/AAPL/indicators?indicators=vwap")
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_indicator_results_are_cached(test_client, monkeypatch):
+    monkeypatch.setattr(indicator_cache, "ttl_seconds", 60)
+    ticker = _history_ticker()
+    with patch("yfinance.Ticker", return_value=ticker), \
+            patch("backend.indicators.compute_indicators", wraps=compute_indicators) as computed:
+        first = await test_client.get("/stocks/MSFT/indicators?indicators=ema:10,rsi")
+        second = await test_client.get("/stocks/MSFT/indicators?indicators=rsi:14,ema:10")
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert computed.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_empty_indicator_results_are_not_cached(test_client, monkeypatch):
+    monkeypatch.setattr(indicator_cache, "ttl_seconds", 60)
+    ticker = _history_ticker(periods=5)
+    with patch("yfinance.Ticker", return_value=ticker), \
+            patch("backend.indicators.compute_indicators", wraps=compute_indicators) as computed:
+        first = await test_client.get("/stocks/SHRT/indicators?indicators=sma:20")
+        second = await test_client.get("/stocks/SHRT/indicators?indicators=sma:20")
+
+    assert first.status_code == second.status_code == 200
+    assert all(value is None for value in first.json()["indicators"]["sma_20"])
+    assert computed.call_count == 2
+    assert len(indicator_cache) == 0
@@ -0,0 +1,114 @@
+"""
+Tests for the single-flight TTL cache that sits under market-data lookups.
+"""
+import asyncio
+
+import pytest
+
+from backend.market_cache import MarketDataCache
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_hits_within_ttl_and_refetches_after_expiry():
+    clock = _FakeClock()
+    cache = MarketDataCache(ttl_seconds=60, max_entries=10, clock=clock)
+    calls = []
+
+    async def fetch_many(keys):
+        calls.append(list(keys))
+        return {key: 100.0 for key in keys}
+
+    assert await cache.get_many(["AAPL"], fetch_many) == {"AAPL": 100.0}
+    assert await cache.get_many(["AAPL"], fetch_many) == {"AAPL": 100.0}
+    clock.now = 61.0
+    assert await cache.get_many(["AAPL"], fetch_many) == {"AAPL": 100.0}
+
+    assert calls == [["AAPL"], ["AAPL"]]
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_only_missing_keys_are_fetched():
+    cache = MarketDataCache(ttl_seconds=60, max_entries=10)
+    calls = []
+
+    async def fetch_many(keys):
+        calls.append(list(keys))
+        return {key: float(len(key)) for key in keys if key != "NODATA"}
+
+    await cache.get_many(["AAPL"], fetch_many)
+    result = await cache.get_many(["AAPL", "MSFT", "NODATA", "MSFT"], fetch_many)
+
+    assert calls == [["AAPL"], ["MSFT", "NODATA"]]
+    assert result == {"AAPL": 4.0, "MSFT": 4.0}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_coalesce_onto_one_fetch():
+    cache = MarketDataCache(ttl_seconds=60, max_entries=10)
+    release = asyncio.Event()
+    calls = 0
+
+    async def fetch_many(keys):
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {key: 42.0 for key in keys}
+
+    tasks = [asyncio.create_task(cache.get_many(["AAPL"], fetch_many)) for _ in range(20)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert calls == 1
+    assert all(result == {"AAPL": 42.0} for result in results)
+    assert cache.stats.misses == 1
+    assert cache.stats.coalesced == 19
+
+
+@pytest.mark.asyncio
+async def test_failed_fetch_is_not_cached_and_releases_waiters():
+    cache = MarketDataCache(ttl_seconds=60, max_entries=10)
+    release = asyncio.Event()
+
+    async def failing_fetch(keys):
+        await release.wait()
+        raise RuntimeError("upstream down")
+
+    owner = asyncio.create_task(cache.get_many(["AAPL"], failing_fetch))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(cache.get_many(["AAPL"], failing_fetch))
+    await asyncio.sleep(0)
+    release.set()
+
+    with pytest.raises(RuntimeError):
+        await owner
+    assert await waiter == {}
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_drops_least_recently_used():
+    cache = MarketDataCache(ttl_seconds=60, max_entries=2)
+
+    async def fetch_many(keys):
+        return {key: 1.0 for key in keys}
+
+    await cache.get_many(["A"], fetch_many)
+    await cache.get_many(["B"], fetch_many)
+    await cache.get_many(["A"], fetch_many)  # A becomes most recently used
+    await cache.get_many(["C"], fetch_many)
+
+    assert cache.stats.evictions == 1
+    hits_before = cache.stats.hits
+    await cache.get_many(["A", "C"], fetch_many)
+    assert cache.stats.hits == hits_before + 2
@@ -0,0 +1,112 @@
+"""
+Tests for the non-blocking market-data service.
+
+yfinance is mocked so these tests run offline.
+"""
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+
+from backend.market_data import MarketDataError, MarketDataService, MarketDataTimeout
+
+
+def _mock_yf_ticker(close=150.0, empty=False):
+    mock_ticker = MagicMock()
+    if empty:
+        mock_ticker.history.return_value = pd.DataFrame()
+    else:
+        mock_ticker.history.return_value = pd.DataFrame(
+            {
+                "Open": [close - 5],
+                "Close": [close],
+                "High": [close + 5],
+                "Low": [close - 10],
+                "Volume": [1000000],
+            },
+            index=[pd.Timestamp("2024-01-01")],
+        )
+    return mock_ticker
+
+
+@pytest.mark.asyncio
+async def test_get_latest_price_runs_on_pool():
+    service = MarketDataService(max_workers=2, timeout_seconds=5)
+    try:
+        with patch("yfinance.Ticker", return_value=_mock_yf_ticker(123.0)):
+            price = await service.get_latest_price("AAPL")
+    finally:
+        service.shutdown()
+
+    assert price == pytest.approx(123.0)
+
+
+@pytest.mark.asyncio
+async def test_get_latest_price_empty_history_raises():
+    service = MarketDataService(max_workers=1, timeout_seconds=5)
+    try:
+        with patch("yfinance.Ticker", return_value=_mock_yf_ticker(empty=True)):
+            with pytest.raises(MarketDataError):
+                await service.get_latest_price("FAKE")
+    finally:
+        service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_slow_call_times_out_without_blocking_event_loop():
+    service = MarketDataService(max_workers=1, timeout_seconds=0.1)
+    ticks = 0
+
+    async def _ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker_task = asyncio.create_task(_ticker())
+    try:
+        with pytest.raises(MarketDataTimeout):
+            await service.run(time.sleep, 0.5)
+    finally:
+        ticker_task.cancel()
+        service.shutdown()
+
+    # The event loop kept running other tasks while the blocking call waited.
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_get_latest_prices_batches_and_dedupes_symbols():
+    service = MarketDataService(max_workers=1, timeout_seconds=5)
+    columns = pd.MultiIndex.from_product([["Close", "Open"], ["AAPL", "MSFT", "NODATA"]])
+    frame = pd.DataFrame(
+        [
+            [150.0, 300.0, float("nan"), 149.0, 299.0, float("nan")],
+            [151.0, float("nan"), float("nan"), 150.0, 301.0, float("nan")],
+        ],
+        index=pd.date_range("2024-01-01", periods=2, freq="D"),
+        columns=columns,
+    )
+    try:
+        with patch("yfinance.download", return_value=frame) as mock_download:
+            prices = await service.get_latest_prices(["aapl", "AAPL", "MSFT", "NODATA"])
+    finally:
+        service.shutdown()
+
+    mock_download.assert_called_once()
+    assert list(mock_download.call_args.args[0]) == ["AAPL", "MSFT", "NODATA"]
+    assert prices == {"AAPL": pytest.approx(151.0), "MSFT": pytest.approx(300.0)}
+
+
+@pytest.mark.asyncio
+async def test_get_latest_prices_swallows_upstream_errors():
+    service = MarketDataService(max_workers=1, timeout_seconds=5)
+    try:
+        with patch("yfinance.download", side_effect=RuntimeError("boom")):
+            prices = await service.get_latest_prices(["AAPL", "MSFT"])
+    finally:
+        service.shutdown()
+
+    assert prices == {}
@@ -0,0 +1,68 @@
+"""
+Tests for GET /stocks/history (several symbols on one aligned date index).
+
+yfinance is mocked so these tests run offline.
+"""
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.price_store import price_store
+
+
+def _download_frame():
+    """A group_by="ticker" download where MSFT is missing one day and NODATA is empty."""
+
+    dates = pd.date_range("2024-01-01", periods=4, freq="D")
+    columns = pd.MultiIndex.from_product([["AAPL", "MSFT", "NODATA"], ["Open", "High", "Low", "Close", "Volume"]])
+    rows = []
+    for i in range(4):
+        aapl = [100.0 + i] * 4 + [1_000.0]
+        msft = [float("nan")] * 5 if i == 1 else [300.0 + i] * 4 + [2_000.0]
+        rows.append(aapl + msft + [float("nan")] * 5)
+    return pd.DataFrame(rows, index=dates, columns=columns)
+
+
+def test_multi_history_uses_one_download_and_aligns_dates():
+    with patch("yfinance.download", return_value=_download_frame()) as mock_download:
+        client = TestClient(app)
+        resp = client.get("/stocks/history?symbols=aapl,MSFT,NODATA,AAPL&period=max")
+
+    assert resp.status_code == 200, resp.text
+    mock_download.assert_called_once()
+    assert list(mock_download.call_args.args[0]) == ["AAPL", "MSFT", "NODATA"]
+
+    data = resp.json()
+    assert data["symbols"] == ["AAPL", "MSFT", "NODATA"]
+    assert data["dates"] == ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"]
+    assert data["values"]["AAPL"] == [100.0, 101.0, 102.0, 103.0]
+    assert data["values"]["MSFT"] == [300.0, None, 302.0, 303.0]
+    assert data["missing"] == ["NODATA"]
+
+
+def test_multi_history_refresh_fetches_only_the_tail(monkeypatch):
+    with patch("yfinance.download", return_value=_download_frame()):
+        TestClient(app).get("/stocks/history?symbols=AAPL,MSFT")
+
+    monkeypatch.setattr(price_store, "refresh_seconds", 0)
+    with patch("yfinance.download", return_value=_download_frame()) as mock_download:
+        resp = TestClient(app).get("/stocks/history?symbols=AAPL,MSFT&field=volume&period=5d")
+
+    assert mock_download.call_args.kwargs["start"] == "2024-01-04"
+    assert resp.json()["values"]["MSFT"] == [2_000.0, None, 2_000.0, 2_000.0]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "symbols=" + ",".join(f"S{i}" for i in range(21)),
+        "symbols=,,",
+        "symbols=AAPL&field=adjclose",
+    ],
+)
+def test_multi_history_rejects_invalid_requests(query):
+    resp = TestClient(app).get(f"/stocks/history?{query}")
+    assert resp.status_code in (400, 422)
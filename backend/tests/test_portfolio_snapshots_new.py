@@ -1,13 +1,25 @@
 """
 Tests for persisted portfolio snapshot endpoints and same-day refresh behavior.
 """
+import asyncio
 from datetime import date, datetime, timezone
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
 import pandas as pd
 import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from backend.portfolio_snapshots import capture_portfolio_snapshot
+from backend.models import Asset, Base, Portfolio, PortfolioSnapshot, PortfolioSnapshotHolding, User
+
+from backend.portfolio_snapshots import (
+    capture_portfolio_snapshot,
+    get_portfolio_snapshot_comparison,
+    update_portfolio_snapshot_assets,
+    write_portfolio_snapshot,
+)
+from backend.valuation import value_holdings
 
 
 async def _create_portfolio(auth_client, name="Snapshot Test Portfolio"):
@@ -65,12 +77,13 @@ async def test_capture_portfolio_snapshot_endpoint(auth_client):
 
 
 @pytest.mark.asyncio
-async def test_list_portfolio_snapshots_returns_persisted_history(auth_client):
+async def test_list_portfolio_snapshots_returns_persisted_history(auth_client, snapshot_refresh_queue):
     portfolio = await _create_portfolio(auth_client, "Snapshot History Portfolio")
     pid = portfolio["id"]
 
     with patch("yfinance.Ticker", return_value=_mock_yf_ticker(150.0)):
         create_resp = await auth_client.post(f"/portfolios/{pid}/assets", json=_ASSET_PAYLOAD)
+        await snapshot_refresh_queue.drain()
 
     assert create_resp.status_code == 200, create_resp.text
 
@@ -83,7 +96,7 @@ async def test_list_portfolio_snapshots_returns_persisted_history(auth_client):
 
 
 @pytest.mark.asyncio
-async def test_snapshot_upserts_same_day_after_asset_update(auth_client):
+async def test_snapshot_upserts_same_day_after_asset_update(auth_client, snapshot_refresh_queue):
     portfolio = await _create_portfolio(auth_client, "Snapshot Update Portfolio")
     pid = portfolio["id"]
     today = datetime.now(timezone.utc).date().isoformat()
@@ -98,6 +111,9 @@ async def test_snapshot_upserts_same_day_after_asset_update(auth_client):
             f"/portfolios/{pid}/assets/{asset_id}",
             json={"quantity": 20.0},
         )
+        # The create and the update coalesce into one refresh.
+        assert snapshot_refresh_queue.pending == 1
+        await snapshot_refresh_queue.drain()
     assert update_resp.status_code == 200, update_resp.text
 
     detail_resp = await auth_client.get(f"/portfolios/{pid}/snapshots/{today}")
@@ -115,7 +131,7 @@ async def test_snapshot_upserts_same_day_after_asset_update(auth_client):
 
 
 @pytest.mark.asyncio
-async def test_snapshot_refreshes_to_zero_after_asset_delete(auth_client):
+async def test_snapshot_refreshes_to_zero_after_asset_delete(auth_client, snapshot_refresh_queue):
     portfolio = await _create_portfolio(auth_client, "Snapshot Delete Portfolio")
     pid = portfolio["id"]
     today = datetime.now(timezone.utc).date().isoformat()
@@ -127,6 +143,7 @@ async def test_snapshot_refreshes_to_zero_after_asset_delete(auth_client):
 
     delete_resp = await auth_client.delete(f"/portfolios/{pid}/assets/{asset_id}")
     assert delete_resp.status_code == 204, delete_resp.text
+    await snapshot_refresh_queue.drain()
 
     detail_resp = await auth_client.get(f"/portfolios/{pid}/snapshots/{today}")
     assert detail_resp.status_code == 200, detail_resp.text
@@ -186,3 +203,203 @@ async def test_compare_portfolio_snapshots_returns_summary_and_holding_deltas(
     assert data["holdings"][0]["symbol"] == "AAPL"
     assert data["holdings"][0]["status"] == "changed"
     assert data["holdings"][0]["value_change"] == pytest.approx(1700.0)
+
+
+@pytest.mark.asyncio
+async def test_capture_writes_with_constant_statement_count(auth_client, test_db, test_engine):
+    portfolio = await _create_portfolio(auth_client, "Bulk Snapshot Portfolio")
+    pid = portfolio["id"]
+    owner_id = (await auth_client.get(f"/portfolios/{pid}")).json()["owner_id"]
+    asset_ids = []
+    with patch("yfinance.Ticker", return_value=_mock_yf_ticker(150.0)):
+        for symbol in ("AAPL", "MSFT", "NVDA"):
+            resp = await auth_client.post(f"/portfolios/{pid}/assets", json={**_ASSET_PAYLOAD, "symbol": symbol})
+            assert resp.status_code == 200, resp.text
+            asset_ids.append(resp.json()["id"])
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        for price in (200.0, 210.0):
+            snapshot = await capture_portfolio_snapshot(
+                test_db,
+                pid,
+                owner_id,
+                snapshot_date=date(2026, 5, 1),
+                asset_prices={asset_id: price for asset_id in asset_ids},
+            )
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", _record)
+
+    # Load portfolio + assets, upsert snapshot, read the week/month and upsert
+    # its rollups, delete holdings, insert holdings.
+    assert len(statements) == 14
+    assert snapshot.summary.total_value == pytest.approx(3 * 10 * 210.0)
+    assert [holding.price for holding in snapshot.holdings] == [210.0, 210.0, 210.0]
+
+    detail = (await auth_client.get(f"/portfolios/{pid}/snapshots/2026-05-01")).json()
+    assert detail["summary"]["total_value"] == pytest.approx(6300.0)
+    assert len(detail["holdings"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_incremental_update_reprices_only_changed_asset(auth_client, test_db):
+    portfolio = await _create_portfolio(auth_client, "Incremental Snapshot Portfolio")
+    pid = portfolio["id"]
+    owner_id = (await auth_client.get(f"/portfolios/{pid}")).json()["owner_id"]
+    today = datetime.now(timezone.utc).date().isoformat()
+    asset_ids = []
+    with patch("yfinance.Ticker", return_value=_mock_yf_ticker(100.0)):
+        for symbol in ("AAPL", "MSFT"):
+            resp = await auth_client.post(f"/portfolios/{pid}/assets", json={**_ASSET_PAYLOAD, "symbol": symbol})
+            assert resp.status_code == 200, resp.text
+            asset_ids.append(resp.json()["id"])
+    await capture_portfolio_snapshot(
+        test_db, pid, owner_id, asset_prices={asset_id: 100.0 for asset_id in asset_ids}
+    )
+
+    with patch("yfinance.Ticker", return_value=_mock_yf_ticker(200.0)) as ticker:
+        as_of = await update_portfolio_snapshot_assets(test_db, pid, owner_id, [asset_ids[0]])
+    assert as_of.isoformat() == today
+    assert [call.args[0] for call in ticker.call_args_list] == ["AAPL"]
+
+    detail = (await auth_client.get(f"/portfolios/{pid}/snapshots/{today}")).json()
+    assert detail["summary"]["total_value"] == pytest.approx(3000.0)
+    assert detail["summary"]["total_cost"] == pytest.approx(2900.0)
+    assert len(detail["holdings"]) == 2
+    holdings = {holding["symbol"]: holding for holding in detail["holdings"]}
+    assert holdings["AAPL"]["price"] == pytest.approx(200.0)
+    assert holdings["MSFT"]["price"] == pytest.approx(100.0)
+    assert holdings["AAPL"]["allocation_percent"] == pytest.approx(200 / 3)
+    assert holdings["MSFT"]["allocation_percent"] == pytest.approx(100 / 3)
+
+
+_SNAPSHOT_ASSET_IDS = {"AAPL": 910001, "MSFT": 910002, "NVDA": 910003}
+
+
+async def _write_snapshot(db, portfolio_id, snapshot_date, holdings):
+    assets = [SimpleNamespace(id=_SNAPSHOT_ASSET_IDS[symbol], symbol=symbol) for symbol in holdings]
+    await write_portfolio_snapshot(
+        db,
+        portfolio_id,
+        snapshot_date,
+        datetime.now(timezone.utc),
+        assets,
+        value_holdings(
+            [quantity for quantity, _ in holdings.values()],
+            [100.0] * len(holdings),
+            [price for _, price in holdings.values()],
+        ),
+    )
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_comparison_is_one_statement_with_added_and_removed_holdings(auth_client, test_db, test_engine):
+    portfolio = await _create_portfolio(auth_client, "Single Query Compare Portfolio")
+    pid, owner_id = portfolio["id"], portfolio["owner_id"]
+    await _write_snapshot(test_db, pid, date(2025, 6, 1), {"AAPL": (10.0, 100.0), "MSFT": (5.0, 200.0)})
+    await _write_snapshot(test_db, pid, date(2025, 6, 2), {"AAPL": (10.0, 100.0), "MSFT": (5.0, 210.0)})
+    await _write_snapshot(test_db, pid, date(2025, 6, 3), {"AAPL": (10.0, 110.0), "NVDA": (2.0, 500.0)})
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        comparison = await get_portfolio_snapshot_comparison(test_db, pid, owner_id)
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", _record)
+
+    # Ownership check, then the comparison itself.
+    assert len(statements) == 2
+    assert (comparison.current_as_of, comparison.previous_as_of) == (date(2025, 6, 3), date(2025, 6, 2))
+    assert comparison.summary.value_change == pytest.approx(2100.0 - 2050.0)
+    deltas = {holding.symbol: holding for holding in comparison.holdings}
+    assert [holding.symbol for holding in comparison.holdings] == ["MSFT", "NVDA", "AAPL"]
+    assert deltas["NVDA"].status == "added"
+    assert deltas["NVDA"].previous_value == 0.0
+    assert deltas["MSFT"].status == "removed"
+    assert deltas["MSFT"].value_change == pytest.approx(-1050.0)
+    assert deltas["AAPL"].status == "changed"
+    assert deltas["AAPL"].price_change == pytest.approx(10.0)
+
+    explicit = await get_portfolio_snapshot_comparison(
+        test_db, pid, owner_id, current_date=date(2025, 6, 2), previous_date=date(2025, 6, 1)
+    )
+    # AAPL's value is flat but its allocation moved with MSFT's price.
+    assert [(holding.symbol, holding.status) for holding in explicit.holdings] == [
+        ("MSFT", "changed"),
+        ("AAPL", "changed"),
+    ]
+    assert explicit.holdings[1].value_change == pytest.approx(0.0)
+    assert await get_portfolio_snapshot_comparison(test_db, pid, owner_id, current_date=date(2025, 6, 5)) is None
+    assert (
+        await get_portfolio_snapshot_comparison(
+            test_db, pid, owner_id, current_date=date(2025, 6, 3), previous_date=date(2025, 5, 31)
+        )
+        is None
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_incremental_updates_keep_totals_consistent(tmp_path):
+    # A file-backed database so each update runs on its own connection.
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'snapshots.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    today = datetime.now(timezone.utc).date()
+
+    async with session_factory() as db:
+        user = User(username="race", email="race@example.com", hashed_password="x")
+        portfolio = Portfolio(name="Race Portfolio", owner=user)
+        purchased = datetime(2024, 1, 1)
+        assets = [
+            Asset(symbol=symbol, quantity=10.0, purchase_price=100.0, purchase_date=purchased, portfolio=portfolio)
+            for symbol in ("AAPL", "MSFT")
+        ]
+        db.add_all([user, portfolio, *assets])
+        await db.flush()
+        pid, owner_id, asset_ids = portfolio.id, user.id, [asset.id for asset in assets]
+        await write_portfolio_snapshot(
+            db, pid, today, datetime.now(timezone.utc), assets, value_holdings([10.0] * 2, [100.0] * 2, [100.0] * 2)
+        )
+        for asset in assets:
+            asset.quantity = 20.0
+        await db.commit()
+
+    async def slow_prices(db, assets, captured_at):
+        # Both updates read the snapshot before either writes.
+        await asyncio.sleep(0.05)
+        return {int(asset.id): 150.0 for asset in assets}
+
+    async def _update(asset_id):
+        async with session_factory() as db:
+            return await update_portfolio_snapshot_assets(db, pid, owner_id, [asset_id])
+
+    with patch("backend.portfolio_snapshots.resolve_asset_prices", slow_prices):
+        assert await asyncio.gather(*(_update(asset_id) for asset_id in asset_ids)) == [today, today]
+
+    async with session_factory() as db:
+        snapshot = (
+            await db.execute(select(PortfolioSnapshot).where(PortfolioSnapshot.portfolio_id == pid))
+        ).scalar_one()
+        holdings = (
+            await db.execute(
+                select(PortfolioSnapshotHolding).where(PortfolioSnapshotHolding.portfolio_snapshot_id == snapshot.id)
+            )
+        ).scalars().all()
+    await engine.dispose()
+
+    assert snapshot.total_value == pytest.approx(sum(holding.current_value for holding in holdings))
+    assert snapshot.total_value == pytest.approx(6000.0)
+    assert snapshot.total_cost == pytest.approx(4000.0)
+    assert snapshot.asset_count == 2
+    assert [holding.allocation_percent for holding in holdings] == pytest.approx([50.0, 50.0])
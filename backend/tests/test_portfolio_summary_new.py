@@ -0,0 +1,108 @@
+"""
+Tests for GET /portfolios/summary (net worth across all of a user's portfolios).
+
+yfinance is mocked so these tests run offline.
+"""
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+
+async def _login_new_user(test_client, name):
+    email = f"{name}@test.example"
+    password = "SummaryPass1!"
+    resp = await test_client.post(
+        "/auth/register",
+        json={"username": name, "email": email, "password": password},
+    )
+    assert resp.status_code == 200, resp.text
+    token_resp = await test_client.post(
+        "/auth/token",
+        data={"username": email, "password": password},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    return {"Authorization": f"Bearer {token_resp.json()['access_token']}"}
+
+
+def _download_frame(closes):
+    columns = pd.MultiIndex.from_product([["Close"], list(closes)])
+    return pd.DataFrame(
+        [list(closes.values())],
+        index=[pd.Timestamp("2024-01-02")],
+        columns=columns,
+    )
+
+
+async def _add_asset(test_client, headers, pid, symbol, quantity, purchase_price):
+    resp = await test_client.post(
+        f"/portfolios/{pid}/assets",
+        headers=headers,
+        json={
+            "symbol": symbol,
+            "quantity": quantity,
+            "purchase_price": purchase_price,
+            "purchase_date": "2024-01-01T00:00:00Z",
+        },
+    )
+    assert resp.status_code == 200, resp.text
+
+
+@pytest.mark.asyncio
+async def test_summary_prices_symbol_union_once(test_client):
+    headers = await _login_new_user(test_client, "summary_user")
+    growth = (await test_client.post("/portfolios", headers=headers, json={"name": "Growth"})).json()
+    income = (await test_client.post("/portfolios", headers=headers, json={"name": "Income"})).json()
+    empty = (await test_client.post("/portfolios", headers=headers, json={"name": "Empty"})).json()
+
+    with patch("yfinance.download", side_effect=RuntimeError("offline")), \
+            patch("yfinance.Ticker", side_effect=RuntimeError("offline")):
+        await _add_asset(test_client, headers, growth["id"], "AAPL", 10, 100.0)
+        await _add_asset(test_client, headers, growth["id"], "MSFT", 2, 300.0)
+        await _add_asset(test_client, headers, income["id"], "AAPL", 5, 120.0)
+
+    with patch("yfinance.download", return_value=_download_frame({"AAPL": 150.0, "MSFT": 250.0})) as download:
+        resp = await test_client.get("/portfolios/summary", headers=headers)
+
+    assert resp.status_code == 200, resp.text
+    download.assert_called_once()
+    assert sorted(download.call_args.args[0]) == ["AAPL", "MSFT"]
+
+    data = resp.json()
+    by_name = {portfolio["name"]: portfolio for portfolio in data["portfolios"]}
+    assert by_name["Growth"]["total_value"] == pytest.approx(2000.0)
+    assert by_name["Growth"]["total_cost"] == pytest.approx(1600.0)
+    assert by_name["Growth"]["asset_count"] == 2
+    assert by_name["Income"]["total_value"] == pytest.approx(750.0)
+    assert by_name["Income"]["total_profit_loss_percent"] == pytest.approx(25.0)
+    assert by_name["Empty"] == {
+        "portfolio_id": empty["id"],
+        "name": "Empty",
+        "asset_count": 0,
+        "total_value": 0.0,
+        "total_cost": 0.0,
+        "total_profit_loss": 0.0,
+        "total_profit_loss_percent": 0.0,
+        "allocation_percent": 0.0,
+        "estimated_asset_count": 0,
+    }
+    assert by_name["Growth"]["allocation_percent"] == pytest.approx(2000 / 27.5)
+    assert data["summary"]["total_value"] == pytest.approx(2750.0)
+    assert data["summary"]["total_cost"] == pytest.approx(2200.0)
+
+
+@pytest.mark.asyncio
+async def test_summary_without_portfolios(test_client):
+    headers = await _login_new_user(test_client, "summary_empty_user")
+
+    resp = await test_client.get("/portfolios/summary", headers=headers)
+
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["portfolios"] == []
+    assert resp.json()["summary"]["total_value"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_summary_requires_auth(test_client):
+    resp = await test_client.get("/portfolios/summary")
+    assert resp.status_code == 401
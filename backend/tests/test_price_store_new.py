@@ -0,0 +1,170 @@
+"""
+Tests for the local OHLCV price store.
+
+yfinance is mocked so these tests run offline.
+"""
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.market_data import MarketDataService
+from backend.price_store import BAR_DTYPE, PriceStore, bars_to_records, frame_to_bars, slice_period
+from backend.responses import FastJSONResponse
+
+
+def _history_frame(start, periods, close=100.0, tz=None):
+    dates = pd.date_range(start, periods=periods, freq="D", tz=tz)
+    return pd.DataFrame(
+        {
+            "Open": [close + i - 1 for i in range(periods)],
+            "High": [close + i + 2 for i in range(periods)],
+            "Low": [close + i - 2 for i in range(periods)],
+            "Close": [close + i for i in range(periods)],
+            "Volume": [1_000_000] * periods,
+        },
+        index=dates,
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    service = MarketDataService(max_workers=1, timeout_seconds=5)
+    yield PriceStore(str(tmp_path), refresh_seconds=0, market=service)
+    service.shutdown()
+
+
+def test_frame_to_bars_keeps_local_trading_date():
+    frame = _history_frame("2024-01-02", 2, tz="Asia/Tokyo")
+    bars = frame_to_bars(frame)
+
+    assert bars.dtype == BAR_DTYPE
+    dates = [str(pd.Timestamp(int(ts)).date()) for ts in bars["timestamp"]]
+    assert dates == ["2024-01-02", "2024-01-03"]
+
+
+def test_slice_period_is_relative_to_last_bar():
+    bars = frame_to_bars(_history_frame("2023-01-01", 400))
+
+    assert len(slice_period(bars, "5d")) == 5
+    assert len(slice_period(bars, "max")) == 400
+    one_month = slice_period(bars, "1mo")
+    assert str(pd.Timestamp(int(one_month["timestamp"][0])).date()) == "2024-01-04"
+    ytd = slice_period(bars, "ytd")
+    assert str(pd.Timestamp(int(ytd["timestamp"][0])).date()) == "2024-01-01"
+
+
+@pytest.mark.asyncio
+async def test_first_fill_fetches_max_then_only_the_tail(store):
+    ticker = MagicMock()
+    ticker.history.return_value = _history_frame("2024-01-01", 5)
+    with patch("yfinance.Ticker", return_value=ticker):
+        bars = await store.get_bars("AAPL", "max")
+    assert ticker.history.call_args.kwargs == {"period": "max"}
+    assert len(bars) == 5
+
+    # The tail repeats the last stored bar with its final close plus a new day.
+    tail = _history_frame("2024-01-05", 2, close=200.0)
+    ticker.history.return_value = tail
+    with patch("yfinance.Ticker", return_value=ticker):
+        bars = await store.get_bars("AAPL", "max")
+    assert ticker.history.call_args.kwargs == {"start": "2024-01-05"}
+
+    assert len(bars) == 6
+    assert bars["close"].tolist() == [100.0, 101.0, 102.0, 103.0, 200.0, 201.0]
+    assert np.all(np.diff(bars["timestamp"]) > 0)
+
+
+@pytest.mark.asyncio
+async def test_split_in_the_tail_reloads_full_history(store):
+    ticker = MagicMock()
+    ticker.history.return_value = _history_frame("2024-01-01", 4, close=1000.0)
+    with patch("yfinance.Ticker", return_value=ticker):
+        await store.get_bars("AAPL", "max")
+
+    # A 10:1 split on the new day: the tail reports it, and the full history
+    # comes back re-adjusted to post-split prices.
+    tail = _history_frame("2024-01-04", 2, close=100.0)
+    tail["Dividends"] = 0.0
+    tail["Stock Splits"] = [0.0, 10.0]
+    ticker.history.side_effect = [tail, _history_frame("2024-01-01", 5, close=100.0)]
+    with patch("yfinance.Ticker", return_value=ticker):
+        bars = await store.get_bars("AAPL", "max")
+
+    assert [call.kwargs for call in ticker.history.call_args_list[-2:]] == [
+        {"start": "2024-01-04"},
+        {"period": "max"},
+    ]
+    assert bars["close"].tolist() == [100.0, 101.0, 102.0, 103.0, 104.0]
+
+    # The split is already reflected, so the next tail only appends.
+    ticker.history.side_effect = None
+    ticker.history.return_value = tail.iloc[1:]
+    with patch("yfinance.Ticker", return_value=ticker):
+        bars = await store.get_bars("AAPL", "max")
+    assert ticker.history.call_args.kwargs == {"start": "2024-01-05"}
+    assert bars["close"].tolist() == [100.0, 101.0, 102.0, 103.0, 101.0]
+
+
+@pytest.mark.asyncio
+async def test_fresh_symbol_is_read_without_network(store):
+    store.refresh_seconds = 3600
+    ticker = MagicMock()
+    ticker.history.return_value = _history_frame("2024-01-01", 30)
+    with patch("yfinance.Ticker", return_value=ticker):
+        await store.get_bars("MSFT", "max")
+        bars = await store.get_bars("MSFT", "5d")
+
+    assert ticker.history.call_count == 1
+    assert len(bars) == 5
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_refresh(store):
+    ticker = MagicMock()
+    ticker.history.return_value = _history_frame("2024-01-01", 3)
+    with patch("yfinance.Ticker", return_value=ticker):
+        results = await asyncio.gather(*(store.get_bars("NVDA", "max") for _ in range(5)))
+
+    assert ticker.history.call_count == 1
+    assert all(len(bars) == 3 for bars in results)
+
+
+@pytest.mark.asyncio
+async def test_refresh_failure_serves_stored_bars(store):
+    store.append("TSLA", frame_to_bars(_history_frame("2024-01-01", 4)))
+    with patch("yfinance.Ticker", side_effect=RuntimeError("network down")):
+        bars = await store.get_bars("TSLA", "max")
+    assert len(bars) == 4
+
+    with patch("yfinance.Ticker", side_effect=RuntimeError("network down")):
+        with pytest.raises(RuntimeError):
+            await store.get_bars("EMPTY", "max")
+
+
+@pytest.mark.asyncio
+async def test_rejects_unsafe_symbols(store):
+    with pytest.raises(ValueError):
+        await store.get_bars("../ETC", "max")
+
+
+def test_bars_to_records_formats_columns_and_missing_values():
+    frame = _history_frame("2024-03-01", 2)
+    frame.loc[frame.index[1], "Volume"] = float("nan")
+    records = bars_to_records(frame_to_bars(frame))
+
+    assert records == [
+        {"date": "2024-03-01", "open": 99.0, "high": 102.0, "low": 98.0, "close": 100.0, "volume": 1_000_000.0},
+        {"date": "2024-03-02", "open": 100.0, "high": 103.0, "low": 99.0, "close": 101.0, "volume": None},
+    ]
+
+
+def test_fast_json_response_encodes_missing_values_as_null():
+    frame = _history_frame("2024-03-01", 1)
+    frame["Volume"] = float("nan")
+    body = FastJSONResponse({"history": bars_to_records(frame_to_bars(frame))}).body.replace(b" ", b"")
+
+    assert b'"date":"2024-03-01"' in body
+    assert b'"volume":null' in body
@@ -0,0 +1,186 @@
+"""
+Tests for the database lease that elects one scheduler leader across workers.
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from backend import snapshot_jobs
+from backend.models import SchedulerLease
+from backend.scheduler_lease import LeaderLease
+from backend.snapshot_jobs import SnapshotJobResult
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    """A file-backed database so each worker session gets its own connection."""
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'leases.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SchedulerLease.__table__.create)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+def _lease(session_factory, name, holder, ttl_seconds=60):
+    return LeaderLease(name, ttl_seconds=ttl_seconds, holder=holder, session_factory=session_factory)
+
+
+@pytest.mark.asyncio
+async def test_only_one_holder_acquires(session_factory):
+    first = _lease(session_factory, "lease-exclusive", "worker-a")
+    second = _lease(session_factory, "lease-exclusive", "worker-b")
+
+    assert await first.acquire()
+    assert not await second.acquire()
+    assert await first.acquire()
+    assert await first.renew()
+    assert not await second.renew()
+
+    await first.release()
+    assert await second.acquire()
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_taken_over(session_factory):
+    leader = _lease(session_factory, "lease-takeover", "worker-a", ttl_seconds=0.05)
+    standby = _lease(session_factory, "lease-takeover", "worker-b")
+
+    assert await leader.acquire()
+    await asyncio.sleep(0.1)
+
+    assert await standby.acquire()
+    assert not await leader.renew()
+
+
+@pytest.mark.asyncio
+async def test_lease_expiry_follows_the_database_clock(session_factory):
+    lease = _lease(session_factory, "lease-db-clock", "worker-a", ttl_seconds=60)
+    assert await lease.acquire()
+
+    async with session_factory() as db:
+        remaining_days = (
+            await db.execute(
+                select(func.julianday(SchedulerLease.expires_at) - func.julianday("now")).where(
+                    SchedulerLease.name == "lease-db-clock"
+                )
+            )
+        ).scalar_one()
+        row = await db.get(SchedulerLease, "lease-db-clock")
+
+    assert 55 < remaining_days * 86400 <= 60
+    assert isinstance(row.expires_at, datetime)
+
+
+@pytest.mark.asyncio
+async def test_run_exclusive_renews_and_records_completion(session_factory):
+    leader = _lease(session_factory, "lease-renewal", "worker-a", ttl_seconds=0.15)
+    standby = _lease(session_factory, "lease-renewal", "worker-b")
+    standby_results = []
+
+    async def job():
+        for _ in range(4):
+            await asyncio.sleep(0.1)
+            standby_results.append(await standby.acquire())
+        return "done"
+
+    assert await leader.run_exclusive(job, completion_key="2026-04-01")
+    # The job outlived the TTL several times, but renewal kept the standby out.
+    assert standby_results == [False, False, False, False]
+    assert await standby.last_completed_key() == "2026-04-01"
+    assert await standby.acquire()
+
+
+@pytest.mark.asyncio
+async def test_run_exclusive_cancels_job_when_lease_is_lost(session_factory):
+    leader = _lease(session_factory, "lease-lost", "worker-a", ttl_seconds=0.15)
+    usurper = _lease(session_factory, "lease-lost", "worker-b")
+    cancelled = asyncio.Event()
+
+    async def job():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def usurp():
+        # Simulate the leader stalling past expiry: force the row to the usurper.
+        await asyncio.sleep(0.02)
+        await leader.release()
+        assert await usurper.acquire()
+
+    results = await asyncio.gather(leader.run_exclusive(job, completion_key="x"), usurp())
+
+    assert results[0] is False
+    assert cancelled.is_set()
+    assert await usurper.last_completed_key() is None
+    assert not await leader.acquire()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_schedulers_capture_once(session_factory, monkeypatch):
+    runs = []
+
+    async def fake_job(snapshot_date, *, shard, workers):
+        runs.append(snapshot_date)
+        await asyncio.sleep(0.05)
+        return SnapshotJobResult(snapshot_date=snapshot_date)
+
+    monkeypatch.setattr(snapshot_jobs, "run_snapshot_job_for_date", fake_job)
+    monkeypatch.setattr(snapshot_jobs.settings, "snapshot_capture_hour_utc", 0)
+    monkeypatch.setattr(snapshot_jobs.settings, "snapshot_capture_minute_utc", 0)
+
+    stop_event = asyncio.Event()
+    schedulers = [
+        asyncio.ensure_future(
+            snapshot_jobs.run_daily_snapshot_scheduler(
+                stop_event,
+                lease=_lease(session_factory, "snapshot-daily-test", f"worker-{i}"),
+            )
+        )
+        for i in range(3)
+    ]
+    await asyncio.sleep(0.4)
+    stop_event.set()
+    await asyncio.gather(*schedulers)
+
+    assert len(runs) == 1
+
+
+@pytest.mark.asyncio
+async def test_scheduler_survives_failed_iterations(session_factory, monkeypatch):
+    runs = []
+    outcomes = [RuntimeError("database unavailable"), RuntimeError("job failed")]
+
+    async def flaky_job(snapshot_date, *, shard, workers):
+        if len(outcomes) == 1:
+            raise outcomes.pop()
+        runs.append(snapshot_date)
+        return SnapshotJobResult(snapshot_date=snapshot_date)
+
+    lease = _lease(session_factory, "snapshot-daily-flaky", "worker-a")
+    last_completed_key = lease.last_completed_key
+
+    async def flaky_last_completed_key():
+        if len(outcomes) == 2:
+            raise outcomes.pop()
+        return await last_completed_key()
+
+    monkeypatch.setattr(lease, "last_completed_key", flaky_last_completed_key)
+    monkeypatch.setattr(snapshot_jobs, "run_snapshot_job_for_date", flaky_job)
+    monkeypatch.setattr(snapshot_jobs, "_scheduler_backoff_seconds", lambda failures: 0.01)
+    monkeypatch.setattr(snapshot_jobs.settings, "snapshot_capture_hour_utc", 0)
+    monkeypatch.setattr(snapshot_jobs.settings, "snapshot_capture_minute_utc", 0)
+
+    stop_event = asyncio.Event()
+    scheduler = asyncio.ensure_future(snapshot_jobs.run_daily_snapshot_scheduler(stop_event, lease=lease))
+    await asyncio.sleep(0.3)
+    stop_event.set()
+    await scheduler
+
+    assert outcomes == []
+    assert len(runs) == 1
@@ -0,0 +1,143 @@
+"""
+Tests for snapshot performance analytics (TWR, drawdown, volatility).
+"""
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from backend.portfolio_snapshots import write_portfolio_snapshot
+from backend.snapshot_analytics import TRADING_DAYS_PER_YEAR, compute_snapshot_analytics, quantity_change_flows
+from backend.snapshot_archive import compact_snapshot_holdings, snapshot_archive
+from backend.snapshot_cache import snapshot_response_cache
+from backend.valuation import value_holdings
+
+PRICES = [100.0, 110.0, 99.0, 121.0]
+
+
+def test_returns_drawdown_and_best_worst_days():
+    analytics = compute_snapshot_analytics(PRICES, [0.0] * 3, volatility_window=2)
+
+    np.testing.assert_allclose(analytics.period_returns, [0.1, -0.1, 121 / 99 - 1])
+    assert analytics.time_weighted_return == pytest.approx(0.21)
+    assert analytics.max_drawdown == pytest.approx(-0.1)
+    assert (analytics.peak_index, analytics.trough_index) == (1, 2)
+    assert (analytics.best_index, analytics.worst_index) == (2, 1)
+    assert np.isnan(analytics.rolling_volatility[0])
+    assert analytics.rolling_volatility[1] == pytest.approx(
+        np.std([0.1, -0.1], ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR)
+    )
+
+
+def test_quantity_changes_are_not_returns():
+    # A second share is bought and both end 5% up.
+    deposit = compute_snapshot_analytics([100.0, 210.0], [105.0], volatility_window=2)
+    assert deposit.time_weighted_return == pytest.approx(0.05)
+
+    # Selling one of two shares bought at 50 withdraws their value of 100, not their cost.
+    withdrawal = compute_snapshot_analytics([200.0, 100.0], [-100.0], volatility_window=2)
+    assert withdrawal.time_weighted_return == pytest.approx(0.0)
+    assert withdrawal.max_drawdown == pytest.approx(0.0)
+
+    # The first holding of an empty portfolio starts the series at 0%.
+    first_buy = compute_snapshot_analytics([0.0, 100.0], [100.0], volatility_window=2)
+    assert first_buy.time_weighted_return == pytest.approx(0.0)
+
+
+def test_flows_value_quantity_changes_at_market():
+    # Snapshots 0-2: AAPL 2 -> 1 -> 1 share, MSFT bought on 1 and removed on 2.
+    flows = quantity_change_flows(
+        snapshot_index=[0, 1, 1, 2],
+        symbol_index=[0, 0, 1, 0],
+        quantities=[2.0, 1.0, 3.0, 1.0],
+        prices=[100.0, 110.0, 20.0, 120.0],
+        snapshot_count=3,
+    )
+
+    # -1 AAPL at 110 + 3 MSFT at 20, then -3 MSFT at its last price of 20.
+    np.testing.assert_allclose(flows, [-50.0, -60.0])
+
+
+def test_requires_two_snapshots():
+    with pytest.raises(ValueError):
+        compute_snapshot_analytics([100.0], [100.0], volatility_window=2)
+
+
+@pytest.mark.asyncio
+async def test_analytics_endpoint_over_past_range(auth_client, test_db):
+    resp = await auth_client.post("/portfolios", json={"name": "Analytics Portfolio"})
+    assert resp.status_code == 200, resp.text
+    pid = resp.json()["id"]
+    asset = SimpleNamespace(id=920001, symbol="AAPL")
+    for day, price in enumerate(PRICES, start=1):
+        await write_portfolio_snapshot(
+            test_db,
+            pid,
+            date(2024, 2, day),
+            datetime.now(timezone.utc),
+            [asset],
+            value_holdings([1.0], [100.0], [price]),
+        )
+    await test_db.commit()
+
+    url = f"/portfolios/{pid}/snapshots/analytics?from_date=2024-02-01&to_date=2024-02-29&volatility_window=2"
+    first = await auth_client.get(url)
+    second = await auth_client.get(url)
+
+    assert first.status_code == 200, first.text
+    assert second.json() == first.json()
+    assert snapshot_response_cache.stats.hits == 1
+    data = first.json()
+    assert data["snapshot_count"] == 4
+    assert data["net_contributions"] == pytest.approx(0.0)
+    assert data["time_weighted_return_percent"] == pytest.approx(21.0)
+    assert data["max_drawdown_percent"] == pytest.approx(-10.0)
+    assert (data["drawdown_peak_date"], data["drawdown_trough_date"]) == ("2024-02-02", "2024-02-03")
+    assert data["best_day"]["as_of"] == "2024-02-04"
+    assert data["worst_day"] == {"as_of": "2024-02-03", "return_percent": pytest.approx(-10.0)}
+    assert [point["as_of"] for point in data["rolling_volatility"]] == ["2024-02-03", "2024-02-04"]
+
+    # Quantities never changed, so nothing was contributed.
+    too_short = await auth_client.get(
+        f"/portfolios/{pid}/snapshots/analytics?from_date=2024-02-04&to_date=2024-02-29"
+    )
+    assert too_short.status_code == 404
+    reversed_range = await auth_client.get(
+        f"/portfolios/{pid}/snapshots/analytics?from_date=2024-02-29&to_date=2024-02-01"
+    )
+    assert reversed_range.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_analytics_sale_is_not_a_loss_for_archived_snapshots(auth_client, test_db, monkeypatch, tmp_path):
+    monkeypatch.setattr(snapshot_archive, "root", str(tmp_path / "snapshot_archive"))
+    resp = await auth_client.post("/portfolios", json={"name": "Analytics Sale Portfolio"})
+    assert resp.status_code == 200, resp.text
+    pid = resp.json()["id"]
+    asset = SimpleNamespace(id=920002, symbol="MSFT")
+    # Two shares bought at 50, one sold at 100, then the price rises 10%.
+    history = [(date(2013, 3, 1), 2.0, 100.0), (date(2013, 3, 2), 1.0, 100.0), (date(2016, 3, 1), 1.0, 110.0)]
+    for snapshot_date, quantity, price in history:
+        await write_portfolio_snapshot(
+            test_db,
+            pid,
+            snapshot_date,
+            datetime.now(timezone.utc),
+            [asset],
+            value_holdings([quantity], [50.0], [price]),
+        )
+    await test_db.commit()
+    # Older than any other test's snapshots; the 2013 dates move to the archive,
+    # the last one stays in SQL (after the archive tests' cutoff as well).
+    await compact_snapshot_holdings(test_db, date(2014, 1, 1))
+
+    resp = await auth_client.get(
+        f"/portfolios/{pid}/snapshots/analytics?from_date=2013-03-01&to_date=2016-03-31&volatility_window=2"
+    )
+
+    assert resp.status_code == 200, resp.text
+    data = resp.json()
+    assert data["net_contributions"] == pytest.approx(-100.0)
+    assert data["time_weighted_return_percent"] == pytest.approx(10.0)
+    assert data["max_drawdown_percent"] == pytest.approx(0.0)
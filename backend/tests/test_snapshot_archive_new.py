@@ -0,0 +1,190 @@
+"""
+Tests for compacting old snapshot holdings into the columnar archive.
+"""
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import func, select
+
+from backend.models import PortfolioSnapshot, PortfolioSnapshotHolding
+from backend.portfolio_snapshots import write_portfolio_snapshot
+from backend.snapshot_archive import SnapshotArchive, compact_snapshot_holdings, snapshot_archive
+from backend.snapshot_cache import snapshot_response_cache
+from backend.valuation import value_holdings
+
+# Old enough that no other test's snapshots fall before the cutoff.
+CUTOFF = date(2016, 1, 1)
+
+
+@pytest.fixture
+def archive(monkeypatch, tmp_path):
+    monkeypatch.setattr(snapshot_archive, "root", str(tmp_path / "snapshot_archive"))
+    return snapshot_archive
+
+
+async def _create_portfolio(auth_client, name):
+    resp = await auth_client.post("/portfolios", json={"name": name})
+    assert resp.status_code == 200, resp.text
+    return resp.json()["id"]
+
+
+async def _write(db, portfolio_id, snapshot_date, prices):
+    assets = [SimpleNamespace(id=900000 + index, symbol=symbol) for index, symbol in enumerate(prices)]
+    await write_portfolio_snapshot(
+        db,
+        portfolio_id,
+        snapshot_date,
+        datetime.now(timezone.utc),
+        assets,
+        value_holdings([10.0] * len(prices), [100.0] * len(prices), list(prices.values())),
+    )
+    await db.commit()
+
+
+async def _sql_holding_count(db, portfolio_id):
+    return (
+        await db.execute(
+            select(func.count())
+            .select_from(PortfolioSnapshotHolding)
+            .join(PortfolioSnapshot)
+            .where(PortfolioSnapshot.portfolio_id == portfolio_id)
+        )
+    ).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_compacted_holdings_are_served_from_archive(auth_client, test_db, archive):
+    pid = await _create_portfolio(auth_client, "Archive Portfolio")
+    await _write(test_db, pid, date(2015, 11, 30), {"AAPL": 90.0, "MSFT": 300.0})
+    await _write(test_db, pid, date(2015, 12, 1), {"AAPL": 110.0, "MSFT": 310.0})
+    await _write(test_db, pid, date(2016, 1, 4), {"AAPL": 120.0})
+
+    before = (await auth_client.get(f"/portfolios/{pid}/snapshots/2015-12-01")).json()
+    compare_before = (
+        await auth_client.get(
+            f"/portfolios/{pid}/snapshots/compare?previous_date=2015-11-30&current_date=2016-01-04"
+        )
+    ).json()
+
+    result = await compact_snapshot_holdings(test_db, CUTOFF, archive=archive)
+
+    assert result.snapshots_archived == 2
+    assert result.holdings_archived == 4
+    # Only the snapshot on or after the cutoff keeps its holdings in SQL.
+    assert await _sql_holding_count(test_db, pid) == 1
+    # Compaction does not change any response; rebuild them from the archive anyway.
+    snapshot_response_cache.clear()
+    after = (await auth_client.get(f"/portfolios/{pid}/snapshots/2015-12-01")).json()
+    assert after == before
+    assert [holding["symbol"] for holding in after["holdings"]] == ["MSFT", "AAPL"]
+    compare_after = (
+        await auth_client.get(
+            f"/portfolios/{pid}/snapshots/compare?previous_date=2015-11-30&current_date=2016-01-04"
+        )
+    ).json()
+    assert compare_after == compare_before
+
+    # Nothing left to archive on a second run.
+    again = await compact_snapshot_holdings(test_db, CUTOFF, archive=archive)
+    assert again.snapshots_archived == 0
+
+
+@pytest.mark.asyncio
+async def test_recaptured_archived_date_is_replaced_not_duplicated(auth_client, test_db, archive):
+    pid = await _create_portfolio(auth_client, "Archive Recapture Portfolio")
+    await _write(test_db, pid, date(2015, 10, 5), {"AAPL": 90.0, "MSFT": 300.0})
+    await compact_snapshot_holdings(test_db, CUTOFF, archive=archive)
+
+    # Re-capturing puts the date's holdings back in SQL ...
+    await _write(test_db, pid, date(2015, 10, 5), {"GOOG": 50.0})
+    resp = await auth_client.get(f"/portfolios/{pid}/snapshots/2015-10-05")
+    assert [holding["symbol"] for holding in resp.json()["holdings"]] == ["GOOG"]
+
+    # ... and archiving it again replaces the old archived rows.
+    await compact_snapshot_holdings(test_db, CUTOFF, archive=archive)
+    resp = await auth_client.get(f"/portfolios/{pid}/snapshots/2015-10-05")
+    assert [holding["symbol"] for holding in resp.json()["holdings"]] == ["GOOG"]
+    assert archive.read_holdings(pid, date(2015, 10, 5))[0]["current_value"] == pytest.approx(500.0)
+
+
+@pytest.mark.asyncio
+async def test_archived_comparison_adds_up_lots_of_one_symbol(auth_client, test_db, archive):
+    pid = await _create_portfolio(auth_client, "Archive Lots Portfolio")
+    lots = [SimpleNamespace(id=900101, symbol="AAPL"), SimpleNamespace(id=900102, symbol="AAPL")]
+    for snapshot_date, price in ((date(2015, 7, 1), 100.0), (date(2015, 7, 2), 110.0)):
+        await write_portfolio_snapshot(
+            test_db,
+            pid,
+            snapshot_date,
+            datetime.now(timezone.utc),
+            lots,
+            value_holdings([10.0, 5.0], [90.0, 95.0], [price, price]),
+        )
+    await test_db.commit()
+    url = f"/portfolios/{pid}/snapshots/compare?previous_date=2015-07-01&current_date=2015-07-02"
+    before = (await auth_client.get(url)).json()
+
+    await compact_snapshot_holdings(test_db, CUTOFF, archive=archive)
+    snapshot_response_cache.clear()
+    after = (await auth_client.get(url)).json()
+
+    assert after == before
+    [aapl] = after["holdings"]
+    assert (aapl["current_quantity"], aapl["current_price"]) == (15.0, 110.0)
+    assert aapl["value_change"] == pytest.approx(150.0)
+
+
+def test_month_file_merge_replaces_snapshots_without_holdings(tmp_path):
+    archive = SnapshotArchive(str(tmp_path), buckets=4)
+    row = {
+        "portfolio_id": 7,
+        "snapshot_date": date(2015, 3, 2),
+        "asset_id": None,
+        "symbol": "AAPL",
+        "quantity": 1.0,
+        "price": 2.0,
+        "current_value": 2.0,
+        "allocation_percent": 100.0,
+        "total_cost": 1.0,
+        "profit_loss": 1.0,
+        "profit_loss_percent": 100.0,
+    }
+    archive.write_month(date(2015, 3, 1), [row, {**row, "portfolio_id": 8}])
+    assert archive.read_holdings(7, date(2015, 3, 2))[0]["asset_id"] is None
+
+    other_bucket = tmp_path / "holdings-2015-03-b000.npz"
+    other_inode = other_bucket.stat().st_ino
+
+    archive.write_month(date(2015, 3, 1), [], [(7, date(2015, 3, 2))])
+
+    # Portfolio 8 lives in another bucket, which was not rewritten.
+    assert other_bucket.stat().st_ino == other_inode
+
+    assert archive.read_holdings(7, date(2015, 3, 2)) == []
+    assert len(archive.read_holdings(8, date(2015, 3, 2))) == 1
+    assert archive.read_holdings(7, date(2015, 4, 2)) == []
+
+
+def test_bucket_count_is_fixed_by_the_first_write(tmp_path):
+    row = {
+        "portfolio_id": 7,
+        "snapshot_date": date(2015, 3, 2),
+        "asset_id": 1,
+        "symbol": "AAPL",
+        "quantity": 1.0,
+        "price": 2.0,
+        "current_value": 2.0,
+        "allocation_percent": 100.0,
+        "total_cost": 1.0,
+        "profit_loss": 1.0,
+        "profit_loss_percent": 100.0,
+    }
+    SnapshotArchive(str(tmp_path), buckets=4).write_month(date(2015, 3, 1), [row])
+
+    # A changed setting keeps reading and writing the layout on disk.
+    resized = SnapshotArchive(str(tmp_path), buckets=8)
+    assert len(resized.read_holdings(7, date(2015, 3, 2))) == 1
+    resized.write_month(date(2015, 3, 1), [{**row, "snapshot_date": date(2015, 3, 3)}])
+    assert sorted(path.name for path in tmp_path.glob("*.npz")) == ["holdings-2015-03-b003.npz"]
+    assert resized.read_portfolio_range(7, date(2015, 3, 1), date(2015, 3, 31), ("symbol",))["symbol"].size == 2
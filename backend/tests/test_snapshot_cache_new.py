@@ -0,0 +1,116 @@
+"""
+Tests for the snapshot history/comparison response cache and its invalidation.
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from backend.portfolio_snapshots import capture_portfolio_snapshot
+from backend.snapshot_cache import SnapshotResponseCache, snapshot_response_cache
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Compute:
+    def __init__(self, value="response"):
+        self.value = value
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+PAST = (date(2024, 1, 1), date(2024, 1, 31))
+
+
+@pytest.mark.asyncio
+async def test_past_windows_outlive_live_windows_but_still_expire():
+    clock = _FakeClock()
+    cache = SnapshotResponseCache(max_entries=10, ttl_seconds=600, live_ttl_seconds=60, clock=clock)
+    today = datetime.now(timezone.utc).date()
+    past, live = _Compute(), _Compute()
+
+    for now in (0.0, 0.0, 120.0):
+        clock.now = now
+        await cache.get(1, "past", PAST, past)
+        await cache.get(1, "live", (today - timedelta(days=7), today), live)
+    assert (past.calls, live.calls) == (1, 2)
+
+    # A write by another process is picked up once the entry expires.
+    clock.now = 700.0
+    await cache.get(1, "past", PAST, past)
+    assert past.calls == 2
+    assert cache.stats.hits == 3
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_only_windows_containing_the_date():
+    cache = SnapshotResponseCache(max_entries=10, ttl_seconds=600, live_ttl_seconds=60)
+    january, february, other_portfolio = _Compute(), _Compute(), _Compute()
+
+    await cache.get(1, "jan", PAST, january)
+    await cache.get(1, "feb", (date(2024, 2, 1), date(2024, 2, 29)), february)
+    await cache.get(2, "jan", PAST, other_portfolio)
+    cache.invalidate(1, date(2024, 1, 15))
+    await cache.get(1, "jan", PAST, january)
+    await cache.get(1, "feb", (date(2024, 2, 1), date(2024, 2, 29)), february)
+    await cache.get(2, "jan", PAST, other_portfolio)
+
+    assert (january.calls, february.calls, other_portfolio.calls) == (2, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_read_racing_a_write_is_not_stored():
+    cache = SnapshotResponseCache(max_entries=10, ttl_seconds=600, live_ttl_seconds=60)
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_compute():
+        started.set()
+        await release.wait()
+        return "stale"
+
+    read = asyncio.ensure_future(cache.get(1, "jan", PAST, slow_compute))
+    await started.wait()
+    cache.invalidate(1, date(2024, 1, 15))
+    release.set()
+
+    assert await read == "stale"
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_capture_invalidates_cached_history(auth_client, test_db):
+    resp = await auth_client.post("/portfolios", json={"name": "Cached History Portfolio"})
+    assert resp.status_code == 200, resp.text
+    pid, owner_id = resp.json()["id"], resp.json()["owner_id"]
+    with patch("backend.main.market_data.get_latest_price", AsyncMock(return_value=100.0)):
+        asset_resp = await auth_client.post(
+            f"/portfolios/{pid}/assets",
+            json={
+                "symbol": "AAPL",
+                "quantity": 10.0,
+                "purchase_price": 100.0,
+                "purchase_date": "2024-01-01T00:00:00Z",
+            },
+        )
+    assert asset_resp.status_code == 200, asset_resp.text
+    asset_id = asset_resp.json()["id"]
+
+    await capture_portfolio_snapshot(test_db, pid, owner_id, asset_prices={asset_id: 100.0})
+    first = (await auth_client.get(f"/portfolios/{pid}/snapshots?days=30")).json()
+    again = (await auth_client.get(f"/portfolios/{pid}/snapshots?days=30")).json()
+    assert again == first
+    assert snapshot_response_cache.stats.hits == 1
+
+    await capture_portfolio_snapshot(test_db, pid, owner_id, asset_prices={asset_id: 120.0})
+    refreshed = (await auth_client.get(f"/portfolios/{pid}/snapshots?days=30")).json()
+    assert refreshed["points"][-1]["portfolio_value"] == pytest.approx(1200.0)
@@ -1,18 +1,25 @@
 """
 Tests for the scheduled and backfill portfolio snapshot job helpers.
 """
-from datetime import date
-from unittest.mock import MagicMock, patch
+import argparse
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pandas as pd
 import pytest
-from sqlalchemy import func, select
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from backend.models import PortfolioSnapshot
+from backend import snapshot_jobs
+from backend.models import PortfolioSnapshot, SnapshotBackfillCheckpoint
+from backend.portfolio_snapshots import write_portfolio_snapshot
 from backend.snapshot_jobs import (
+    SnapshotJobResult,
+    SnapshotShard,
     capture_missing_snapshots_for_date,
-    capture_missing_snapshots_for_range,
 )
+from backend.valuation import value_holdings
 
 
 async def _create_portfolio(auth_client, name="Snapshot Job Portfolio"):
@@ -80,31 +87,328 @@ async def test_daily_snapshot_job_skips_existing_snapshots(auth_client, test_db)
 
 
 @pytest.mark.asyncio
-async def test_snapshot_job_backfills_missing_date_range(auth_client, test_db):
-    portfolio = await _create_portfolio(auth_client, "Snapshot Backfill Portfolio")
-    pid = portfolio["id"]
+async def test_snapshot_job_prices_shared_symbols_once(auth_client, test_db):
+    pids = []
+    for name in ("Shared Symbol Portfolio A", "Shared Symbol Portfolio B"):
+        pid = (await _create_portfolio(auth_client, name))["id"]
+        with patch("yfinance.Ticker", return_value=_mock_yf_ticker(150.0)):
+            create_resp = await auth_client.post(f"/portfolios/{pid}/assets", json=_ASSET_PAYLOAD)
+            assert create_resp.status_code == 200, create_resp.text
+        pids.append(pid)
 
-    with patch("yfinance.Ticker", return_value=_mock_yf_ticker(150.0)):
-        create_resp = await auth_client.post(f"/portfolios/{pid}/assets", json=_ASSET_PAYLOAD)
-        assert create_resp.status_code == 200, create_resp.text
+    snapshot_date = date(2026, 3, 31)
+    with patch(
+        "backend.valuation.valuation_engine.fetch_live_prices",
+        new=AsyncMock(return_value={"AAPL": 160.0}),
+    ) as fetch_live_prices:
+        result = await capture_missing_snapshots_for_date(test_db, snapshot_date)
+
+    assert result.failures == 0
+    fetch_live_prices.assert_awaited_once()
+    for pid in pids:
+        snapshot_value = (
+            await test_db.execute(
+                select(PortfolioSnapshot.total_value)
+                .where(PortfolioSnapshot.portfolio_id == pid)
+                .where(PortfolioSnapshot.snapshot_date == snapshot_date)
+            )
+        ).scalar_one()
+        assert snapshot_value == pytest.approx(1600.0)
+
+
+@pytest.mark.asyncio
+async def test_past_date_argument_runs_a_history_backfill(monkeypatch):
+    backfill, live = AsyncMock(return_value=[]), AsyncMock()
+    monkeypatch.setattr(snapshot_jobs, "run_snapshot_backfill", backfill)
+    monkeypatch.setattr(snapshot_jobs, "run_snapshot_job_for_date", live)
+    today = datetime.now(timezone.utc).date()
+
+    def _args(snapshot_date):
+        return argparse.Namespace(
+            daemon=False,
+            compact_holdings=False,
+            rebuild_rollups=False,
+            resume=None,
+            backfill_start=None,
+            snapshot_date=snapshot_date,
+            shard=SnapshotShard(),
+            workers=None,
+        )
+
+    await snapshot_jobs._run_from_args(_args((today - timedelta(days=3)).isoformat()))
+    await snapshot_jobs._run_from_args(_args(None))
+
+    backfill.assert_awaited_once_with(
+        today - timedelta(days=3), today - timedelta(days=3), shard=SnapshotShard(), workers=None
+    )
+    live.assert_awaited_once_with(today, shard=SnapshotShard(), workers=None)
+
+
+def test_shard_split_partitions_portfolio_ids():
+    shard = SnapshotShard.parse("2/3")
+    workers = shard.split(4)
+
+    ids = range(1, 200)
+    owners = [[pid for pid in ids if pid % worker.count == worker.index] for worker in workers]
+    flattened = sorted(pid for owned in owners for pid in owned)
+
+    assert shard == SnapshotShard(index=1, count=3)
+    assert flattened == [pid for pid in ids if pid % 3 == 1]
+    assert len(flattened) == len(set(flattened))
+
+
+@pytest.mark.parametrize("raw_value", ["0/4", "5/4", "1/0", "1", "a/b"])
+def test_shard_parse_rejects_invalid_values(raw_value):
+    with pytest.raises(ValueError):
+        SnapshotShard.parse(raw_value)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_job_shard_only_captures_its_portfolios(auth_client, test_db):
+    pids = [(await _create_portfolio(auth_client, f"Sharded Portfolio {i}"))["id"] for i in range(2)]
+    snapshot_date = date(2026, 4, 1)
+    shard = SnapshotShard(index=pids[0] % 2, count=2)
+
+    with patch("yfinance.Ticker", return_value=_mock_yf_ticker(150.0)), \
+            patch("yfinance.download", side_effect=RuntimeError("offline")):
+        result = await capture_missing_snapshots_for_date(test_db, snapshot_date, shard=shard)
+
+    captured = set(
+        (
+            await test_db.execute(
+                select(PortfolioSnapshot.portfolio_id).where(PortfolioSnapshot.snapshot_date == snapshot_date)
+            )
+        ).scalars().all()
+    )
+    assert pids[0] in captured
+    assert pids[1] not in captured
+    assert all(pid % 2 == shard.index for pid in captured)
+    assert result.snapshots_created == len(captured)
+
+
+@pytest.mark.asyncio
+async def test_run_snapshot_job_fans_out_to_worker_sessions(monkeypatch):
+    sessions = []
+
+    @asynccontextmanager
+    async def fake_session_factory():
+        session = MagicMock(name=f"session-{len(sessions)}")
+        sessions.append(session)
+        yield session
+
+    seen_shards = []
+
+    async def fake_capture(db, snapshot_date, *, shard, asset_prices=None):
+        seen_shards.append((db, shard, asset_prices))
+        return SnapshotJobResult(snapshot_date=snapshot_date, portfolios_seen=3, snapshots_created=2, failures=1)
+
+    monkeypatch.setattr(snapshot_jobs, "async_session_factory", fake_session_factory)
+    monkeypatch.setattr(snapshot_jobs, "resolve_job_prices", AsyncMock(return_value={1: 10.0}))
+    monkeypatch.setattr(snapshot_jobs, "capture_missing_snapshots_for_date", fake_capture)
+
+    result = await snapshot_jobs.run_snapshot_job_for_date(
+        date(2026, 4, 2),
+        shard=SnapshotShard.parse("1/2"),
+        workers=3,
+    )
+
+    assert {shard for _, shard, _ in seen_shards} == {
+        SnapshotShard(index=0, count=6),
+        SnapshotShard(index=2, count=6),
+        SnapshotShard(index=4, count=6),
+    }
+    assert len({id(db) for db, _, _ in seen_shards}) == 3
+    assert all(prices == {1: 10.0} for _, _, prices in seen_shards)
+    assert len(sessions) == 4
+    assert (result.portfolios_seen, result.snapshots_created, result.failures) == (9, 6, 3)
+
+
+def _history_download(closes_by_symbol):
+    dates = pd.to_datetime(["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"])
+    fields = ["Open", "High", "Low", "Close", "Volume"]
+    columns = pd.MultiIndex.from_product([list(closes_by_symbol), fields])
+    rows = [
+        [value for closes in closes_by_symbol.values() for value in (closes[i],) * 4 + (1_000.0,)]
+        for i in range(len(dates))
+    ]
+    return pd.DataFrame(rows, index=dates, columns=columns)
+
+
+@pytest.mark.asyncio
+async def test_history_backfill_values_past_dates_from_closes(auth_client, test_db):
+    pid = (await _create_portfolio(auth_client, "History Backfill Portfolio"))["id"]
+    with patch("yfinance.Ticker", return_value=_mock_yf_ticker(150.0)), \
+            patch("yfinance.download", side_effect=RuntimeError("offline")):
+        for symbol, purchase_date in (("BKFA", "2024-01-03T15:30:00"), ("BKFB", "2023-12-01T00:00:00")):
+            resp = await auth_client.post(
+                f"/portfolios/{pid}/assets",
+                json={**_ASSET_PAYLOAD, "symbol": symbol, "purchase_date": purchase_date},
+            )
+            assert resp.status_code == 200, resp.text
 
-    with patch("yfinance.Ticker", return_value=_mock_yf_ticker(152.0)):
-        results = await capture_missing_snapshots_for_range(
+    download = _history_download({"BKFA": [10.0, 11.0, 12.0, 13.0], "BKFB": [20.0, 21.0, 22.0, 23.0]})
+    with patch("yfinance.download", return_value=download) as mock_download, \
+            patch("yfinance.Ticker", side_effect=AssertionError("live quotes must not be used")):
+        results = await snapshot_jobs.backfill_snapshots_from_history(
             test_db,
-            date(2026, 3, 27),
-            date(2026, 3, 29),
+            date(2024, 1, 1),
+            date(2024, 1, 7),
+            shard=SnapshotShard(index=pid % 1000, count=1000),
         )
 
-    assert len(results) == 3
-    assert sum(result.snapshots_created for result in results) >= 3
+    mock_download.assert_called_once()
+    assert [result.snapshots_created for result in results] == [1] * 7
+    values = dict(
+        (
+            await test_db.execute(
+                select(PortfolioSnapshot.snapshot_date, PortfolioSnapshot.total_value)
+                .where(PortfolioSnapshot.portfolio_id == pid)
+                .where(PortfolioSnapshot.snapshot_date <= date(2024, 1, 7))
+            )
+        ).all()
+    )
+    # Jan 1 predates every close, so BKFB falls back to its purchase price;
+    # BKFA only counts from its purchase on Jan 3; the weekend carries Friday's close.
+    assert values == pytest.approx(
+        {
+            date(2024, 1, 1): 10 * 145.0,
+            date(2024, 1, 2): 10 * 20.0,
+            date(2024, 1, 3): 10 * (11.0 + 21.0),
+            date(2024, 1, 4): 10 * (12.0 + 22.0),
+            date(2024, 1, 5): 10 * (13.0 + 23.0),
+            date(2024, 1, 6): 10 * (13.0 + 23.0),
+            date(2024, 1, 7): 10 * (13.0 + 23.0),
+        }
+    )
 
-    snapshot_count = (
-        await test_db.execute(
-            select(func.count())
-            .select_from(PortfolioSnapshot)
-            .where(PortfolioSnapshot.portfolio_id == pid)
-            .where(PortfolioSnapshot.snapshot_date >= date(2026, 3, 27))
-            .where(PortfolioSnapshot.snapshot_date <= date(2026, 3, 29))
+    rerun = await snapshot_jobs.backfill_snapshots_from_history(
+        test_db,
+        date(2024, 1, 1),
+        date(2024, 1, 7),
+        shard=SnapshotShard(index=pid % 1000, count=1000),
+    )
+    assert sum(result.snapshots_created for result in rerun) == 0
+    assert sum(result.snapshots_skipped for result in rerun) == 7
+
+
+@pytest.mark.asyncio
+async def test_backfill_run_checkpoints_and_resumes(auth_client, test_db, test_engine, monkeypatch):
+    pid = (await _create_portfolio(auth_client, "Resumable Backfill Portfolio"))["id"]
+    with patch("yfinance.Ticker", return_value=_mock_yf_ticker(150.0)):
+        resp = await auth_client.post(
+            f"/portfolios/{pid}/assets",
+            json={**_ASSET_PAYLOAD, "symbol": "BKFC", "purchase_date": "2023-12-01T00:00:00"},
         )
-    ).scalar_one()
-    assert snapshot_count == 3
+        assert resp.status_code == 200, resp.text
+
+    monkeypatch.setattr(
+        snapshot_jobs,
+        "async_session_factory",
+        async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False),
+    )
+    record_checkpoint = snapshot_jobs._record_checkpoint
+
+    async def crash_on_third_day(db, run_id, shard, result):
+        if result.snapshot_date == date(2024, 1, 4):
+            raise RuntimeError("worker died")
+        await record_checkpoint(db, run_id, shard, result)
+
+    shard = SnapshotShard(index=pid % 1000, count=1000)
+    download = _history_download({"BKFC": [10.0, 11.0, 12.0, 13.0]})
+    with patch("yfinance.Ticker", return_value=_mock_yf_ticker(150.0)), \
+            patch("yfinance.download", return_value=download):
+        monkeypatch.setattr(snapshot_jobs, "_record_checkpoint", crash_on_third_day)
+        with pytest.raises(RuntimeError):
+            await snapshot_jobs.run_snapshot_backfill(date(2024, 1, 2), date(2024, 1, 6), shard=shard, workers=1)
+
+        run = await snapshot_jobs.find_resumable_backfill_run(test_db)
+        await test_db.refresh(run)
+        assert run.status == snapshot_jobs.BACKFILL_STATUS_FAILED
+        checkpointed = (
+            await test_db.execute(
+                select(SnapshotBackfillCheckpoint.snapshot_date).where(SnapshotBackfillCheckpoint.run_id == run.id)
+            )
+        ).scalars().all()
+        assert sorted(checkpointed) == [date(2024, 1, 2), date(2024, 1, 3)]
+
+        monkeypatch.setattr(snapshot_jobs, "_record_checkpoint", record_checkpoint)
+        results = await snapshot_jobs.run_snapshot_backfill(resume_run_id=run.id)
+
+    assert [result.snapshot_date for result in results] == [date(2024, 1, 4), date(2024, 1, 5), date(2024, 1, 6)]
+    # Jan 4 was written before the crash, so the resumed run only skips it.
+    assert [result.snapshots_created for result in results] == [0, 1, 1]
+    await test_db.refresh(run)
+    assert run.status == snapshot_jobs.BACKFILL_STATUS_COMPLETED
+    assert run.completed_at is not None
+    resumable = await snapshot_jobs.find_resumable_backfill_run(test_db)
+    assert resumable is None or resumable.id != run.id
+
+
+@pytest.mark.asyncio
+async def test_failed_portfolio_is_retried_on_resume(auth_client, test_db, test_engine, monkeypatch):
+    pid = (await _create_portfolio(auth_client, "Failed Backfill Portfolio"))["id"]
+    with patch("yfinance.Ticker", return_value=_mock_yf_ticker(150.0)):
+        resp = await auth_client.post(
+            f"/portfolios/{pid}/assets",
+            json={**_ASSET_PAYLOAD, "symbol": "BKFD", "purchase_date": "2023-12-01T00:00:00"},
+        )
+        assert resp.status_code == 200, resp.text
+
+    monkeypatch.setattr(
+        snapshot_jobs,
+        "async_session_factory",
+        async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False),
+    )
+    write_snapshot = snapshot_jobs.write_portfolio_snapshot
+
+    async def fail_once(db, portfolio_id, *args):
+        monkeypatch.setattr(snapshot_jobs, "write_portfolio_snapshot", write_snapshot)
+        raise RuntimeError("database hiccup")
+
+    shard = SnapshotShard(index=pid % 1000, count=1000)
+    download = _history_download({"BKFD": [10.0, 11.0, 12.0, 13.0]})
+    with patch("yfinance.Ticker", return_value=_mock_yf_ticker(150.0)), \
+            patch("yfinance.download", return_value=download):
+        monkeypatch.setattr(snapshot_jobs, "write_portfolio_snapshot", fail_once)
+        first = await snapshot_jobs.run_snapshot_backfill(date(2024, 1, 2), date(2024, 1, 3), shard=shard, workers=1)
+        assert [(result.snapshots_created, result.failures) for result in first] == [(0, 1), (1, 0)]
+
+        run = await snapshot_jobs.find_resumable_backfill_run(test_db)
+        await test_db.refresh(run)
+        assert run.status == snapshot_jobs.BACKFILL_STATUS_INCOMPLETE
+        checkpointed = (
+            await test_db.execute(
+                select(SnapshotBackfillCheckpoint.snapshot_date).where(SnapshotBackfillCheckpoint.run_id == run.id)
+            )
+        ).scalars().all()
+        assert checkpointed == [date(2024, 1, 3)]
+
+        resumed = await snapshot_jobs.run_snapshot_backfill(resume_run_id=run.id)
+
+    assert [(result.snapshot_date, result.snapshots_created) for result in resumed] == [(date(2024, 1, 2), 1)]
+    await test_db.refresh(run)
+    assert run.status == snapshot_jobs.BACKFILL_STATUS_COMPLETED
+
+
+@pytest.mark.asyncio
+async def test_find_missing_snapshot_pairs_is_set_based(auth_client, test_db, test_engine):
+    pids = [(await _create_portfolio(auth_client, f"Missing Pairs Portfolio {i}"))["id"] for i in range(2)]
+    days = [date(2024, 3, 1), date(2024, 3, 2)]
+    await write_portfolio_snapshot(test_db, pids[0], days[0], datetime.now(timezone.utc), [], value_holdings([], [], []))
+    await test_db.commit()
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        missing = await snapshot_jobs.find_missing_snapshot_pairs(test_db, days)
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", _record)
+
+    assert len(statements) == 2
+    assert pids[0] not in missing[days[0]]
+    assert pids[1] in missing[days[0]]
+    assert set(pids) <= set(missing[days[1]])
@@ -0,0 +1,119 @@
+"""
+Tests for the debounced background snapshot refresh after asset writes.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock
+
+import pytest
+
+from backend import snapshot_refresh
+from backend.snapshot_refresh import SnapshotRefreshQueue
+
+
+@asynccontextmanager
+async def _fake_session():
+    yield AsyncMock()
+
+
+class _RecordingCapture:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+
+    async def __call__(self, db, portfolio_id, owner_id, *args):
+        self.calls.append((portfolio_id, owner_id, *args))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("quotes unavailable")
+        return None
+
+
+@pytest.mark.asyncio
+async def test_writes_within_window_coalesce_per_portfolio(monkeypatch):
+    capture = _RecordingCapture()
+    monkeypatch.setattr(snapshot_refresh, "capture_portfolio_snapshot", capture)
+    queue = SnapshotRefreshQueue(debounce_seconds=0.05, session_factory=_fake_session)
+
+    for _ in range(50):
+        queue.enqueue(1, 10)
+    queue.enqueue(2, 20)
+    await asyncio.sleep(0.15)
+
+    assert sorted(capture.calls) == [(1, 10), (2, 20)]
+    assert queue.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_write_during_capture_schedules_one_more(monkeypatch):
+    capture = _RecordingCapture(delay=0.05)
+    monkeypatch.setattr(snapshot_refresh, "capture_portfolio_snapshot", capture)
+    queue = SnapshotRefreshQueue(debounce_seconds=0.01, session_factory=_fake_session)
+
+    queue.enqueue(1, 10)
+    await asyncio.sleep(0.03)  # first capture is running
+    queue.enqueue(1, 10)
+    queue.enqueue(1, 10)
+    await asyncio.sleep(0.15)
+
+    assert capture.calls == [(1, 10), (1, 10)]
+
+
+@pytest.mark.asyncio
+async def test_drain_skips_debounce_and_survives_failures(monkeypatch):
+    capture = _RecordingCapture(fail=True)
+    monkeypatch.setattr(snapshot_refresh, "capture_portfolio_snapshot", capture)
+    queue = SnapshotRefreshQueue(debounce_seconds=3600, session_factory=_fake_session)
+
+    queue.enqueue(1, 10)
+    await asyncio.wait_for(queue.drain(), timeout=1)
+
+    assert capture.calls == [(1, 10)]
+    assert queue.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_asset_write_returns_before_refresh(auth_client, snapshot_refresh_queue, monkeypatch):
+    capture = _RecordingCapture()
+    monkeypatch.setattr(snapshot_refresh, "update_portfolio_snapshot_assets", capture)
+    pid = (await auth_client.post("/portfolios", json={"name": "Deferred Refresh Portfolio"})).json()["id"]
+    monkeypatch.setattr("backend.main.market_data.get_latest_price", AsyncMock(return_value=10.0))
+
+    asset_ids = []
+    for symbol in ("AAPL", "MSFT", "GOOG"):
+        resp = await auth_client.post(
+            f"/portfolios/{pid}/assets",
+            json={
+                "symbol": symbol,
+                "quantity": 1.0,
+                "purchase_price": 10.0,
+                "purchase_date": "2024-01-01T00:00:00Z",
+            },
+        )
+        assert resp.status_code == 200, resp.text
+        asset_ids.append(resp.json()["id"])
+
+    assert capture.calls == []
+    await snapshot_refresh_queue.drain()
+    assert len(capture.calls) == 1
+    assert capture.calls[0][0] == pid
+    assert capture.calls[0][2] == set(asset_ids)
+
+
+@pytest.mark.asyncio
+async def test_write_without_asset_id_forces_full_capture(monkeypatch):
+    capture = _RecordingCapture()
+    incremental = _RecordingCapture()
+    monkeypatch.setattr(snapshot_refresh, "capture_portfolio_snapshot", capture)
+    monkeypatch.setattr(snapshot_refresh, "update_portfolio_snapshot_assets", incremental)
+    queue = SnapshotRefreshQueue(debounce_seconds=3600, session_factory=_fake_session)
+
+    queue.enqueue(1, 10, 5)
+    queue.enqueue(1, 10)
+    queue.enqueue(1, 10, 6)
+    queue.enqueue(2, 20, 7)
+    await queue.drain()
+
+    assert capture.calls == [(1, 10)]
+    assert incremental.calls == [(2, 20, {7})]
@@ -0,0 +1,119 @@
+"""
+Tests for weekly/monthly snapshot rollups and resolution-aware history.
+"""
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from backend.models import PortfolioSnapshotRollup
+from backend.portfolio_snapshots import write_portfolio_snapshot
+from backend.snapshot_rollups import (
+    RESOLUTION_DAY,
+    RESOLUTION_MONTH,
+    RESOLUTION_WEEK,
+    pick_resolution,
+    rebuild_snapshot_rollups,
+)
+from backend.valuation import value_holdings
+
+
+async def _create_portfolio(auth_client, name):
+    resp = await auth_client.post("/portfolios", json={"name": name})
+    assert resp.status_code == 200, resp.text
+    return resp.json()["id"]
+
+
+async def _write_value(db, portfolio_id, snapshot_date, value):
+    await write_portfolio_snapshot(
+        db,
+        portfolio_id,
+        snapshot_date,
+        datetime.now(timezone.utc),
+        [],
+        value_holdings([1.0], [100.0], [value]),
+    )
+    await db.commit()
+
+
+async def _rollups(db, portfolio_id):
+    result = await db.execute(
+        select(PortfolioSnapshotRollup)
+        .where(PortfolioSnapshotRollup.portfolio_id == portfolio_id)
+        .order_by(PortfolioSnapshotRollup.resolution, PortfolioSnapshotRollup.period_start)
+    )
+    return [
+        (
+            row.resolution,
+            row.period_start,
+            row.period_end,
+            row.open_value,
+            row.high_value,
+            row.low_value,
+            row.close_value,
+            row.snapshot_count,
+        )
+        for row in result.scalars().all()
+    ]
+
+
+def test_pick_resolution():
+    assert pick_resolution(30) == RESOLUTION_DAY
+    assert pick_resolution(365) == RESOLUTION_DAY
+    assert pick_resolution(2 * 365) == RESOLUTION_WEEK
+    assert pick_resolution(3650) == RESOLUTION_MONTH
+
+
+@pytest.mark.asyncio
+async def test_rollups_track_daily_writes_in_any_order(auth_client, test_db):
+    pid = await _create_portfolio(auth_client, "Rollup Portfolio")
+    # Wed 2024-01-31 .. Fri 2024-02-02 share one week but span two months.
+    await _write_value(test_db, pid, date(2024, 2, 2), 120.0)
+    await _write_value(test_db, pid, date(2024, 1, 31), 100.0)
+    await _write_value(test_db, pid, date(2024, 2, 1), 90.0)
+    # Same-day re-capture replaces the day's value rather than adding to it.
+    await _write_value(test_db, pid, date(2024, 2, 1), 130.0)
+
+    expected = [
+        ("month", date(2024, 1, 1), date(2024, 1, 31), 100.0, 100.0, 100.0, 100.0, 1),
+        ("month", date(2024, 2, 1), date(2024, 2, 2), 130.0, 130.0, 120.0, 120.0, 2),
+        ("week", date(2024, 1, 29), date(2024, 2, 2), 100.0, 130.0, 100.0, 120.0, 3),
+    ]
+    assert await _rollups(test_db, pid) == expected
+
+    assert await rebuild_snapshot_rollups(test_db, pid) == 3
+    assert await _rollups(test_db, pid) == expected
+
+
+@pytest.mark.asyncio
+async def test_history_uses_monthly_rollups_for_long_ranges(auth_client, test_db):
+    pid = await _create_portfolio(auth_client, "Long Range Rollup Portfolio")
+    today = datetime.now(timezone.utc).date()
+    for offset in range(0, 70, 3):
+        await _write_value(test_db, pid, today - timedelta(days=offset), 100.0 + offset)
+
+    daily = (await auth_client.get(f"/portfolios/{pid}/snapshots?days=90")).json()
+    monthly = (await auth_client.get(f"/portfolios/{pid}/snapshots?days=3650")).json()
+    weekly = (await auth_client.get(f"/portfolios/{pid}/snapshots?days=90&resolution=week")).json()
+
+    assert daily["resolution"] == "day"
+    assert len(daily["points"]) == 24
+    assert daily["points"][0]["open_value"] is None
+
+    assert monthly["resolution"] == "month"
+    assert 3 <= len(monthly["points"]) <= 4
+    assert monthly["points"][-1]["as_of"] == today.isoformat()
+    assert monthly["points"][-1]["portfolio_value"] == pytest.approx(100.0)
+    month_start = today.replace(day=1)
+    in_month = [100.0 + offset for offset in range(0, 70, 3) if today - timedelta(days=offset) >= month_start]
+    assert monthly["points"][-1]["high_value"] == pytest.approx(max(in_month))
+
+    assert weekly["resolution"] == "week"
+    assert 10 <= len(weekly["points"]) <= 11
+
+
+@pytest.mark.asyncio
+async def test_history_rejects_unknown_resolution(auth_client):
+    pid = await _create_portfolio(auth_client, "Bad Resolution Portfolio")
+    resp = await auth_client.get(f"/portfolios/{pid}/snapshots?resolution=hour")
+    assert resp.status_code == 422
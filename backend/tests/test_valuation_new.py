@@ -0,0 +1,128 @@
+"""
+Tests for the deadline-bounded valuation engine.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from backend.valuation import (
+    PRICE_SOURCE_LIVE,
+    PRICE_SOURCE_PURCHASE,
+    ValuationEngine,
+    value_holdings,
+)
+
+
+class _FakeMarket:
+    """Stands in for MarketDataService.get_latest_prices."""
+
+    def __init__(self, delay=0.02, slow_symbols=(), slow_delay=5.0):
+        self.delay = delay
+        self.slow_symbols = set(slow_symbols)
+        self.slow_delay = slow_delay
+        self.active = 0
+        self.max_active = 0
+        self.calls = []
+
+    async def get_latest_prices(self, symbols, *, timeout=None):
+        self.calls.append(list(symbols))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            slow = self.slow_symbols & set(symbols)
+            await asyncio.sleep(self.slow_delay if slow else self.delay)
+            return {symbol: 100.0 + len(symbol) for symbol in symbols}
+        finally:
+            self.active -= 1
+
+
+@pytest.mark.asyncio
+async def test_fetches_chunks_with_bounded_concurrency():
+    market = _FakeMarket()
+    engine = ValuationEngine(market, chunk_size=2, max_concurrency=2, deadline_seconds=5)
+
+    prices = await engine.fetch_live_prices([f"S{i}" for i in range(10)] + ["s1"])
+
+    assert len(prices) == 10
+    assert len(market.calls) == 5
+    assert market.max_active == 2
+
+
+@pytest.mark.asyncio
+async def test_deadline_bounds_latency_and_drops_late_chunks():
+    market = _FakeMarket(slow_symbols={"SLOW"})
+    engine = ValuationEngine(market, chunk_size=1, max_concurrency=4, deadline_seconds=0.2)
+
+    started = time.perf_counter()
+    prices = await engine.fetch_live_prices(["AAPL", "SLOW", "MSFT"])
+    elapsed = time.perf_counter() - started
+
+    assert set(prices) == {"AAPL", "MSFT"}
+    assert elapsed < 1.0
+
+
+@pytest.mark.asyncio
+async def test_price_assets_flags_fallback_sources(test_db):
+    market = _FakeMarket(slow_symbols={"SLOW"})
+    engine = ValuationEngine(market, chunk_size=1, max_concurrency=4, deadline_seconds=0.2)
+    assets = [
+        SimpleNamespace(id=990001, symbol="AAPL", purchase_price=90.0),
+        SimpleNamespace(id=990002, symbol="SLOW", purchase_price=42.0),
+    ]
+
+    prices = await engine.price_assets(test_db, assets)
+
+    assert prices[990001].source == PRICE_SOURCE_LIVE
+    assert prices[990002].source == PRICE_SOURCE_PURCHASE
+    assert prices[990002].price == pytest.approx(42.0)
+
+
+@pytest.mark.asyncio
+async def test_get_portfolio_flags_purchase_price_fallback(auth_client):
+    resp = await auth_client.post("/portfolios", json={"name": "Fallback Valuation Portfolio"})
+    pid = resp.json()["id"]
+    with patch("yfinance.Ticker", side_effect=RuntimeError("upstream down")):
+        create_resp = await auth_client.post(
+            f"/portfolios/{pid}/assets",
+            json={
+                "symbol": "ZZZZ",
+                "quantity": 2.0,
+                "purchase_price": 50.0,
+                "purchase_date": "2024-01-01T00:00:00Z",
+            },
+        )
+        assert create_resp.status_code == 200, create_resp.text
+
+        resp = await auth_client.get(f"/portfolios/{pid}")
+
+    assert resp.status_code == 200, resp.text
+    data = resp.json()
+    assert data["assets"][0]["price_source"] == PRICE_SOURCE_PURCHASE
+    assert data["assets"][0]["current_price"] == pytest.approx(50.0)
+    assert data["summary"]["total_value"] == pytest.approx(100.0)
+    assert data["summary"]["total_cost"] == pytest.approx(100.0)
+
+
+def test_value_holdings_matches_scalar_math():
+    valuation = value_holdings([10, 5, 0], [100.0, 20.0, 30.0], [110.0, 10.0, 40.0])
+
+    assert valuation.current_value.tolist() == [1100.0, 50.0, 0.0]
+    assert valuation.total_cost.tolist() == [1000.0, 100.0, 0.0]
+    assert valuation.profit_loss.tolist() == [100.0, -50.0, 0.0]
+    # Zero-cost holdings report 0% rather than dividing by zero.
+    assert valuation.profit_loss_percent.tolist() == pytest.approx([10.0, -50.0, 0.0])
+    assert valuation.allocation_percent.tolist() == pytest.approx([1100 / 11.5, 50 / 11.5, 0.0])
+    assert valuation.portfolio_value == pytest.approx(1150.0)
+    assert valuation.portfolio_cost == pytest.approx(1100.0)
+    assert valuation.portfolio_profit_loss_percent == pytest.approx(50 / 11)
+
+
+def test_value_holdings_empty_portfolio():
+    valuation = value_holdings([], [], [])
+
+    assert valuation.portfolio_value == 0.0
+    assert valuation.portfolio_profit_loss_percent == 0.0
+    assert valuation.allocation_percent.tolist() == []
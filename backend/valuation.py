@@ -0,0 +1,251 @@
+# valuation.py
+"""
+Pricing of portfolio holdings under a latency budget.
+
+``ValuationEngine`` splits the distinct symbols of a portfolio into chunks,
+fetches the chunks concurrently (at most ``max_concurrency`` at a time) and
+stops waiting once the per-portfolio deadline passes. Holdings whose quote
+did not arrive in time fall back to their most recent stored price and then
+to their purchase price, and every price carries its source so responses can
+flag estimated values.
+
+``value_holdings`` is the arithmetic shared by every place that values
+holdings (portfolio detail, single asset, snapshot capture): it works on
+quantity / cost / price arrays and computes all rows at once with NumPy.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .market_data import MarketDataService, market_data
+from .models import Asset, AssetPriceHistory
+
+logger = logging.getLogger(__name__)
+
+PRICE_SOURCE_LIVE = "live"
+PRICE_SOURCE_STALE = "stale"
+PRICE_SOURCE_PURCHASE = "purchase_price"
+
+
+@dataclass(frozen=True)
+class AssetPrice:
+    """Price used to value a holding and where it came from."""
+
+    price: float
+    source: str
+
+    @property
+    def is_live(self) -> bool:
+        return self.source == PRICE_SOURCE_LIVE
+
+
+@dataclass(frozen=True)
+class PortfolioValuation:
+    """Per-holding arrays and portfolio totals from ``value_holdings``."""
+
+    quantity: np.ndarray
+    price: np.ndarray
+    total_cost: np.ndarray
+    current_value: np.ndarray
+    profit_loss: np.ndarray
+    profit_loss_percent: np.ndarray
+    allocation_percent: np.ndarray
+    portfolio_cost: float
+    portfolio_value: float
+    portfolio_profit_loss: float
+    portfolio_profit_loss_percent: float
+
+
+def _percent_of(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """``numerator / denominator * 100``, or 0 where the denominator is not positive."""
+
+    return np.divide(
+        numerator * 100.0,
+        denominator,
+        out=np.zeros_like(numerator),
+        where=denominator > 0,
+    )
+
+
+def value_holdings(
+    quantities: Sequence[float],
+    purchase_prices: Sequence[float],
+    prices: Sequence[float],
+) -> PortfolioValuation:
+    """Value every holding and the portfolio total in one vectorized pass."""
+
+    quantity = np.asarray(quantities, dtype=np.float64)
+    price = np.asarray(prices, dtype=np.float64)
+    total_cost = quantity * np.asarray(purchase_prices, dtype=np.float64)
+    current_value = quantity * price
+    profit_loss = current_value - total_cost
+
+    portfolio_cost = float(total_cost.sum())
+    portfolio_value = float(current_value.sum())
+    portfolio_profit_loss = portfolio_value - portfolio_cost
+    return PortfolioValuation(
+        quantity=quantity,
+        price=price,
+        total_cost=total_cost,
+        current_value=current_value,
+        profit_loss=profit_loss,
+        profit_loss_percent=_percent_of(profit_loss, total_cost),
+        allocation_percent=(
+            current_value * (100.0 / portfolio_value) if portfolio_value > 0 else np.zeros_like(current_value)
+        ),
+        portfolio_cost=portfolio_cost,
+        portfolio_value=portfolio_value,
+        portfolio_profit_loss=portfolio_profit_loss,
+        portfolio_profit_loss_percent=(
+            portfolio_profit_loss / portfolio_cost * 100 if portfolio_cost > 0 else 0.0
+        ),
+    )
+
+
+async def get_latest_stored_prices(
+    db: AsyncSession,
+    asset_ids: Sequence[int],
+) -> Dict[int, float]:
+    """Return the most recent stored AssetPriceHistory price per asset."""
+
+    if not asset_ids:
+        return {}
+
+    latest_timestamps = (
+        select(
+            AssetPriceHistory.asset_id.label("asset_id"),
+            func.max(AssetPriceHistory.timestamp).label("latest_timestamp"),
+        )
+        .where(AssetPriceHistory.asset_id.in_(asset_ids))
+        .group_by(AssetPriceHistory.asset_id)
+        .subquery()
+    )
+    result = await db.execute(
+        select(AssetPriceHistory.asset_id, AssetPriceHistory.price).join(
+            latest_timestamps,
+            (AssetPriceHistory.asset_id == latest_timestamps.c.asset_id)
+            & (AssetPriceHistory.timestamp == latest_timestamps.c.latest_timestamp),
+        )
+    )
+    return {int(asset_id): float(price) for asset_id, price in result.all()}
+
+
+class ValuationEngine:
+    """Prices holdings with bounded fan-out and a per-portfolio deadline."""
+
+    def __init__(
+        self,
+        market: MarketDataService = market_data,
+        *,
+        chunk_size: int,
+        max_concurrency: int,
+        deadline_seconds: float,
+    ):
+        self.market = market
+        self.chunk_size = max(int(chunk_size), 1)
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.deadline_seconds = float(deadline_seconds)
+
+    async def fetch_live_prices(
+        self,
+        symbols: Iterable[str],
+        *,
+        deadline_seconds: Optional[float] = None,
+    ) -> Dict[str, float]:
+        """Return the quotes that arrive before the deadline.
+
+        Chunks still outstanding at the deadline are cancelled and their
+        symbols are left out of the result.
+        """
+
+        unique_symbols = list(dict.fromkeys(str(symbol).upper() for symbol in symbols if symbol))
+        if not unique_symbols:
+            return {}
+
+        deadline = self.deadline_seconds if deadline_seconds is None else deadline_seconds
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _fetch_chunk(chunk: List[str]) -> Dict[str, float]:
+            async with semaphore:
+                return await self.market.get_latest_prices(chunk, timeout=deadline)
+
+        tasks = [
+            asyncio.ensure_future(_fetch_chunk(unique_symbols[start:start + self.chunk_size]))
+            for start in range(0, len(unique_symbols), self.chunk_size)
+        ]
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(
+                "Valuation deadline of %.1fs reached with %s of %s quote chunks outstanding",
+                deadline,
+                len(pending),
+                len(tasks),
+            )
+
+        prices: Dict[str, float] = {}
+        for task in done:
+            if task.exception() is not None:
+                logger.warning("Quote chunk failed: %s", task.exception())
+                continue
+            prices.update(task.result())
+        return prices
+
+    async def price_assets(
+        self,
+        db: AsyncSession,
+        assets: Sequence[Asset],
+        *,
+        deadline_seconds: Optional[float] = None,
+    ) -> Dict[int, AssetPrice]:
+        """Return a price for every asset, keyed by asset id.
+
+        Order of preference:
+        1. Live quote received before the deadline
+        2. Most recent stored AssetPriceHistory row (``stale``)
+        3. Purchase price
+        """
+
+        live_prices = await self.fetch_live_prices(
+            (str(asset.symbol) for asset in assets),
+            deadline_seconds=deadline_seconds,
+        )
+
+        prices: Dict[int, AssetPrice] = {}
+        unpriced: List[Asset] = []
+        for asset in assets:
+            live_price = live_prices.get(str(asset.symbol).upper())
+            if live_price is None:
+                unpriced.append(asset)
+            else:
+                prices[int(asset.id)] = AssetPrice(float(live_price), PRICE_SOURCE_LIVE)
+
+        if not unpriced:
+            return prices
+
+        logger.warning(
+            "No live price for %s; using stored or purchase prices",
+            ", ".join(sorted({str(asset.symbol) for asset in unpriced})),
+        )
+        stored_prices = await get_latest_stored_prices(db, [int(asset.id) for asset in unpriced])
+        for asset in unpriced:
+            stored_price = stored_prices.get(int(asset.id))
+            if stored_price is not None:
+                prices[int(asset.id)] = AssetPrice(stored_price, PRICE_SOURCE_STALE)
+            else:
+                prices[int(asset.id)] = AssetPrice(float(asset.purchase_price), PRICE_SOURCE_PURCHASE)
+        return prices
+
+
+valuation_engine = ValuationEngine(
+    chunk_size=settings.valuation_chunk_size,
+    max_concurrency=settings.valuation_max_concurrency,
+    deadline_seconds=settings.valuation_deadline_seconds,
+)
@@ -16,6 +16,7 @@ export interface AssetWithPerformance extends Asset {
   current_value: number;
   profit_loss: number;
   profit_loss_percent: number;
+  price_source?: "live" | "stale" | "purchase_price" | null;
   last_updated: string;
 }
 
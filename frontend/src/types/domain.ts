@@ -48,6 +48,7 @@ export interface WatchlistItem {
   display_name?: string | null;
   added_at: string | null;
   notes?: string | null;
+  latest_price?: number | null;
   latest_sentiment?: SentimentResult | null;
 }
 